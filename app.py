@@ -1,81 +1,56 @@
 import os
 import sys
+import atexit
 import signal
-import asyncio
 import logging
-import threading
+import subprocess
 import multiprocessing
 
-from flask import Flask
-from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
+# Веб-точка входа: импортирует только Flask-приложение. Бот работает
+# в отдельном процессе `python -m main`, который не импортирует этот модуль
+# (в отличие от spawn, повторно импортирующего __main__ родителя), поэтому
+# ни aiogram не попадает в процессы веб-сервера, ни Flask — в процесс бота.
+from web_app_server import app as flask_app, DB_PATH # Импортируем Flask приложение
+from services.leader import BotSupervisor, LEASE_HOLDER_ENV
 
-# Импортируем ваши модули
-from config import BOT_TOKEN
-from handlers import user, admin, callbacks
-from database.db import init_db
-from web_app_server import app as flask_app # Импортируем Flask приложение
-
-# Глобальная переменная для процесса бота
+# Глобальная переменная для процесса бота (subprocess.Popen)
 bot_process = None
-bot_running = False
 
-async def run_bot_async():
-    """Асинхронная функция для запуска Telegram бота."""
-    try:
-        await init_db()
-        print("✅ База данных инициализирована.")
-
-        # Создаем экземпляры бота и диспетчера
-        bot = Bot(token=BOT_TOKEN)
-        dp = Dispatcher(storage=MemoryStorage())
-
-        # Регистрируем роутеры
-        dp.include_router(user.router)
-        dp.include_router(admin.router)
-        dp.include_router(callbacks.router)
-
-        print("🤖 Telegram бот запущен!")
-        
-        # Запускаем поллинг. asyncio.run() сам обрабатывает graceful shutdown.
-        await dp.start_polling(bot)
-
-    except Exception as e:
-        print(f"❌ Ошибка при запуске бота: {e}")
-        import traceback
-        traceback.print_exc()
-    finally:
-        print("🛑 Telegram бот остановлен.")
+# Каталог main.py; рабочий каталог бот наследует, чтобы относительные
+# пути (DATABASE_PATH, STATS_CACHE_DIR) совпадали с веб-сервером
+BOT_DIR = os.path.dirname(os.path.abspath(__file__))
 
-def start_bot_process_target():
-    """Целевая функция для запуска бота в отдельном процессе."""
-    print("🧵 Процесс Telegram бота запущен.")
-    # Запускаем асинхронный код.
-    # asyncio.run() создает и управляет event loop.
-    asyncio.run(run_bot_async())
-    print("🛑 Процесс Telegram бота завершен.")
+def bot_process_alive():
+    return bot_process is not None and bot_process.poll() is None
 
-
-def start_bot_process():
+def start_bot_process(lease_holder=None):
     """Функция для запуска бота в отдельном процессе."""
     global bot_process
     
     # Проверяем, что процесс еще не запущен
-    if bot_process is None or not bot_process.is_alive():
-        bot_process = multiprocessing.Process(target=start_bot_process_target, daemon=True)
-        bot_process.start()
+    if not bot_process_alive():
+        # Аренду, занятую воркером, бот получает через окружение
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [BOT_DIR, env.get('PYTHONPATH')]))
+        if lease_holder:
+            env[LEASE_HOLDER_ENV] = lease_holder
+        bot_process = subprocess.Popen([sys.executable, '-m', 'main'], env=env)
         print(f"✅ Запущен дочерний процесс бота с PID: {bot_process.pid}")
     else:
         print("⚠️ Процесс бота уже запущен.")
 
 def stop_bot_process():
     """Функция для остановки процесса бота."""
-    global bot_process
-    if bot_process and bot_process.is_alive():
+    bot_supervisor.stop()
+    if bot_process_alive():
         print("🛑 Остановка процесса бота...")
         # Убиваем процесс
         bot_process.terminate()
-        bot_process.join() # Ждем его завершения
+        try:
+            bot_process.wait(timeout=10) # Ждем его завершения
+        except subprocess.TimeoutExpired:
+            bot_process.kill()
+            bot_process.wait()
         print("🛑 Процесс бота остановлен.")
 
 def signal_handler(signum, frame):
@@ -83,13 +58,21 @@ def signal_handler(signum, frame):
     stop_bot_process()
     sys.exit(0)
 
-signal.signal(signal.SIGINT, signal_handler)
-signal.signal(signal.SIGTERM, signal_handler)
+# Бот запускает тот воркер, который занял аренду бота; остальные воркеры
+# следят за арендой и займут ее, если процесс бота перестанет ее продлевать
+bot_supervisor = BotSupervisor(DB_PATH, start_bot=start_bot_process, bot_alive=bot_process_alive)
 
+# Дочерние процессы, запущенные через spawn (пул отрисовки статистики
+# при запуске `python app.py`), заново импортируют этот модуль и не должны
+# запускать еще один бот
+if multiprocessing.current_process().name == 'MainProcess':
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+    atexit.register(stop_bot_process)
 
-print("🏁 Инициализация приложения...")
+    print("🏁 Инициализация приложения...")
 
-start_bot_process()
+    bot_supervisor.start()
 
 
 app = flask_app
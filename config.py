@@ -1,4 +1,5 @@
 # config.py
+import hashlib
 import os
 
 # Загрузка переменных окружения
@@ -7,6 +8,92 @@ ADMIN_IDS_STR = os.environ.get("ADMIN_IDS", "")
 WEB_APP_URL = os.environ.get("WEB_APP_URL", "http://localhost:80")
 DATABASE_PATH = os.environ.get("DATABASE_PATH", "database/bot.db")
 
+# Пул соединений с базой данных
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "4"))
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", "128"))
+DB_PRAGMAS = {
+    "journal_mode": os.environ.get("DB_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("DB_SYNCHRONOUS", "NORMAL"),
+    "cache_size": int(os.environ.get("DB_CACHE_SIZE", "-16000")),
+    "mmap_size": int(os.environ.get("DB_MMAP_SIZE", "134217728")),
+    "busy_timeout": int(os.environ.get("DB_BUSY_TIMEOUT", "5000")),
+}
+
+# Проверка индекса доступности слотов против SQLite при каждом чтении
+AVAILABILITY_CHECK = os.environ.get("AVAILABILITY_CHECK", "0") == "1"
+
+# Очередь уведомлений: адрес Bot API (можно указать локальный сервер) и параметры отправки
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_POLL_INTERVAL = float(os.environ.get("OUTBOX_POLL_INTERVAL", "1.0"))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_RETRY_BASE = float(os.environ.get("OUTBOX_RETRY_BASE", "5"))
+OUTBOX_RETRY_MAX = float(os.environ.get("OUTBOX_RETRY_MAX", "3600"))
+# Лимиты Telegram: около 30 сообщений в секунду всего и 1 в секунду в один чат
+OUTBOX_GLOBAL_RATE = float(os.environ.get("OUTBOX_GLOBAL_RATE", "25"))
+OUTBOX_CHAT_INTERVAL = float(os.environ.get("OUTBOX_CHAT_INTERVAL", "1.0"))
+
+# Как часто обновлять статусное сообщение рассылки (секунды)
+BROADCAST_PROGRESS_INTERVAL = float(os.environ.get("BROADCAST_PROGRESS_INTERVAL", "5"))
+
+# Максимальное время отрисовки /stats (секунды)
+STATS_RENDER_TIMEOUT = float(os.environ.get("STATS_RENDER_TIMEOUT", "60"))
+
+# Кэш изображений статистики на диске
+STATS_CACHE_DIR = os.environ.get("STATS_CACHE_DIR", "data/stats_cache")
+STATS_CACHE_MAX_BYTES = int(os.environ.get("STATS_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+# Аренда процесса бота: только один процесс на все воркеры веб-сервера
+# запускает бота. Владелец продлевает аренду каждые BOT_LEASE_INTERVAL
+# секунд, просроченную через BOT_LEASE_TTL секунд аренду занимает другой
+BOT_LEASE_TTL = float(os.environ.get("BOT_LEASE_TTL", "30"))
+BOT_LEASE_INTERVAL = float(os.environ.get("BOT_LEASE_INTERVAL", "10"))
+
+# Получение обновлений: polling (getUpdates) или webhook
+BOT_MODE = os.environ.get("BOT_MODE", "polling")
+
+# Webhook: публичный адрес (https://example.com), на который Telegram шлет
+# обновления, и локальный aiohttp-сервер, который их принимает
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_HOST = os.environ.get("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", "8081"))
+# Заголовок X-Telegram-Bot-Api-Secret-Token; по умолчанию выводится из токена бота
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET") or hashlib.sha256(BOT_TOKEN.encode()).hexdigest()
+
+# Сколько обновлений (polling и webhook) обрабатывается одновременно;
+# обновления одного пользователя всегда обрабатываются по очереди
+UPDATE_CONCURRENCY = int(os.environ.get("UPDATE_CONCURRENCY", "32"))
+
+# Хранилище состояний диалогов (FSM): sqlite — в базе, переживает
+# перезапуск бота; memory — в памяти процесса (MemoryStorage aiogram)
+FSM_STORAGE = os.environ.get("FSM_STORAGE", "sqlite")
+# Измененные состояния записываются в базу пачкой раз в FSM_FLUSH_INTERVAL секунд
+FSM_FLUSH_INTERVAL = float(os.environ.get("FSM_FLUSH_INTERVAL", "1"))
+# Неактивные записи удаляются из кэша через FSM_CACHE_TTL секунд,
+# из базы — через FSM_TTL секунд после последнего изменения
+FSM_CACHE_TTL = float(os.environ.get("FSM_CACHE_TTL", "600"))
+FSM_TTL = float(os.environ.get("FSM_TTL", str(7 * 24 * 3600)))
+
+# Кэш пользователей по Telegram ID в памяти каждого процесса: не больше
+# USER_CACHE_SIZE записей, каждая живет USER_CACHE_TTL секунд
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", "600"))
+
+# Заказов на одной странице «Мои письма» в боте
+LETTERS_PAGE_SIZE = int(os.environ.get("LETTERS_PAGE_SIZE", "5"))
+
+# Метрики процесса бота в формате Prometheus: http://BOT_METRICS_HOST:BOT_METRICS_PORT/metrics
+# (0 — не запускать). Веб-сервер отдает свои метрики на /metrics
+BOT_METRICS_HOST = os.environ.get("BOT_METRICS_HOST", "0.0.0.0")
+BOT_METRICS_PORT = int(os.environ.get("BOT_METRICS_PORT", "9101"))
+
+# Каталог снимков метрик веб-воркеров: /metrics любого воркера gunicorn
+# суммирует снимки всех процессов (пусто — только метрики текущего воркера).
+# Каталог очищается при развертывании, как и база метрик prometheus_client
+METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(os.path.dirname(DATABASE_PATH), "metrics"))
+METRICS_SNAPSHOT_INTERVAL = float(os.environ.get("METRICS_SNAPSHOT_INTERVAL", "5"))
+
 # Обработка ADMIN_IDS
 if ADMIN_IDS_STR:
     ADMIN_IDS = list(map(int, ADMIN_IDS_STR.split(",")))
@@ -17,4 +104,7 @@ print(f"Загружены переменные окружения:")
 print(f"  BOT_TOKEN: {'*' * len(BOT_TOKEN) if BOT_TOKEN else 'None'}")
 print(f"  ADMIN_IDS: {ADMIN_IDS}")
 print(f"  WEB_APP_URL: {WEB_APP_URL}")
-print(f"  DATABASE_PATH: {DATABASE_PATH}")
\ No newline at end of file
+print(f"  DATABASE_PATH: {DATABASE_PATH}")
+print(f"  DB_POOL_SIZE: {DB_POOL_SIZE}")
+print(f"  BOT_MODE: {BOT_MODE}")
+print(f"  FSM_STORAGE: {FSM_STORAGE}")
\ No newline at end of file
@@ -0,0 +1,202 @@
+# Атомарное бронирование окна и создание заказа.
+# Проверка лимита, занятие места в окне и вставка заказа выполняются в одной
+# транзакции BEGIN IMMEDIATE: два одновременных запроса не займут одно место,
+# а неудачная вставка заказа не оставит окно занятым.
+# Используется и ботом (aiosqlite), и веб-сервером (sqlite3).
+
+# Максимальное число незавершенных заказов у пользователя
+MAX_UNFINISHED_ORDERS = 2
+
+LIMIT_ERROR = f"У вас уже есть {MAX_UNFINISHED_ORDERS} незавершенных заказа"
+WINDOW_ERROR = "Временное окно уже занято"
+USER_ERROR = "Ошибка создания пользователя"
+
+ENSURE_USER_SQL = """
+    INSERT OR IGNORE INTO users (telegram_id, full_name)
+    VALUES (?, ?)
+"""
+
+# Только неизменяемые поля: строка хранится в кэшах пользователей процессов,
+# а счетчики писем меняют другие процессы (их читает get_user_letters_page)
+SELECT_USER_SQL = "SELECT id, telegram_id FROM users WHERE telegram_id = ?"
+
+# Версия данных диапазонов и окон (миграция 0012): по ней процессы видят
+# чужие изменения и переносят индекс доступности через свои
+AVAILABILITY_VERSION_SQL = "SELECT version FROM availability_version WHERE id = 1"
+
+COUNT_UNFINISHED_SQL = """
+    SELECT COUNT(*) as count FROM orders
+    WHERE user_id = ? AND status IN ('pending', 'met')
+"""
+
+# Место занимается только если в окне еще есть свободная вместимость
+RESERVE_WINDOW_SQL = """
+    UPDATE meeting_windows
+    SET current_bookings = current_bookings + 1,
+        assigned_user_id = ?,
+        is_available = CASE
+            WHEN current_bookings + 1 >= (
+                SELECT max_meetings_per_window
+                FROM meeting_time_ranges
+                WHERE id = meeting_windows.range_id
+            ) THEN 0 ELSE 1 END
+    WHERE id = ?
+      AND current_bookings < (
+          SELECT max_meetings_per_window
+          FROM meeting_time_ranges
+          WHERE id = meeting_windows.range_id AND is_active = 1
+      )
+"""
+
+INSERT_ORDER_SQL = """
+    INSERT INTO orders
+    (user_id, meeting_window_id, location_id, custom_location, is_anonymous,
+     delivery_delay_days, target_delivery_date,
+     card_type_1_count, card_type_2_count, card_type_3_count,
+     card_type_1_desc, card_type_2_desc, card_type_3_desc,
+     recipient_name, delivery_address, client_name)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Отмена срабатывает один раз, повторная отмена не освобождает место снова
+CANCEL_ORDER_SQL = """
+    UPDATE orders
+    SET status = 'cancelled', cancelled_reason = ?, updated_at = CURRENT_TIMESTAMP
+    WHERE id = ? AND status != 'cancelled'
+"""
+
+RELEASE_WINDOW_SQL = """
+    UPDATE meeting_windows
+    SET current_bookings = MAX(current_bookings - 1, 0),
+        assigned_user_id = NULL,
+        is_available = 1
+    WHERE id = (SELECT meeting_window_id FROM orders WHERE id = ?)
+"""
+
+
+def _card_value(values, card_type, default):
+    """Значение для типа открытки из словаря с ключами int или str"""
+    if not values:
+        return default
+    return values.get(card_type) or values.get(str(card_type)) or default
+
+
+def order_params(user_id, window_id, order):
+    """Параметры INSERT_ORDER_SQL из словаря с данными заказа"""
+    card_counts = order.get('card_counts') or {}
+    card_descriptions = order.get('card_descriptions') or {}
+    return (
+        user_id,
+        window_id,
+        order.get('location_id'),
+        order.get('custom_location'),
+        order.get('is_anonymous', False),
+        order.get('delivery_delay_days', 0),
+        order.get('target_delivery_date'),
+        _card_value(card_counts, 1, 0),
+        _card_value(card_counts, 2, 0),
+        _card_value(card_counts, 3, 0),
+        _card_value(card_descriptions, 1, ''),
+        _card_value(card_descriptions, 2, ''),
+        _card_value(card_descriptions, 3, ''),
+        order.get('recipient_name'),
+        order.get('delivery_address'),
+        order.get('client_name'),
+    )
+
+
+async def read_availability_version(db):
+    """Версия доступности через соединение aiosqlite"""
+    async with db.execute(AVAILABILITY_VERSION_SQL) as cursor:
+        row = await cursor.fetchone()
+    return row[0] if row else 0
+
+
+def read_availability_version_sync(conn):
+    """Версия доступности через соединение sqlite3"""
+    row = conn.execute(AVAILABILITY_VERSION_SQL).fetchone()
+    return row[0] if row else 0
+
+
+def default_full_name(telegram_id):
+    return f"Пользователь {telegram_id}"
+
+
+async def reserve_and_create_order(db, telegram_id, window_id, order, user=None):
+    """
+    Бронирование окна и создание заказа через соединение aiosqlite.
+
+    Соединение должно быть писателем без открытой транзакции. user — строка
+    пользователя из кэша; без нее пользователь создается и читается из базы.
+    Возвращает (order_id, user, None, versions) или (None, user, текст ошибки, None);
+    versions — версии доступности до и после транзакции.
+    """
+    await db.execute("BEGIN IMMEDIATE")
+    try:
+        before = await read_availability_version(db)
+        if user is None:
+            await db.execute(ENSURE_USER_SQL, (telegram_id, default_full_name(telegram_id)))
+            async with db.execute(SELECT_USER_SQL, (telegram_id,)) as cursor:
+                user = await cursor.fetchone()
+            if not user:
+                await db.rollback()
+                return None, None, USER_ERROR, None
+        user_id = user['id']
+
+        async with db.execute(COUNT_UNFINISHED_SQL, (user_id,)) as cursor:
+            row = await cursor.fetchone()
+        if row and row[0] >= MAX_UNFINISHED_ORDERS:
+            await db.rollback()
+            return None, user, LIMIT_ERROR, None
+
+        cursor = await db.execute(RESERVE_WINDOW_SQL, (user_id, window_id))
+        if cursor.rowcount == 0:
+            await db.rollback()
+            return None, user, WINDOW_ERROR, None
+
+        cursor = await db.execute(INSERT_ORDER_SQL, order_params(user_id, window_id, order))
+        order_id = cursor.lastrowid
+        after = await read_availability_version(db)
+        await db.commit()
+        return order_id, user, None, (before, after)
+    except BaseException:
+        await db.rollback()
+        raise
+
+
+def reserve_and_create_order_sync(conn, telegram_id, window_id, order, user=None):
+    """
+    Бронирование окна и создание заказа через соединение sqlite3.
+
+    Соединение должно быть писателем без открытой транзакции. user — строка
+    пользователя из кэша; без нее пользователь создается и читается из базы.
+    Возвращает (order_id, user, None, versions) или (None, user, текст ошибки, None);
+    versions — версии доступности до и после транзакции.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        before = read_availability_version_sync(conn)
+        if user is None:
+            conn.execute(ENSURE_USER_SQL, (telegram_id, default_full_name(telegram_id)))
+            user = conn.execute(SELECT_USER_SQL, (telegram_id,)).fetchone()
+            if not user:
+                conn.rollback()
+                return None, None, USER_ERROR, None
+        user_id = user['id']
+
+        row = conn.execute(COUNT_UNFINISHED_SQL, (user_id,)).fetchone()
+        if row and row[0] >= MAX_UNFINISHED_ORDERS:
+            conn.rollback()
+            return None, user, LIMIT_ERROR, None
+
+        if conn.execute(RESERVE_WINDOW_SQL, (user_id, window_id)).rowcount == 0:
+            conn.rollback()
+            return None, user, WINDOW_ERROR, None
+
+        order_id = conn.execute(INSERT_ORDER_SQL, order_params(user_id, window_id, order)).lastrowid
+        after = read_availability_version_sync(conn)
+        conn.commit()
+        return order_id, user, None, (before, after)
+    except BaseException:
+        conn.rollback()
+        raise
@@ -0,0 +1,79 @@
+# Рассылки администратора по сегментам пользователей.
+# Получатели выбираются одним INSERT ... SELECT прямо в очередь notifications,
+# дальше сообщения отправляет воркер очереди (services/outbox.py) с учетом
+# лимитов Telegram, а прогресс показывает services/broadcast.py.
+
+# Сегменты: название → условие отбора пользователей u (с параметром или без)
+SEGMENTS = {
+    # Один пользователь по Telegram ID
+    'user': "u.telegram_id = ?",
+    # Все пользователи
+    'all': "1 = 1",
+    # Пользователи с заказами в ожидании встречи
+    'pending': """EXISTS (
+        SELECT 1 FROM orders o WHERE o.user_id = u.id AND o.status = 'pending'
+    )""",
+    # Пользователи с незавершенными заказами на дату
+    'date': """EXISTS (
+        SELECT 1 FROM orders o
+        JOIN meeting_windows mw ON o.meeting_window_id = mw.id
+        JOIN meeting_time_ranges r ON mw.range_id = r.id
+        WHERE o.user_id = u.id AND o.status IN ('pending', 'met') AND r.date = ?
+    )""",
+    # Пользователи с незавершенными заказами в диапазоне
+    'range': """EXISTS (
+        SELECT 1 FROM orders o
+        JOIN meeting_windows mw ON o.meeting_window_id = mw.id
+        WHERE o.user_id = u.id AND o.status IN ('pending', 'met') AND mw.range_id = ?
+    )""",
+}
+
+SEGMENTS_WITH_VALUE = ('user', 'date', 'range')
+
+INSERT_BROADCAST_SQL = """
+    INSERT INTO broadcasts (segment, segment_value, message, admin_chat_id, status_message_id)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+# next_attempt_at = время создания: уведомления о заказах (next_attempt_at = 0)
+# при этом отправляются раньше сообщений большой рассылки
+ENQUEUE_RECIPIENTS_SQL = """
+    INSERT INTO notifications (user_id, chat_id, message, broadcast_id, next_attempt_at)
+    SELECT u.id, u.telegram_id, ?, ?, ?
+    FROM users u
+    WHERE u.telegram_id IS NOT NULL AND {condition}
+"""
+
+SET_TOTAL_SQL = "UPDATE broadcasts SET total = ? WHERE id = ?"
+
+SELECT_RUNNING_SQL = "SELECT * FROM broadcasts WHERE status = 'running' ORDER BY id"
+
+PROGRESS_SQL = """
+    SELECT status, COUNT(*) AS count
+    FROM notifications
+    WHERE broadcast_id = ?
+    GROUP BY status
+"""
+
+FINISH_SQL = """
+    UPDATE broadcasts
+    SET status = 'finished', finished_at = CURRENT_TIMESTAMP
+    WHERE id = ?
+"""
+
+
+def recipients_query(segment):
+    """Запрос постановки получателей сегмента в очередь"""
+    return ENQUEUE_RECIPIENTS_SQL.format(condition=SEGMENTS[segment])
+
+
+def progress_text(broadcast, counts):
+    """Текст статусного сообщения рассылки"""
+    delivered = counts.get('delivered', 0)
+    failed = counts.get('failed', 0)
+    total = broadcast['total']
+    if counts.get('pending', 0) == 0:
+        return (f"✅ Рассылка #{broadcast['id']} завершена\n\n"
+                f"Доставлено: {delivered} из {total}\nОшибок: {failed}")
+    return (f"📣 Рассылка #{broadcast['id']} выполняется\n\n"
+            f"Доставлено: {delivered} из {total}\nОшибок: {failed}")
@@ -0,0 +1,52 @@
+# Счетчики панели администратора (таблица stats_counters).
+# Поддерживаются триггерами из миграции 0003_stats_counters.sql,
+# поэтому статистика читается одной строкой по первичному ключу.
+# Используется и ботом (aiosqlite), и веб-сервером (sqlite3).
+
+STATS_COUNTERS_SQL = """
+    SELECT total_orders, pending_orders, total_users, rated_feedback, rating_sum
+    FROM stats_counters
+    WHERE id = 1
+"""
+
+# Версия данных графиков статистики (ключ кэша изображений)
+STATS_VERSION_SQL = "SELECT data_version FROM stats_counters WHERE id = 1"
+
+# Пересчет с нуля (после ручных правок базы или для проверки триггеров);
+# версия данных увеличивается, чтобы не отдать устаревший кэш
+REBUILD_STATS_COUNTERS_SQL = """
+    INSERT OR REPLACE INTO stats_counters
+        (id, total_orders, pending_orders, total_users, rated_feedback, rating_sum, data_version)
+    SELECT 1,
+        (SELECT COUNT(*) FROM orders),
+        (SELECT COUNT(*) FROM orders WHERE status = 'pending'),
+        (SELECT COUNT(*) FROM users),
+        (SELECT COUNT(rating) FROM feedback),
+        (SELECT COALESCE(SUM(rating), 0) FROM feedback),
+        COALESCE((SELECT data_version FROM stats_counters WHERE id = 1), 0) + 1
+"""
+
+
+def stats_from_row(row):
+    """Словарь статистики в формате /api/stats из строки stats_counters"""
+    if not row:
+        return {'total_orders': 0, 'active_meetings': 0, 'total_users': 0, 'avg_rating': 0}
+    return {
+        'total_orders': row['total_orders'],
+        'active_meetings': row['pending_orders'],
+        'total_users': row['total_users'],
+        'avg_rating': round(row['rating_sum'] / row['rated_feedback'], 1) if row['rated_feedback'] else 0
+    }
+
+
+def rebuild_stats_counters(conn):
+    """Пересчет счетчиков через соединение sqlite3; возвращает новую статистику"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(REBUILD_STATS_COUNTERS_SQL)
+        row = conn.execute(STATS_COUNTERS_SQL).fetchone()
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return stats_from_row(row)
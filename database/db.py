@@ -1,38 +1,128 @@
-import aiosqlite
-import os
-from config import DATABASE_PATH
-from datetime import datetime
+import asyncio
+import time
+from config import (
+    DATABASE_PATH, DB_POOL_SIZE, DB_PRAGMAS, AVAILABILITY_CHECK,
+    USER_CACHE_SIZE, USER_CACHE_TTL, LETTERS_PAGE_SIZE,
+)
+from database import booking, counters, outbox, broadcasts, leases, fsm
+from database.migrate import migrate
+from database.pool import ConnectionPool
+from services import export
+from services.availability import AvailabilityIndex, fetch_rows
+from services.metrics import BOOKINGS, DB_FUNCTION_DURATION, booking_result, instrument_module
+from utils.cache import LRUCache
+from utils.pagination import (
+    KEYSET_CONDITION, KEYSET_ORDER, KEYSET_BEFORE_CONDITION, KEYSET_REVERSE_ORDER,
+    clamp_page_size, decode_cursor, encode_cursor, split_page,
+)
+from utils.time import build_meeting_windows, expand_time_ranges
 
 DB_PATH = DATABASE_PATH
 
+# Пул соединений процесса бота (создается в init_db, закрывается в close_db)
+pool = None
+
+# Индекс доступности слотов в памяти процесса бота
+availability = AvailabilityIndex()
+
+# Строки пользователей по Telegram ID (запись в users меняется только
+# update_user_stats, остальное ограничено TTL)
+users_cache = LRUCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
 async def init_db():
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    
-    async with aiosqlite.connect(DB_PATH) as db:
-        with open('database/schema.sql', 'r') as f:
-            await db.executescript(f.read())
-        await db.commit()
+    global pool
+    # Применяем только новые миграции схемы
+    await asyncio.to_thread(migrate, DB_PATH)
+
+    if pool is None:
+        pool = ConnectionPool(DB_PATH, readers=DB_POOL_SIZE, pragmas=DB_PRAGMAS)
+        await pool.open()
+        await get_availability()
+
+async def close_db():
+    """Закрытие пула соединений при остановке бота"""
+    global pool
+    if pool is not None:
+        await pool.close()
+        pool = None
+    availability.invalidate()
+
+def get_pool():
+    if pool is None:
+        raise RuntimeError("База данных не инициализирована: сначала вызовите init_db()")
+    return pool
 
-async def get_db():
-    return await aiosqlite.connect(DB_PATH)
+async def get_availability():
+    """Индекс доступности, перезагруженный после изменений из других процессов"""
+    async with get_pool().read() as db:
+        version = await booking.read_availability_version(db)
+        if availability.needs_reload(version):
+            # Снимок, прочитанный до изменения индекса на месте, читается заново
+            while True:
+                generation = availability.generation
+                ranges, windows = await fetch_rows(db)
+                if availability.load(ranges, windows, version=version, generation=generation):
+                    break
+            return availability
+    if AVAILABILITY_CHECK:
+        await check_availability()
+    return availability
+
+async def check_availability():
+    """Сравнение индекса доступности с SQLite; при расхождении индекс перезагружается"""
+    generation = availability.generation
+    async with get_pool().read() as db:
+        version = await booking.read_availability_version(db)
+        ranges, windows = await fetch_rows(db)
+    if availability.generation != generation:
+        # Индекс изменился во время чтения: сравнение было бы неверным
+        return []
+    differences = availability.compare(ranges, windows)
+    if differences:
+        print(f"⚠️ Индекс доступности расходится с базой: {len(differences)} отличий")
+        availability.load(ranges, windows, version=version, generation=generation)
+    return differences
+
+async def _begin_availability_write(db):
+    """Начало транзакции писателя; версия доступности до изменений"""
+    await db.execute("BEGIN IMMEDIATE")
+    return await booking.read_availability_version(db)
+
+async def _get_order_window_id(db, order_id):
+    async with db.execute("SELECT meeting_window_id FROM orders WHERE id = ?", (order_id,)) as cursor:
+        row = await cursor.fetchone()
+    return row[0] if row else None
 
 # Users
 async def create_user(telegram_id, username, full_name):
-    async with aiosqlite.connect(DB_PATH) as db:
+    # Пользователь из кэша уже есть в базе: INSERT OR IGNORE ничего не изменит
+    if users_cache.get(telegram_id) is not None:
+        return
+    async with get_pool().write() as db:
         await db.execute("""
             INSERT OR IGNORE INTO users (telegram_id, username, full_name) 
             VALUES (?, ?, ?)
         """, (telegram_id, username, full_name))
-        await db.commit()
+        async with db.execute(booking.SELECT_USER_SQL, (telegram_id,)) as cursor:
+            user = await cursor.fetchone()
+    if user:
+        users_cache.set(telegram_id, user)
 
 async def get_user_by_telegram_id(telegram_id):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("SELECT * FROM users WHERE telegram_id = ?", (telegram_id,)) as cursor:
-            return await cursor.fetchone()
+    """Идентификаторы пользователя (id, telegram_id) или None"""
+    user = users_cache.get(telegram_id)
+    if user is not None:
+        return user
+    async with get_pool().read() as db:
+        async with db.execute(booking.SELECT_USER_SQL, (telegram_id,)) as cursor:
+            user = await cursor.fetchone()
+    # Отсутствие пользователя не кэшируем: его может создать веб-сервер
+    if user:
+        users_cache.set(telegram_id, user)
+    return user
 
 async def update_user_stats(user_id, category=None):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_pool().write() as db:
         if category == 'A':
             await db.execute("UPDATE users SET total_letters = total_letters + 1, category_a_count = category_a_count + 1 WHERE id = ?", (user_id,))
         elif category == 'B':
@@ -41,58 +131,55 @@ async def update_user_stats(user_id, category=None):
             await db.execute("UPDATE users SET total_letters = total_letters + 1, category_c_count = category_c_count + 1 WHERE id = ?", (user_id,))
         else:
             await db.execute("UPDATE users SET total_letters = total_letters + 1 WHERE id = ?", (user_id,))
-        await db.commit()
 
 # Meeting Time Ranges
 async def create_time_range(date, start_time, end_time, window_duration_min=10, max_meetings_per_window=1):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_pool().write() as db:
+        range_ids = await insert_time_ranges(db, [{
+            'date': date,
+            'start_time': start_time,
+            'end_time': end_time,
+            'window_duration_min': window_duration_min,
+            'max_meetings_per_window': max_meetings_per_window
+        }])
+    availability.invalidate()
+    return range_ids[0]
+
+async def create_time_ranges_bulk(dates, ranges):
+    """Создание диапазонов для нескольких дат одной транзакцией"""
+    async with get_pool().write() as db:
+        range_ids = await insert_time_ranges(db, expand_time_ranges(dates, ranges))
+    availability.invalidate()
+    return range_ids
+
+async def insert_time_ranges(db, items):
+    """Вставка диапазонов и всех их временных окон в текущей транзакции"""
+    range_ids = []
+    window_rows = []
+    for item in items:
         cursor = await db.execute("""
             INSERT INTO meeting_time_ranges 
             (date, start_time, end_time, window_duration_min, max_meetings_per_window) 
             VALUES (?, ?, ?, ?, ?)
-        """, (date, start_time, end_time, window_duration_min, max_meetings_per_window))
-        range_id = cursor.lastrowid
-        await db.commit()
-        
-        # Генерируем временные окна
-        await generate_meeting_windows(range_id, start_time, end_time, window_duration_min)
-        return range_id
-
-async def generate_meeting_windows(range_id, start_time, end_time, window_duration_min):
-    """Генерация временных окон для диапазона"""
-    from datetime import datetime, timedelta
-    
-    # Преобразуем время в datetime объекты
-    start_dt = datetime.strptime(start_time, "%H:%M")
-    end_dt = datetime.strptime(end_time, "%H:%M")
+        """, (item['date'], item['start_time'], item['end_time'],
+              item['window_duration_min'], item['max_meetings_per_window']))
+        range_ids.append(cursor.lastrowid)
+        window_rows.extend(build_meeting_windows(
+            cursor.lastrowid, item['start_time'], item['end_time'], item['window_duration_min']))
     
-    current_time = start_dt
-    while current_time + timedelta(minutes=window_duration_min) <= end_dt:
-        next_time = current_time + timedelta(minutes=window_duration_min)
-        
-        async with aiosqlite.connect(DB_PATH) as db:
-            await db.execute("""
-                INSERT INTO meeting_windows 
-                (range_id, start_time, end_time) 
-                VALUES (?, ?, ?)
-            """, (range_id, current_time.strftime("%H:%M"), next_time.strftime("%H:%M")))
-            await db.commit()
-        
-        current_time = next_time
+    # Все окна вставляются одним executemany
+    await db.executemany("""
+        INSERT INTO meeting_windows 
+        (range_id, start_time, end_time) 
+        VALUES (?, ?, ?)
+    """, window_rows)
+    return range_ids
 
 async def get_active_time_ranges_by_date(date):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("""
-            SELECT * FROM meeting_time_ranges 
-            WHERE date = ? AND is_active = 1
-            ORDER BY start_time
-        """, (date,)) as cursor:
-            return await cursor.fetchall()
+    return (await get_availability()).active_ranges_by_date(date)
 
 async def get_all_time_ranges():
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with get_pool().read() as db:
         async with db.execute("""
             SELECT * FROM meeting_time_ranges 
             ORDER BY date DESC, start_time
@@ -100,226 +187,245 @@ async def get_all_time_ranges():
             return await cursor.fetchall()
 
 async def delete_time_range(range_id):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_pool().write() as db:
+        before = await _begin_availability_write(db)
         # Сначала удаляем все окна
         await db.execute("DELETE FROM meeting_windows WHERE range_id = ?", (range_id,))
         # Затем удаляем диапазон
         await db.execute("DELETE FROM meeting_time_ranges WHERE id = ?", (range_id,))
-        await db.commit()
+        versions = before, await booking.read_availability_version(db)
+    availability.remove_range(range_id, versions)
 
 async def toggle_time_range(range_id, is_active):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_pool().write() as db:
+        before = await _begin_availability_write(db)
         await db.execute("""
             UPDATE meeting_time_ranges 
             SET is_active = ? 
             WHERE id = ?
         """, (is_active, range_id))
-        await db.commit()
+        versions = before, await booking.read_availability_version(db)
+    availability.set_range_active(range_id, is_active, versions)
 
 # Meeting Windows
 async def get_available_windows_by_range(range_id):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("""
-            SELECT * FROM meeting_windows 
-            WHERE range_id = ? AND is_available = 1
-            ORDER BY start_time
-        """, (range_id,)) as cursor:
-            return await cursor.fetchall()
+    return (await get_availability()).windows_by_range(range_id, only_available=True)
 
 async def get_all_windows_by_range(range_id):
     """Получение всех окон диапазона (включая занятые)"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("""
-            SELECT * FROM meeting_windows 
-            WHERE range_id = ?
-            ORDER BY start_time
-        """, (range_id,)) as cursor:
-            return await cursor.fetchall()
+    return (await get_availability()).windows_by_range(range_id)
 
-async def book_window(window_id, user_id):
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Проверяем, есть ли у пользователя незавершенные заказы
-        async with db.execute("""
-            SELECT COUNT(*) as count FROM orders 
-            WHERE user_id = ? AND status IN ('pending', 'met')
-        """, (user_id,)) as cursor:
-            row = await cursor.fetchone()
-            if row and row[0] >= 2:
-                return False, "У вас уже есть 2 незавершенных заказа"
-        
-        # Получаем информацию об окне
-        async with db.execute("SELECT * FROM meeting_windows WHERE id = ?", (window_id,)) as cursor:
-            window = await cursor.fetchone()
-        
-        if not window or window['is_available'] == 0:
-            return False, "Временное окно уже занято"
-            
-        # Обновляем окно
-        await db.execute("""
-            UPDATE meeting_windows 
-            SET current_bookings = current_bookings + 1, 
-                assigned_user_id = ?,
-                is_available = CASE 
-                    WHEN current_bookings + 1 >= (
-                        SELECT max_meetings_per_window 
-                        FROM meeting_time_ranges 
-                        WHERE id = (
-                            SELECT range_id 
-                            FROM meeting_windows 
-                            WHERE id = ?
-                        )
-                    ) THEN 0 ELSE 1 END
-            WHERE id = ?
-        """, (user_id, window_id, window_id))
-        await db.commit()
-        return True, None
+async def book_order(telegram_id, window_id, order):
+    """
+    Атомарное бронирование окна и создание заказа.
+    Возвращает (order_id, None) или (None, текст ошибки)
+    """
+    cached = users_cache.get(telegram_id)
+    async with get_pool().write() as db:
+        order_id, user, error, versions = await booking.reserve_and_create_order(
+            db, telegram_id, window_id, order, user=cached)
+    BOOKINGS.inc('bot', booking_result(error))
+    if cached is None and user:
+        users_cache.set(telegram_id, user)
+    if order_id:
+        availability.apply_booking(window_id, user['id'], versions)
+    return order_id, error
 
-async def free_window(window_id):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("""
-            UPDATE meeting_windows 
-            SET current_bookings = current_bookings - 1,
-                assigned_user_id = NULL,
-                is_available = 1
-            WHERE id = (SELECT meeting_window_id FROM orders WHERE id = ?)
-        """, (window_id,))
-        await db.commit()
+async def free_window(order_id):
+    """Освобождение окна, занятого заказом"""
+    async with get_pool().write() as db:
+        before = await _begin_availability_write(db)
+        window_id = await _get_order_window_id(db, order_id)
+        await db.execute(booking.RELEASE_WINDOW_SQL, (order_id,))
+        versions = before, await booking.read_availability_version(db)
+    if window_id:
+        availability.apply_release(window_id, versions)
 
 # Locations
 async def create_location(name, address, is_custom=False, created_by_admin=True):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_pool().write() as db:
         cursor = await db.execute("""
             INSERT INTO locations (name, address, is_custom, created_by_admin) 
             VALUES (?, ?, ?, ?)
         """, (name, address, is_custom, created_by_admin))
         location_id = cursor.lastrowid
-        await db.commit()
         return location_id
 
 async def get_all_locations():
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with get_pool().read() as db:
         async with db.execute("SELECT * FROM locations ORDER BY name") as cursor:
             return await cursor.fetchall()
 
 async def delete_location(location_id):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_pool().write() as db:
         await db.execute("DELETE FROM locations WHERE id = ?", (location_id,))
-        await db.commit()
 
 # Orders - ИСПРАВЛЕНО: теперь используем telegram_id напрямую
 async def create_order(telegram_id, meeting_window_id, location_id=None, custom_location=None, 
                       is_anonymous=False, delivery_delay_days=0, target_delivery_date=None,
                       card_counts=None, card_descriptions=None, recipient_name=None,
                       delivery_address=None, client_name=None):
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Создаем или обновляем пользователя если нужно
-        await db.execute("""
-            INSERT OR IGNORE INTO users (telegram_id, full_name) 
-            VALUES (?, ?)
-        """, (telegram_id, f"Пользователь {telegram_id}"))
-        
-        # Получаем внутренний ID пользователя
-        async with db.execute("SELECT id FROM users WHERE telegram_id = ?", (telegram_id,)) as cursor:
-            user_row = await cursor.fetchone()
-            if not user_row:
-                return None
-            user_id = user_row[0]
-        
-        cursor = await db.execute("""
-            INSERT INTO orders 
-            (user_id, meeting_window_id, location_id, custom_location, is_anonymous, 
-             delivery_delay_days, target_delivery_date,
-             card_type_1_count, card_type_2_count, card_type_3_count,
-             card_type_1_desc, card_type_2_desc, card_type_3_desc,
-             recipient_name, delivery_address, client_name)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (user_id, meeting_window_id, location_id, custom_location, is_anonymous,
-              delivery_delay_days, target_delivery_date,
-              card_counts.get(1, 0), card_counts.get(2, 0), card_counts.get(3, 0),
-              card_descriptions.get(1, ''), card_descriptions.get(2, ''), card_descriptions.get(3, ''),
-              recipient_name, delivery_address, client_name))
-        order_id = cursor.lastrowid
-        await db.commit()
-        return order_id
-
-# ИСПРАВЛЕНО: получение заказов по telegram_id
-async def get_orders_by_user(telegram_id):
-    """Получение заказов пользователя по Telegram ID"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("""
-            SELECT o.*, u.full_name, u.username, u.telegram_id,
-                   mw.start_time as window_start, mw.end_time as window_end,
-                   l.name as location_name
-            FROM orders o
-            JOIN users u ON o.user_id = u.id
-            JOIN meeting_windows mw ON o.meeting_window_id = mw.id
-            LEFT JOIN locations l ON o.location_id = l.id
-            WHERE u.telegram_id = ?
-            ORDER BY o.created_at DESC
-        """, (telegram_id,)) as cursor:
-            return await cursor.fetchall()
+    """Создание заказа вместе с бронированием окна (None, если забронировать не удалось)"""
+    order_id, _ = await book_order(telegram_id, meeting_window_id, {
+        'location_id': location_id,
+        'custom_location': custom_location,
+        'is_anonymous': is_anonymous,
+        'delivery_delay_days': delivery_delay_days,
+        'target_delivery_date': target_delivery_date,
+        'card_counts': card_counts,
+        'card_descriptions': card_descriptions,
+        'recipient_name': recipient_name,
+        'delivery_address': delivery_address,
+        'client_name': client_name
+    })
+    return order_id
 
-async def get_orders_by_status(status=None):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        if status:
-            async with db.execute("""
-                SELECT o.*, u.full_name, u.username, u.telegram_id,
-                       mw.start_time as window_start, mw.end_time as window_end,
-                       l.name as location_name
-                FROM orders o
-                JOIN users u ON o.user_id = u.id
-                JOIN meeting_windows mw ON o.meeting_window_id = mw.id
-                LEFT JOIN locations l ON o.location_id = l.id
-                WHERE o.status = ?
-                ORDER BY o.created_at DESC
-            """, (status,)) as cursor:
-                return await cursor.fetchall()
-        else:
-            async with db.execute("""
-                SELECT o.*, u.full_name, u.username, u.telegram_id,
-                       mw.start_time as window_start, mw.end_time as window_end,
-                       l.name as location_name
-                FROM orders o
-                JOIN users u ON o.user_id = u.id
-                JOIN meeting_windows mw ON o.meeting_window_id = mw.id
-                LEFT JOIN locations l ON o.location_id = l.id
-                ORDER BY o.created_at DESC
-            """) as cursor:
-                return await cursor.fetchall()
+# Счетчики пользователя и страница его заказов одним запросом: LEFT JOIN
+# оставляет строку пользователя и без заказов, условие страницы стоит в ON
+USER_LETTERS_SQL = """
+    SELECT u.total_letters, u.category_a_count, u.category_b_count,
+           u.category_c_count, u.role_in_chat,
+           o.id, o.created_at, o.status,
+           o.card_type_1_count, o.card_type_2_count, o.card_type_3_count,
+           mw.start_time as window_start, mw.end_time as window_end
+    FROM users u
+    LEFT JOIN orders o ON o.user_id = u.id {condition}
+    LEFT JOIN meeting_windows mw ON o.meeting_window_id = mw.id
+    WHERE u.telegram_id = ?
+    {order} LIMIT ?
+"""
+
+async def get_user_letters_page(telegram_id, cursor=None, backward=False, page_size=LETTERS_PAGE_SIZE):
+    """
+    Страница заказов пользователя (новые первыми) вместе с его счетчиками.
+    cursor — ключ последнего заказа предыдущей страницы, с backward=True —
+    первого заказа следующей (переход назад).
+    Возвращает (user, orders, prev_cursor, next_cursor); user — None,
+    если пользователя нет.
+    """
+    condition = ''
+    params = []
+    if cursor:
+        condition = "AND " + (KEYSET_BEFORE_CONDITION if backward else KEYSET_CONDITION)
+        params.extend(decode_cursor(cursor))
+    query = USER_LETTERS_SQL.format(
+        condition=condition,
+        order=KEYSET_REVERSE_ORDER if backward else KEYSET_ORDER
+    )
+    params.extend((telegram_id, page_size + 1))
+
+    async with get_pool().read() as db:
+        async with db.execute(query, params) as db_cursor:
+            rows = await db_cursor.fetchall()
+    if not rows:
+        return None, [], None, None
+
+    orders = [row for row in rows if row['id'] is not None]
+    has_more = len(orders) > page_size
+    orders = orders[:page_size]
+    # Лишняя строка говорит о странице дальше по направлению перехода;
+    # страница, на которую перешли, всегда имеет соседнюю позади
+    if backward:
+        orders.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = bool(cursor), has_more
+
+    prev_cursor = next_cursor = None
+    if orders:
+        if has_prev:
+            prev_cursor = encode_cursor(orders[0]['created_at'], orders[0]['id'])
+        if has_next:
+            next_cursor = encode_cursor(orders[-1]['created_at'], orders[-1]['id'])
+    return rows[0], orders, prev_cursor, next_cursor
+
+ORDERS_SELECT_SQL = """
+    SELECT o.*, u.full_name, u.username, u.telegram_id,
+           mw.start_time as window_start, mw.end_time as window_end,
+           l.name as location_name
+    FROM orders o
+    JOIN users u ON o.user_id = u.id
+    JOIN meeting_windows mw ON o.meeting_window_id = mw.id
+    LEFT JOIN locations l ON o.location_id = l.id
+"""
+
+async def get_orders_by_status(status=None, cursor=None, page_size=None, unpaginated=False):
+    """
+    Страница заказов (новые первыми): возвращает (заказы, next_cursor).
+    С unpaginated=True возвращает список всех заказов, как раньше.
+    """
+    conditions = []
+    params = []
+    if status:
+        conditions.append("o.status = ?")
+        params.append(status)
+
+    if unpaginated:
+        query = ORDERS_SELECT_SQL
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        async with get_pool().read() as db:
+            async with db.execute(query + " " + KEYSET_ORDER, params) as db_cursor:
+                return await db_cursor.fetchall()
+
+    page_size = clamp_page_size(page_size)
+    if cursor:
+        conditions.append(KEYSET_CONDITION)
+        params.extend(decode_cursor(cursor))
+    query = ORDERS_SELECT_SQL
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" {KEYSET_ORDER} LIMIT ?"
+    params.append(page_size + 1)
+
+    async with get_pool().read() as db:
+        async with db.execute(query, params) as db_cursor:
+            rows = await db_cursor.fetchall()
+    return split_page(rows, page_size)
+
+async def iter_orders(status=None, page_size=None):
+    """Перебор всех заказов постранично, не загружая их в память целиком"""
+    cursor = None
+    while True:
+        rows, cursor = await get_orders_by_status(status, cursor=cursor, page_size=page_size)
+        for row in rows:
+            yield row
+        if not cursor:
+            break
+
+async def export_orders(file, fmt, status=None, date_from=None, date_to=None):
+    """Выгрузка заказов в открытый текстовый файл; возвращает число заказов"""
+    async with get_pool().read() as db:
+        return await export.write_export(db, file, fmt, status, date_from, date_to)
 
 async def update_order_status(order_id, status, cancelled_reason=None):
-    async with aiosqlite.connect(DB_PATH) as db:
+    released_window_id = None
+    async with get_pool().write() as db:
+        before = await _begin_availability_write(db)
         if status == 'cancelled' and cancelled_reason:
-            await db.execute("""
-                UPDATE orders 
-                SET status = ?, cancelled_reason = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            """, (status, cancelled_reason, order_id))
+            cursor = await db.execute(booking.CANCEL_ORDER_SQL, (cancelled_reason, order_id))
             
-            # Освобождаем временное окно
-            await db.execute("""
-                UPDATE meeting_windows 
-                SET current_bookings = current_bookings - 1,
-                    assigned_user_id = NULL,
-                    is_available = 1
-                WHERE id = (SELECT meeting_window_id FROM orders WHERE id = ?)
-            """, (order_id,))
+            # Освобождаем временное окно (только при первой отмене)
+            if cursor.rowcount:
+                released_window_id = await _get_order_window_id(db, order_id)
+                await db.execute(booking.RELEASE_WINDOW_SQL, (order_id,))
         else:
-            await db.execute("""
+            cursor = await db.execute("""
                 UPDATE orders 
                 SET status = ?, updated_at = CURRENT_TIMESTAMP
                 WHERE id = ?
             """, (status, order_id))
-        await db.commit()
+        
+        # Уведомление владельцу заказа ставится в очередь в той же транзакции
+        if cursor.rowcount:
+            await db.execute(outbox.ENQUEUE_FOR_ORDER_SQL,
+                             (outbox.order_status_text(order_id, status, cancelled_reason or ""), order_id))
+        versions = before, await booking.read_availability_version(db)
+    if released_window_id:
+        availability.apply_release(released_window_id, versions)
 
 async def get_order_by_id(order_id):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with get_pool().read() as db:
         async with db.execute("""
             SELECT o.*, u.full_name, u.username, u.telegram_id,
                    mw.start_time as window_start, mw.end_time as window_end,
@@ -334,46 +440,149 @@ async def get_order_by_id(order_id):
 
 # Feedback
 async def add_feedback(order_id, rating, comment=""):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_pool().write() as db:
         await db.execute("""
             INSERT INTO feedback (order_id, rating, comment) 
             VALUES (?, ?, ?)
         """, (order_id, rating, comment))
-        await db.commit()
 
 # Notifications
 async def send_notification(user_id, message):
-    async with aiosqlite.connect(DB_PATH) as db:
+    """Постановка уведомления пользователю в очередь отправки"""
+    async with get_pool().write() as db:
+        await db.execute(outbox.ENQUEUE_FOR_USER_SQL, (message, user_id))
+
+async def fetch_due_notifications(now, limit):
+    """Очередные неотправленные уведомления"""
+    async with get_pool().read() as db:
+        async with db.execute(outbox.SELECT_DUE_SQL, (now, limit)) as cursor:
+            return await cursor.fetchall()
+
+async def save_notification_results(delivered, retries, failed):
+    """
+    Запись результатов отправки одной транзакцией.
+    delivered — id, retries — (next_attempt_at, ошибка, id), failed — (ошибка, id)
+    """
+    async with get_pool().write() as db:
+        if delivered:
+            await db.executemany(outbox.MARK_DELIVERED_SQL, [(notification_id,) for notification_id in delivered])
+        if retries:
+            await db.executemany(outbox.MARK_RETRY_SQL, retries)
+        if failed:
+            await db.executemany(outbox.MARK_FAILED_SQL, failed)
+
+async def get_notification_counts():
+    """Количество уведомлений по статусам"""
+    async with get_pool().read() as db:
+        async with db.execute(outbox.COUNT_BY_STATUS_SQL) as cursor:
+            return {row['status']: row['count'] for row in await cursor.fetchall()}
+
+# Broadcasts
+async def create_broadcast(segment, segment_value, message, admin_chat_id=None, status_message_id=None):
+    """
+    Создание рассылки и постановка всех получателей в очередь одной транзакцией.
+    Возвращает (broadcast_id, количество получателей).
+    """
+    async with get_pool().write() as db:
+        cursor = await db.execute(broadcasts.INSERT_BROADCAST_SQL,
+                                  (segment, segment_value, message, admin_chat_id, status_message_id))
+        broadcast_id = cursor.lastrowid
+        params = [message, broadcast_id, time.time()]
+        if segment in broadcasts.SEGMENTS_WITH_VALUE:
+            params.append(segment_value)
+        cursor = await db.execute(broadcasts.recipients_query(segment), params)
+        total = cursor.rowcount
+        await db.execute(broadcasts.SET_TOTAL_SQL, (total, broadcast_id))
+        if total == 0:
+            await db.execute(broadcasts.FINISH_SQL, (broadcast_id,))
+    return broadcast_id, total
+
+async def get_running_broadcasts():
+    async with get_pool().read() as db:
+        async with db.execute(broadcasts.SELECT_RUNNING_SQL) as cursor:
+            return await cursor.fetchall()
+
+async def get_broadcast_progress(broadcast_id):
+    """Количество уведомлений рассылки по статусам"""
+    async with get_pool().read() as db:
+        async with db.execute(broadcasts.PROGRESS_SQL, (broadcast_id,)) as cursor:
+            return {row['status']: row['count'] for row in await cursor.fetchall()}
+
+async def finish_broadcast(broadcast_id):
+    async with get_pool().write() as db:
+        await db.execute(broadcasts.FINISH_SQL, (broadcast_id,))
+
+# Telegram file_id
+async def get_telegram_file_id(cache_key):
+    async with get_pool().read() as db:
+        async with db.execute("SELECT file_id FROM telegram_files WHERE cache_key = ?", (cache_key,)) as cursor:
+            row = await cursor.fetchone()
+            return row[0] if row else None
+
+async def save_telegram_file_id(cache_key, file_id, prefix=None, keep=20):
+    """Сохранение file_id; с prefix оставляются только keep последних ключей с этим префиксом"""
+    async with get_pool().write() as db:
         await db.execute("""
-            INSERT INTO notifications (user_id, message) 
+            INSERT OR REPLACE INTO telegram_files (cache_key, file_id)
             VALUES (?, ?)
-        """, (user_id, message))
-        await db.commit()
+        """, (cache_key, file_id))
+        if prefix:
+            await db.execute("""
+                DELETE FROM telegram_files
+                WHERE cache_key LIKE ? AND cache_key NOT IN (
+                    SELECT cache_key FROM telegram_files
+                    WHERE cache_key LIKE ?
+                    ORDER BY rowid DESC
+                    LIMIT ?
+                )
+            """, (prefix + '%', prefix + '%', keep))
+
+async def delete_telegram_file_id(cache_key):
+    async with get_pool().write() as db:
+        await db.execute("DELETE FROM telegram_files WHERE cache_key = ?", (cache_key,))
+
+# Leases
+async def acquire_lease(name, holder, ttl):
+    """Попытка занять аренду (свободную, просроченную или свою)"""
+    async with get_pool().write() as db:
+        return await leases.acquire(db, name, holder, ttl)
+
+async def renew_lease(name, holder, ttl):
+    """Продление аренды; False — аренда потеряна"""
+    async with get_pool().write() as db:
+        return await leases.renew(db, name, holder, ttl)
+
+async def release_lease(name, holder):
+    async with get_pool().write() as db:
+        await leases.release(db, name, holder)
+
+# FSM
+async def load_fsm_record(key):
+    """Состояние и данные FSM по ключу aiogram"""
+    async with get_pool().read() as db:
+        return await fsm.load(db, key)
+
+async def save_fsm_records(records):
+    """Запись пачки состояний FSM одной транзакцией"""
+    async with get_pool().write() as db:
+        await fsm.save(db, records)
+
+async def cleanup_fsm(ttl):
+    async with get_pool().write() as db:
+        return await fsm.cleanup(db, ttl)
 
 # Stats
-async def get_stats_data():
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        stats = {}
-        
-        # Всего заказов
-        async with db.execute("SELECT COUNT(*) as count FROM orders") as cursor:
-            row = await cursor.fetchone()
-            stats['total_orders'] = row['count'] if row else 0
-        
-        # Активных встреч
-        async with db.execute("SELECT COUNT(*) as count FROM orders WHERE status = 'pending'") as cursor:
-            row = await cursor.fetchone()
-            stats['active_meetings'] = row['count'] if row else 0
-        
-        # Всего пользователей
-        async with db.execute("SELECT COUNT(*) as count FROM users") as cursor:
+async def get_stats_version():
+    """Версия данных графиков статистики"""
+    async with get_pool().read() as db:
+        async with db.execute(counters.STATS_VERSION_SQL) as cursor:
             row = await cursor.fetchone()
-            stats['total_users'] = row['count'] if row else 0
-        
-        # Средний рейтинг
-        async with db.execute("SELECT AVG(rating) as avg_rating FROM feedback") as cursor:
-            row = await cursor.fetchone()
-            stats['avg_rating'] = round(row['avg_rating'], 1) if row and row['avg_rating'] else 0
-            
-        return stats
\ No newline at end of file
+            return row[0] if row else 0
+
+async def get_stats_data():
+    async with get_pool().read() as db:
+        async with db.execute(counters.STATS_COUNTERS_SQL) as cursor:
+            return counters.stats_from_row(await cursor.fetchone())
+
+# Время выполнения каждой функции модуля (db_function_duration_seconds)
+instrument_module(globals(), DB_FUNCTION_DURATION)
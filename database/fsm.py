@@ -0,0 +1,101 @@
+# Хранилище FSM aiogram в SQLite (таблицы fsm_states и fsm_data).
+# Запись пустого состояния или пустых данных удаляет строку, поэтому
+# в таблицах лежат только активные диалоги. Записи, не менявшиеся
+# дольше TTL, удаляются cleanup().
+import json
+import time
+
+KEY_COLUMNS = "bot_id, chat_id, user_id, thread_id, business_connection_id, destiny"
+KEY_CONDITION = """
+    bot_id = ? AND chat_id = ? AND user_id = ? AND thread_id = ?
+    AND business_connection_id = ? AND destiny = ?
+"""
+
+SELECT_STATE_SQL = f"SELECT state FROM fsm_states WHERE {KEY_CONDITION}"
+SELECT_DATA_SQL = f"SELECT data FROM fsm_data WHERE {KEY_CONDITION}"
+
+UPSERT_STATE_SQL = f"""
+    INSERT INTO fsm_states ({KEY_COLUMNS}, state, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT ({KEY_COLUMNS}) DO UPDATE SET
+        state = excluded.state,
+        updated_at = excluded.updated_at
+"""
+UPSERT_DATA_SQL = f"""
+    INSERT INTO fsm_data ({KEY_COLUMNS}, data, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT ({KEY_COLUMNS}) DO UPDATE SET
+        data = excluded.data,
+        updated_at = excluded.updated_at
+"""
+
+DELETE_STATE_SQL = f"DELETE FROM fsm_states WHERE {KEY_CONDITION}"
+DELETE_DATA_SQL = f"DELETE FROM fsm_data WHERE {KEY_CONDITION}"
+
+CLEANUP_SQL = [
+    "DELETE FROM fsm_states WHERE updated_at < ?",
+    "DELETE FROM fsm_data WHERE updated_at < ?",
+]
+
+
+def key_params(key):
+    """Параметры первичного ключа из aiogram StorageKey"""
+    return (
+        key.bot_id, key.chat_id, key.user_id, key.thread_id or 0,
+        key.business_connection_id or '', key.destiny,
+    )
+
+
+def dump_data(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+async def load(db, key):
+    """Состояние и данные по ключу: (state | None, dict)"""
+    params = key_params(key)
+    async with db.execute(SELECT_STATE_SQL, params) as cursor:
+        state_row = await cursor.fetchone()
+    async with db.execute(SELECT_DATA_SQL, params) as cursor:
+        data_row = await cursor.fetchone()
+    return (
+        state_row[0] if state_row else None,
+        json.loads(data_row[0]) if data_row else {},
+    )
+
+
+async def save(db, records, now=None):
+    """
+    Запись пачки (key, state, data) в текущей транзакции.
+    data — уже сериализованная строка JSON или None для пустых данных.
+    """
+    now = time.time() if now is None else now
+    upsert_states, delete_states, upsert_data, delete_data = [], [], [], []
+    for key, state, data in records:
+        params = key_params(key)
+        if state is None:
+            delete_states.append(params)
+        else:
+            upsert_states.append(params + (state, now))
+        if data is None:
+            delete_data.append(params)
+        else:
+            upsert_data.append(params + (data, now))
+
+    if upsert_states:
+        await db.executemany(UPSERT_STATE_SQL, upsert_states)
+    if delete_states:
+        await db.executemany(DELETE_STATE_SQL, delete_states)
+    if upsert_data:
+        await db.executemany(UPSERT_DATA_SQL, upsert_data)
+    if delete_data:
+        await db.executemany(DELETE_DATA_SQL, delete_data)
+
+
+async def cleanup(db, ttl, now=None):
+    """Удаление записей, не менявшихся дольше ttl секунд; число удаленных строк"""
+    now = time.time() if now is None else now
+    deleted = 0
+    for sql in CLEANUP_SQL:
+        cursor = await db.execute(sql, (now - ttl,))
+        deleted += cursor.rowcount
+    return deleted
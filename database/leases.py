@@ -0,0 +1,86 @@
+# Аренды с heartbeat (таблица leases) для выбора лидера между процессами.
+# Занять аренду можно, только если она свободна или просрочена; владелец
+# продлевает ее, пока жив. Захват — один UPSERT, поэтому два процесса
+# не могут получить аренду одновременно.
+# Используется и ботом (aiosqlite), и веб-сервером (sqlite3).
+import os
+import socket
+import time
+import uuid
+
+# Аренда процесса Telegram-бота
+BOT_LEASE = 'bot'
+
+# Просроченную аренду (или свою) занимает новый владелец
+ACQUIRE_SQL = """
+    INSERT INTO leases (name, holder, pid, hostname, acquired_at, heartbeat_at, expires_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (name) DO UPDATE SET
+        holder = excluded.holder,
+        pid = excluded.pid,
+        hostname = excluded.hostname,
+        acquired_at = excluded.acquired_at,
+        heartbeat_at = excluded.heartbeat_at,
+        expires_at = excluded.expires_at
+    WHERE leases.holder = excluded.holder OR leases.expires_at < excluded.heartbeat_at
+"""
+
+# Продление только текущим владельцем; pid меняется, если аренду занял
+# воркер, а продлевает запущенный им процесс бота
+RENEW_SQL = """
+    UPDATE leases
+    SET heartbeat_at = ?, expires_at = ?, pid = ?, hostname = ?
+    WHERE name = ? AND holder = ?
+"""
+
+RELEASE_SQL = "DELETE FROM leases WHERE name = ? AND holder = ?"
+
+SELECT_LEASE_SQL = "SELECT * FROM leases WHERE name = ?"
+
+
+def new_holder():
+    """Уникальный идентификатор владельца: хост, pid и случайный суффикс"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def acquire_params(name, holder, ttl, now=None):
+    now = time.time() if now is None else now
+    return (name, holder, os.getpid(), socket.gethostname(), now, now, now + ttl)
+
+
+def renew_params(name, holder, ttl, now=None):
+    now = time.time() if now is None else now
+    return (now, now + ttl, os.getpid(), socket.gethostname(), name, holder)
+
+
+def lease_status(row, now=None):
+    """Словарь состояния аренды для API"""
+    if not row:
+        return {'held': False}
+    now = time.time() if now is None else now
+    status = dict(row)
+    status['held'] = row['expires_at'] >= now
+    status['expires_in'] = round(row['expires_at'] - now, 1)
+    status['heartbeat_age'] = round(now - row['heartbeat_at'], 1)
+    return status
+
+
+def acquire_sync(conn, name, holder, ttl):
+    """Попытка занять аренду через соединение sqlite3 (в текущей транзакции)"""
+    return conn.execute(ACQUIRE_SQL, acquire_params(name, holder, ttl)).rowcount == 1
+
+
+async def acquire(db, name, holder, ttl):
+    """Попытка занять аренду через соединение aiosqlite (в текущей транзакции)"""
+    cursor = await db.execute(ACQUIRE_SQL, acquire_params(name, holder, ttl))
+    return cursor.rowcount == 1
+
+
+async def renew(db, name, holder, ttl):
+    """Продление аренды; False — аренду занял другой процесс"""
+    cursor = await db.execute(RENEW_SQL, renew_params(name, holder, ttl))
+    return cursor.rowcount == 1
+
+
+async def release(db, name, holder):
+    await db.execute(RELEASE_SQL, (name, holder))
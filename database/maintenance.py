@@ -0,0 +1,58 @@
+# Служебные команды для базы данных:
+#   python -m database.maintenance rebuild-counters
+#   python -m database.maintenance backfill-rollups
+import argparse
+import os
+import sqlite3
+
+from database import counters, rollups
+from database.migrate import migrate
+
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def rebuild_counters(db_path):
+    """Пересчет stats_counters по текущим данным"""
+    conn = connect(db_path)
+    try:
+        stats = counters.rebuild_stats_counters(conn)
+    finally:
+        conn.close()
+    print(f"✅ Счетчики пересчитаны: {stats}")
+    return stats
+
+
+def backfill_rollups(db_path):
+    """Заполнение дневных агрегатов stats_daily_* по текущим данным"""
+    conn = connect(db_path)
+    try:
+        sizes = rollups.rebuild_rollups(conn)
+    finally:
+        conn.close()
+    print(f"✅ Дневные агрегаты пересчитаны: {sizes}")
+    return sizes
+
+
+COMMANDS = {
+    'rebuild-counters': rebuild_counters,
+    'backfill-rollups': backfill_rollups,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Обслуживание базы данных бота")
+    parser.add_argument('command', choices=sorted(COMMANDS))
+    parser.add_argument('--db', default=os.environ.get("DATABASE_PATH", "database/bot.db"),
+                        help="путь к базе данных (по умолчанию DATABASE_PATH)")
+    args = parser.parse_args(argv)
+
+    migrate(args.db)
+    COMMANDS[args.command](args.db)
+
+
+if __name__ == "__main__":
+    main()
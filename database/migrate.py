@@ -0,0 +1,83 @@
+import os
+import re
+import sqlite3
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'migrations')
+MIGRATION_FILE_RE = re.compile(r'^(\d+)_.+\.sql$')
+
+
+def list_migrations(directory=MIGRATIONS_DIR):
+    """Список миграций (версия, имя файла, путь) в порядке версий"""
+    migrations = []
+    for name in os.listdir(directory):
+        match = MIGRATION_FILE_RE.match(name)
+        if match:
+            migrations.append((int(match.group(1)), name, os.path.join(directory, name)))
+    migrations.sort()
+    return migrations
+
+
+def split_statements(script):
+    """Разбиение SQL-скрипта на отдельные команды (с учетом тел триггеров)"""
+    statements = []
+    buffer = ''
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            statement = buffer.strip()
+            if statement.rstrip(';').strip():
+                statements.append(statement)
+            buffer = ''
+    if buffer.strip():
+        statements.append(buffer.strip())
+    return statements
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db_path, directory=MIGRATIONS_DIR):
+    """
+    Применение новых миграций к базе данных.
+
+    Текущая версия схемы хранится в PRAGMA user_version. Каждая миграция
+    выполняется в отдельной транзакции BEGIN IMMEDIATE, поэтому несколько
+    процессов могут запускать миграции одновременно.
+    """
+    migrations = list_migrations(directory)
+    latest = migrations[-1][0] if migrations else 0
+
+    db_dir = os.path.dirname(db_path)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+    try:
+        version = get_schema_version(conn)
+        if version >= latest:
+            return version
+
+        for migration_version, name, path in migrations:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Версию перечитываем под блокировкой: другой процесс мог успеть раньше
+                version = get_schema_version(conn)
+                if migration_version <= version:
+                    conn.execute("ROLLBACK")
+                    continue
+                with open(path, 'r', encoding='utf-8') as f:
+                    for statement in split_statements(f.read()):
+                        conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {migration_version}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            version = migration_version
+            print(f"✅ Применена миграция {name}")
+
+        conn.execute("PRAGMA optimize")
+        return version
+    finally:
+        conn.close()
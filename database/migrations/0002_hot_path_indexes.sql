@@ -0,0 +1,12 @@
+-- Проверка лимита незавершенных заказов пользователя (user_id + status)
+CREATE INDEX IF NOT EXISTS idx_orders_user_status ON orders (user_id, status);
+
+-- Список заказов в админ панели: фильтр по статусу и сортировка по дате
+CREATE INDEX IF NOT EXISTS idx_orders_status_created ON orders (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_created ON orders (created_at);
+
+-- Окна диапазона в порядке времени
+CREATE INDEX IF NOT EXISTS idx_meeting_windows_range ON meeting_windows (range_id, start_time);
+
+-- Активные диапазоны на дату в порядке времени
+CREATE INDEX IF NOT EXISTS idx_time_ranges_date_active ON meeting_time_ranges (date, is_active, start_time);
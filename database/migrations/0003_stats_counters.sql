@@ -0,0 +1,80 @@
+-- Счетчики для панели администратора: одна строка с id = 1,
+-- поддерживается триггерами, поэтому чтение не зависит от размера таблиц
+CREATE TABLE IF NOT EXISTS stats_counters (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    total_orders INTEGER NOT NULL DEFAULT 0,
+    pending_orders INTEGER NOT NULL DEFAULT 0,
+    total_users INTEGER NOT NULL DEFAULT 0,
+    rated_feedback INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR REPLACE INTO stats_counters
+    (id, total_orders, pending_orders, total_users, rated_feedback, rating_sum)
+SELECT 1,
+    (SELECT COUNT(*) FROM orders),
+    (SELECT COUNT(*) FROM orders WHERE status = 'pending'),
+    (SELECT COUNT(*) FROM users),
+    (SELECT COUNT(rating) FROM feedback),
+    (SELECT COALESCE(SUM(rating), 0) FROM feedback);
+
+-- Заказы
+CREATE TRIGGER IF NOT EXISTS trg_stats_orders_insert AFTER INSERT ON orders
+BEGIN
+    UPDATE stats_counters
+    SET total_orders = total_orders + 1,
+        pending_orders = pending_orders + (NEW.status = 'pending')
+    WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_orders_delete AFTER DELETE ON orders
+BEGIN
+    UPDATE stats_counters
+    SET total_orders = total_orders - 1,
+        pending_orders = pending_orders - (OLD.status = 'pending')
+    WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_orders_status AFTER UPDATE OF status ON orders
+WHEN (OLD.status = 'pending') != (NEW.status = 'pending')
+BEGIN
+    UPDATE stats_counters
+    SET pending_orders = pending_orders + (NEW.status = 'pending') - (OLD.status = 'pending')
+    WHERE id = 1;
+END;
+
+-- Пользователи
+CREATE TRIGGER IF NOT EXISTS trg_stats_users_insert AFTER INSERT ON users
+BEGIN
+    UPDATE stats_counters SET total_users = total_users + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_users_delete AFTER DELETE ON users
+BEGIN
+    UPDATE stats_counters SET total_users = total_users - 1 WHERE id = 1;
+END;
+
+-- Отзывы: AVG(rating) = rating_sum / rated_feedback (NULL-оценки не учитываются)
+CREATE TRIGGER IF NOT EXISTS trg_stats_feedback_insert AFTER INSERT ON feedback
+BEGIN
+    UPDATE stats_counters
+    SET rated_feedback = rated_feedback + (NEW.rating IS NOT NULL),
+        rating_sum = rating_sum + COALESCE(NEW.rating, 0)
+    WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_feedback_delete AFTER DELETE ON feedback
+BEGIN
+    UPDATE stats_counters
+    SET rated_feedback = rated_feedback - (OLD.rating IS NOT NULL),
+        rating_sum = rating_sum - COALESCE(OLD.rating, 0)
+    WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_feedback_rating AFTER UPDATE OF rating ON feedback
+BEGIN
+    UPDATE stats_counters
+    SET rated_feedback = rated_feedback + (NEW.rating IS NOT NULL) - (OLD.rating IS NOT NULL),
+        rating_sum = rating_sum + COALESCE(NEW.rating, 0) - COALESCE(OLD.rating, 0)
+    WHERE id = 1;
+END;
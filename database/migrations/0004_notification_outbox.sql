@@ -0,0 +1,16 @@
+-- Таблица notifications становится очередью исходящих сообщений (outbox):
+-- строка добавляется в той же транзакции, что и изменение заказа,
+-- а воркер бота отправляет ее и отмечает результат
+ALTER TABLE notifications ADD COLUMN chat_id INTEGER;
+ALTER TABLE notifications ADD COLUMN status TEXT NOT NULL DEFAULT 'pending';
+ALTER TABLE notifications ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE notifications ADD COLUMN next_attempt_at REAL NOT NULL DEFAULT 0;
+ALTER TABLE notifications ADD COLUMN last_error TEXT;
+ALTER TABLE notifications ADD COLUMN delivered_at DATETIME;
+
+-- Старые строки никто не отправлял; не рассылаем их задним числом
+UPDATE notifications
+SET status = 'failed', last_error = 'Создано до появления очереди уведомлений';
+
+-- Выборка очередных сообщений воркером
+CREATE INDEX IF NOT EXISTS idx_notifications_outbox ON notifications (status, next_attempt_at);
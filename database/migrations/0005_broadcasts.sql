@@ -0,0 +1,20 @@
+-- Рассылки администратора: получатели попадают в очередь notifications
+-- одним запросом, поэтому после перезапуска бота рассылка продолжается
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    segment TEXT NOT NULL,
+    segment_value TEXT,
+    message TEXT NOT NULL,
+    admin_chat_id INTEGER,
+    status_message_id INTEGER,
+    total INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'running',
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    finished_at DATETIME
+);
+
+ALTER TABLE notifications ADD COLUMN broadcast_id INTEGER REFERENCES broadcasts (id);
+
+-- Прогресс рассылки: количество уведомлений по статусам
+CREATE INDEX IF NOT EXISTS idx_notifications_broadcast ON notifications (broadcast_id, status);
+CREATE INDEX IF NOT EXISTS idx_broadcasts_status ON broadcasts (status);
@@ -0,0 +1,63 @@
+-- Версия данных для кэша изображений статистики: увеличивается при любом
+-- изменении таблиц, из которых строятся графики
+ALTER TABLE stats_counters ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_version_orders_insert AFTER INSERT ON orders
+BEGIN
+    UPDATE stats_counters SET data_version = data_version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_version_orders_update AFTER UPDATE ON orders
+BEGIN
+    UPDATE stats_counters SET data_version = data_version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_version_orders_delete AFTER DELETE ON orders
+BEGIN
+    UPDATE stats_counters SET data_version = data_version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_version_users_insert AFTER INSERT ON users
+BEGIN
+    UPDATE stats_counters SET data_version = data_version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_version_users_update AFTER UPDATE ON users
+BEGIN
+    UPDATE stats_counters SET data_version = data_version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_version_users_delete AFTER DELETE ON users
+BEGIN
+    UPDATE stats_counters SET data_version = data_version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_version_feedback_insert AFTER INSERT ON feedback
+BEGIN
+    UPDATE stats_counters SET data_version = data_version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_version_feedback_update AFTER UPDATE ON feedback
+BEGIN
+    UPDATE stats_counters SET data_version = data_version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_version_feedback_delete AFTER DELETE ON feedback
+BEGIN
+    UPDATE stats_counters SET data_version = data_version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_version_locations_insert AFTER INSERT ON locations
+BEGIN
+    UPDATE stats_counters SET data_version = data_version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_version_locations_update AFTER UPDATE ON locations
+BEGIN
+    UPDATE stats_counters SET data_version = data_version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_version_locations_delete AFTER DELETE ON locations
+BEGIN
+    UPDATE stats_counters SET data_version = data_version + 1 WHERE id = 1;
+END;
@@ -0,0 +1,7 @@
+-- file_id файлов, уже загруженных в Telegram (например, изображений /stats):
+-- повторная отправка по file_id не требует новой загрузки
+CREATE TABLE IF NOT EXISTS telegram_files (
+    cache_key TEXT PRIMARY KEY,
+    file_id TEXT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,194 @@
+-- Дневные агрегаты для графиков статистики: графики читают несколько строк
+-- на день вместо полного просмотра orders и feedback.
+-- Поддерживаются триггерами: изменение заказа или отзыва вычитает его старый
+-- вклад из строки своего дня и добавляет новый. Пересчет с нуля:
+--   python -m database.maintenance backfill-rollups
+
+-- Заказы по дню создания и статусу: количество, открытки по типам и
+-- суммарное время от создания до последнего обновления (часы)
+CREATE TABLE IF NOT EXISTS stats_daily_orders (
+    day TEXT NOT NULL,
+    status TEXT NOT NULL,
+    orders INTEGER NOT NULL DEFAULT 0,
+    card_type_1 INTEGER NOT NULL DEFAULT 0,
+    card_type_2 INTEGER NOT NULL DEFAULT 0,
+    card_type_3 INTEGER NOT NULL DEFAULT 0,
+    hours_sum REAL NOT NULL DEFAULT 0,
+    hours_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, status)
+) WITHOUT ROWID;
+
+-- Заказы по дню создания и месту встречи
+CREATE TABLE IF NOT EXISTS stats_daily_locations (
+    day TEXT NOT NULL,
+    location_id INTEGER NOT NULL,
+    orders INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, location_id)
+) WITHOUT ROWID;
+
+-- Отзывы по дню: AVG(rating) = rating_sum / rated (NULL-оценки не учитываются)
+CREATE TABLE IF NOT EXISTS stats_daily_feedback (
+    day TEXT PRIMARY KEY,
+    feedback INTEGER NOT NULL DEFAULT 0,
+    rated INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+-- Начальное заполнение по существующим данным
+INSERT OR REPLACE INTO stats_daily_orders
+    (day, status, orders, card_type_1, card_type_2, card_type_3, hours_sum, hours_count)
+SELECT DATE(created_at), COALESCE(status, ''), COUNT(*),
+       SUM(COALESCE(card_type_1_count, 0)), SUM(COALESCE(card_type_2_count, 0)),
+       SUM(COALESCE(card_type_3_count, 0)),
+       COALESCE(SUM((julianday(updated_at) - julianday(created_at)) * 24), 0),
+       COUNT(julianday(updated_at))
+FROM orders
+WHERE DATE(created_at) IS NOT NULL
+GROUP BY 1, 2;
+
+INSERT OR REPLACE INTO stats_daily_locations (day, location_id, orders)
+SELECT DATE(created_at), location_id, COUNT(*)
+FROM orders
+WHERE DATE(created_at) IS NOT NULL AND location_id IS NOT NULL
+GROUP BY 1, 2;
+
+INSERT OR REPLACE INTO stats_daily_feedback (day, feedback, rated, rating_sum)
+SELECT DATE(created_at), COUNT(*), COUNT(rating), COALESCE(SUM(rating), 0)
+FROM feedback
+WHERE DATE(created_at) IS NOT NULL
+GROUP BY 1;
+
+-- Заказы
+CREATE TRIGGER IF NOT EXISTS trg_rollup_orders_insert AFTER INSERT ON orders
+BEGIN
+    INSERT INTO stats_daily_orders
+        (day, status, orders, card_type_1, card_type_2, card_type_3, hours_sum, hours_count)
+    SELECT DATE(NEW.created_at), COALESCE(NEW.status, ''), 1,
+           COALESCE(NEW.card_type_1_count, 0), COALESCE(NEW.card_type_2_count, 0),
+           COALESCE(NEW.card_type_3_count, 0),
+           COALESCE((julianday(NEW.updated_at) - julianday(NEW.created_at)) * 24, 0),
+           julianday(NEW.updated_at) IS NOT NULL
+    WHERE DATE(NEW.created_at) IS NOT NULL
+    ON CONFLICT (day, status) DO UPDATE SET
+        orders = orders + excluded.orders,
+        card_type_1 = card_type_1 + excluded.card_type_1,
+        card_type_2 = card_type_2 + excluded.card_type_2,
+        card_type_3 = card_type_3 + excluded.card_type_3,
+        hours_sum = hours_sum + excluded.hours_sum,
+        hours_count = hours_count + excluded.hours_count;
+
+    INSERT INTO stats_daily_locations (day, location_id, orders)
+    SELECT DATE(NEW.created_at), NEW.location_id, 1
+    WHERE DATE(NEW.created_at) IS NOT NULL AND NEW.location_id IS NOT NULL
+    ON CONFLICT (day, location_id) DO UPDATE SET orders = orders + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_orders_delete AFTER DELETE ON orders
+BEGIN
+    UPDATE stats_daily_orders
+    SET orders = orders - 1,
+        card_type_1 = card_type_1 - COALESCE(OLD.card_type_1_count, 0),
+        card_type_2 = card_type_2 - COALESCE(OLD.card_type_2_count, 0),
+        card_type_3 = card_type_3 - COALESCE(OLD.card_type_3_count, 0),
+        hours_sum = hours_sum - COALESCE((julianday(OLD.updated_at) - julianday(OLD.created_at)) * 24, 0),
+        hours_count = hours_count - (julianday(OLD.updated_at) IS NOT NULL)
+    WHERE day = DATE(OLD.created_at) AND status = COALESCE(OLD.status, '');
+
+    UPDATE stats_daily_locations
+    SET orders = orders - 1
+    WHERE day = DATE(OLD.created_at) AND location_id = OLD.location_id;
+
+    DELETE FROM stats_daily_orders
+    WHERE day = DATE(OLD.created_at) AND status = COALESCE(OLD.status, '') AND orders <= 0;
+    DELETE FROM stats_daily_locations
+    WHERE day = DATE(OLD.created_at) AND location_id = OLD.location_id AND orders <= 0;
+END;
+
+-- Смена статуса, даты, места или открыток переносит вклад заказа в новую строку
+CREATE TRIGGER IF NOT EXISTS trg_rollup_orders_update
+AFTER UPDATE OF status, created_at, updated_at, location_id,
+                card_type_1_count, card_type_2_count, card_type_3_count ON orders
+BEGIN
+    UPDATE stats_daily_orders
+    SET orders = orders - 1,
+        card_type_1 = card_type_1 - COALESCE(OLD.card_type_1_count, 0),
+        card_type_2 = card_type_2 - COALESCE(OLD.card_type_2_count, 0),
+        card_type_3 = card_type_3 - COALESCE(OLD.card_type_3_count, 0),
+        hours_sum = hours_sum - COALESCE((julianday(OLD.updated_at) - julianday(OLD.created_at)) * 24, 0),
+        hours_count = hours_count - (julianday(OLD.updated_at) IS NOT NULL)
+    WHERE day = DATE(OLD.created_at) AND status = COALESCE(OLD.status, '');
+
+    UPDATE stats_daily_locations
+    SET orders = orders - 1
+    WHERE day = DATE(OLD.created_at) AND location_id = OLD.location_id;
+
+    INSERT INTO stats_daily_orders
+        (day, status, orders, card_type_1, card_type_2, card_type_3, hours_sum, hours_count)
+    SELECT DATE(NEW.created_at), COALESCE(NEW.status, ''), 1,
+           COALESCE(NEW.card_type_1_count, 0), COALESCE(NEW.card_type_2_count, 0),
+           COALESCE(NEW.card_type_3_count, 0),
+           COALESCE((julianday(NEW.updated_at) - julianday(NEW.created_at)) * 24, 0),
+           julianday(NEW.updated_at) IS NOT NULL
+    WHERE DATE(NEW.created_at) IS NOT NULL
+    ON CONFLICT (day, status) DO UPDATE SET
+        orders = orders + excluded.orders,
+        card_type_1 = card_type_1 + excluded.card_type_1,
+        card_type_2 = card_type_2 + excluded.card_type_2,
+        card_type_3 = card_type_3 + excluded.card_type_3,
+        hours_sum = hours_sum + excluded.hours_sum,
+        hours_count = hours_count + excluded.hours_count;
+
+    INSERT INTO stats_daily_locations (day, location_id, orders)
+    SELECT DATE(NEW.created_at), NEW.location_id, 1
+    WHERE DATE(NEW.created_at) IS NOT NULL AND NEW.location_id IS NOT NULL
+    ON CONFLICT (day, location_id) DO UPDATE SET orders = orders + 1;
+
+    DELETE FROM stats_daily_orders
+    WHERE day = DATE(OLD.created_at) AND status = COALESCE(OLD.status, '') AND orders <= 0;
+    DELETE FROM stats_daily_locations
+    WHERE day = DATE(OLD.created_at) AND location_id = OLD.location_id AND orders <= 0;
+END;
+
+-- Отзывы
+CREATE TRIGGER IF NOT EXISTS trg_rollup_feedback_insert AFTER INSERT ON feedback
+BEGIN
+    INSERT INTO stats_daily_feedback (day, feedback, rated, rating_sum)
+    SELECT DATE(NEW.created_at), 1, NEW.rating IS NOT NULL, COALESCE(NEW.rating, 0)
+    WHERE DATE(NEW.created_at) IS NOT NULL
+    ON CONFLICT (day) DO UPDATE SET
+        feedback = feedback + 1,
+        rated = rated + excluded.rated,
+        rating_sum = rating_sum + excluded.rating_sum;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_feedback_delete AFTER DELETE ON feedback
+BEGIN
+    UPDATE stats_daily_feedback
+    SET feedback = feedback - 1,
+        rated = rated - (OLD.rating IS NOT NULL),
+        rating_sum = rating_sum - COALESCE(OLD.rating, 0)
+    WHERE day = DATE(OLD.created_at);
+
+    DELETE FROM stats_daily_feedback
+    WHERE day = DATE(OLD.created_at) AND feedback <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_feedback_update AFTER UPDATE OF rating, created_at ON feedback
+BEGIN
+    UPDATE stats_daily_feedback
+    SET feedback = feedback - 1,
+        rated = rated - (OLD.rating IS NOT NULL),
+        rating_sum = rating_sum - COALESCE(OLD.rating, 0)
+    WHERE day = DATE(OLD.created_at);
+
+    INSERT INTO stats_daily_feedback (day, feedback, rated, rating_sum)
+    SELECT DATE(NEW.created_at), 1, NEW.rating IS NOT NULL, COALESCE(NEW.rating, 0)
+    WHERE DATE(NEW.created_at) IS NOT NULL
+    ON CONFLICT (day) DO UPDATE SET
+        feedback = feedback + 1,
+        rated = rated + excluded.rated,
+        rating_sum = rating_sum + excluded.rating_sum;
+
+    DELETE FROM stats_daily_feedback
+    WHERE day = DATE(OLD.created_at) AND feedback <= 0;
+END;
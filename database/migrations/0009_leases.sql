@@ -0,0 +1,12 @@
+-- Аренды (leases) для выбора единственного исполнителя среди процессов,
+-- например одного процесса бота на все воркеры gunicorn. Владелец продлевает
+-- аренду, пока жив; просроченную аренду может занять другой процесс
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    pid INTEGER,
+    hostname TEXT,
+    acquired_at REAL NOT NULL,
+    heartbeat_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
@@ -0,0 +1,31 @@
+-- Хранилище FSM aiogram: состояние и данные диалога по ключу
+-- бот/чат/пользователь (+ тема, бизнес-подключение, destiny).
+-- Пустые thread_id и business_connection_id хранятся как 0 и '',
+-- чтобы первичный ключ был уникальным (NULL в ключе не сравниваются).
+-- updated_at — время последней записи, по нему удаляются старые записи
+CREATE TABLE IF NOT EXISTS fsm_states (
+    bot_id INTEGER NOT NULL,
+    chat_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    thread_id INTEGER NOT NULL DEFAULT 0,
+    business_connection_id TEXT NOT NULL DEFAULT '',
+    destiny TEXT NOT NULL DEFAULT 'default',
+    state TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (bot_id, chat_id, user_id, thread_id, business_connection_id, destiny)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS fsm_data (
+    bot_id INTEGER NOT NULL,
+    chat_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    thread_id INTEGER NOT NULL DEFAULT 0,
+    business_connection_id TEXT NOT NULL DEFAULT '',
+    destiny TEXT NOT NULL DEFAULT 'default',
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (bot_id, chat_id, user_id, thread_id, business_connection_id, destiny)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states(updated_at);
+CREATE INDEX IF NOT EXISTS idx_fsm_data_updated ON fsm_data(updated_at);
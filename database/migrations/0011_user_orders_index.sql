@@ -0,0 +1,3 @@
+-- «Мои письма» в боте: заказы одного пользователя страницами по
+-- (created_at, id), новые первыми (id входит в индекс как rowid)
+CREATE INDEX IF NOT EXISTS idx_orders_user_created ON orders (user_id, created_at);
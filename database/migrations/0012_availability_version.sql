@@ -0,0 +1,40 @@
+-- Версия данных индекса доступности: увеличивается триггерами только при
+-- изменении диапазонов и окон. Процессы перезагружают индекс, когда версия
+-- ушла вперед не из-за их собственных записей; записи в другие таблицы
+-- (FSM, аренда, очередь уведомлений, пользователи) индекс не трогают.
+CREATE TABLE IF NOT EXISTS availability_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO availability_version (id, version) VALUES (1, 0);
+
+CREATE TRIGGER IF NOT EXISTS trg_availability_ranges_insert AFTER INSERT ON meeting_time_ranges
+BEGIN
+    UPDATE availability_version SET version = version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_availability_ranges_update AFTER UPDATE ON meeting_time_ranges
+BEGIN
+    UPDATE availability_version SET version = version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_availability_ranges_delete AFTER DELETE ON meeting_time_ranges
+BEGIN
+    UPDATE availability_version SET version = version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_availability_windows_insert AFTER INSERT ON meeting_windows
+BEGIN
+    UPDATE availability_version SET version = version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_availability_windows_update AFTER UPDATE ON meeting_windows
+BEGIN
+    UPDATE availability_version SET version = version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_availability_windows_delete AFTER DELETE ON meeting_windows
+BEGIN
+    UPDATE availability_version SET version = version + 1 WHERE id = 1;
+END;
@@ -0,0 +1,78 @@
+# Очередь исходящих уведомлений (таблица notifications).
+# Уведомление добавляется в той же транзакции, что и изменение заказа,
+# поэтому оно не теряется при сбое отправки и не создается при откате.
+# Отправкой занимается воркер services/outbox.py в процессе бота.
+# Используется и ботом (aiosqlite), и веб-сервером (sqlite3).
+
+ENQUEUE_SQL = """
+    INSERT INTO notifications (user_id, chat_id, message)
+    VALUES (?, ?, ?)
+"""
+
+# Уведомление пользователю по его id в таблице users
+ENQUEUE_FOR_USER_SQL = """
+    INSERT INTO notifications (user_id, chat_id, message)
+    SELECT id, telegram_id, ? FROM users WHERE id = ?
+"""
+
+# Уведомление владельцу заказа
+ENQUEUE_FOR_ORDER_SQL = """
+    INSERT INTO notifications (user_id, chat_id, message)
+    SELECT u.id, u.telegram_id, ?
+    FROM orders o
+    JOIN users u ON o.user_id = u.id
+    WHERE o.id = ? AND u.telegram_id IS NOT NULL
+"""
+
+SELECT_DUE_SQL = """
+    SELECT id, chat_id, message, attempts
+    FROM notifications
+    WHERE status = 'pending' AND next_attempt_at <= ?
+    ORDER BY next_attempt_at, id
+    LIMIT ?
+"""
+
+MARK_DELIVERED_SQL = """
+    UPDATE notifications
+    SET status = 'delivered', attempts = attempts + 1, last_error = NULL,
+        delivered_at = CURRENT_TIMESTAMP
+    WHERE id = ?
+"""
+
+MARK_RETRY_SQL = """
+    UPDATE notifications
+    SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+    WHERE id = ?
+"""
+
+MARK_FAILED_SQL = """
+    UPDATE notifications
+    SET status = 'failed', attempts = attempts + 1, last_error = ?
+    WHERE id = ?
+"""
+
+COUNT_BY_STATUS_SQL = "SELECT status, COUNT(*) AS count FROM notifications GROUP BY status"
+
+
+def order_status_text(order_id, status, reason=""):
+    """Текст уведомления об изменении статуса заказа"""
+    if status == 'cancelled' and reason:
+        return f"❌ Ваш заказ #{order_id} был отменен.\n\nПричина отмены: {reason}\n\nМы приносим свои извинения за неудобства."
+    if status == 'met':
+        return f"🤝 Ваша встреча по заказу #{order_id} состоялась."
+    if status == 'delivered':
+        return f"✅ Ваш заказ #{order_id} был успешно доставлен."
+    if status == 'pending':
+        return f"⏳ Ваш заказ #{order_id} находится в ожидании."
+    return f"ℹ️ Статус вашего заказа #{order_id} изменен на: {status}"
+
+
+def enqueue_sync(conn, chat_id, message, user_id=None):
+    """Постановка уведомления в очередь через соединение sqlite3 (в текущей транзакции)"""
+    return conn.execute(ENQUEUE_SQL, (user_id, chat_id, message)).lastrowid
+
+
+async def enqueue(db, chat_id, message, user_id=None):
+    """Постановка уведомления в очередь через соединение aiosqlite (в текущей транзакции)"""
+    cursor = await db.execute(ENQUEUE_SQL, (user_id, chat_id, message))
+    return cursor.lastrowid
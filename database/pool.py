@@ -0,0 +1,78 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import aiosqlite
+
+
+def pragma_statements(pragmas):
+    """Преобразование словаря PRAGMA в список SQL-команд"""
+    return [f"PRAGMA {name} = {value}" for name, value in (pragmas or {}).items()]
+
+
+class ConnectionPool:
+    """
+    Пул долгоживущих соединений aiosqlite.
+
+    Держит ограниченное число соединений для чтения и одно выделенное
+    соединение для записи, чтобы не открывать новое соединение
+    (и новый фоновый поток) на каждый запрос.
+    """
+
+    def __init__(self, path, readers=4, pragmas=None):
+        self.path = path
+        self.readers_count = max(1, readers)
+        self.pragmas = pragmas or {}
+        self._readers = asyncio.Queue()
+        self._all_readers = []
+        self._writer = None
+        self._write_lock = asyncio.Lock()
+
+    async def _connect(self, read_only=False):
+        conn = await aiosqlite.connect(self.path)
+        conn.row_factory = aiosqlite.Row
+        for statement in pragma_statements(self.pragmas):
+            await conn.execute(statement)
+        if read_only:
+            await conn.execute("PRAGMA query_only = 1")
+        return conn
+
+    async def open(self):
+        """Открытие соединений пула"""
+        # Писатель открывается первым: он переводит базу в режим WAL
+        self._writer = await self._connect()
+        for _ in range(self.readers_count):
+            conn = await self._connect(read_only=True)
+            self._all_readers.append(conn)
+            self._readers.put_nowait(conn)
+
+    async def close(self):
+        """Закрытие всех соединений пула"""
+        async with self._write_lock:
+            for conn in self._all_readers:
+                await conn.close()
+            self._all_readers.clear()
+            self._readers = asyncio.Queue()
+            if self._writer is not None:
+                await self._writer.close()
+                self._writer = None
+
+    @asynccontextmanager
+    async def read(self):
+        """Получение соединения для чтения"""
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def write(self):
+        """Получение соединения для записи с автоматическим commit/rollback"""
+        async with self._write_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+            else:
+                await self._writer.commit()
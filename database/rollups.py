@@ -0,0 +1,77 @@
+# Дневные агрегаты для графиков статистики (таблицы stats_daily_*).
+# Поддерживаются триггерами из миграции 0008_daily_rollups.sql, поэтому
+# графики читают по несколько строк на день, а не всю историю заказов.
+# Пересчет с нуля — python -m database.maintenance backfill-rollups.
+
+# Заказы по дню и статусу; day_number — юлианский номер дня
+DAILY_ORDERS_SQL = """
+    SELECT CAST(julianday(day) + 0.5 AS INTEGER) AS day_number, status, orders,
+           card_type_1, card_type_2, card_type_3, hours_sum, hours_count
+    FROM stats_daily_orders
+"""
+
+DAILY_LOCATIONS_SQL = """
+    SELECT location_id, SUM(orders) AS orders
+    FROM stats_daily_locations
+    GROUP BY location_id
+"""
+
+DAILY_FEEDBACK_SQL = """
+    SELECT CAST(julianday(day) + 0.5 AS INTEGER) AS day_number, rated, rating_sum
+    FROM stats_daily_feedback
+"""
+
+# Пересчет по текущим данным (то же, что начальное заполнение в миграции)
+REBUILD_ROLLUPS_SQL = [
+    "DELETE FROM stats_daily_orders",
+    "DELETE FROM stats_daily_locations",
+    "DELETE FROM stats_daily_feedback",
+    """
+    INSERT INTO stats_daily_orders
+        (day, status, orders, card_type_1, card_type_2, card_type_3, hours_sum, hours_count)
+    SELECT DATE(created_at), COALESCE(status, ''), COUNT(*),
+           SUM(COALESCE(card_type_1_count, 0)), SUM(COALESCE(card_type_2_count, 0)),
+           SUM(COALESCE(card_type_3_count, 0)),
+           COALESCE(SUM((julianday(updated_at) - julianday(created_at)) * 24), 0),
+           COUNT(julianday(updated_at))
+    FROM orders
+    WHERE DATE(created_at) IS NOT NULL
+    GROUP BY 1, 2
+    """,
+    """
+    INSERT INTO stats_daily_locations (day, location_id, orders)
+    SELECT DATE(created_at), location_id, COUNT(*)
+    FROM orders
+    WHERE DATE(created_at) IS NOT NULL AND location_id IS NOT NULL
+    GROUP BY 1, 2
+    """,
+    """
+    INSERT INTO stats_daily_feedback (day, feedback, rated, rating_sum)
+    SELECT DATE(created_at), COUNT(*), COUNT(rating), COALESCE(SUM(rating), 0)
+    FROM feedback
+    WHERE DATE(created_at) IS NOT NULL
+    GROUP BY 1
+    """,
+    # Графики изменились: кэш изображений по старой версии данных не годится
+    "UPDATE stats_counters SET data_version = data_version + 1 WHERE id = 1",
+]
+
+ROLLUP_SIZES_SQL = """
+    SELECT (SELECT COUNT(*) FROM stats_daily_orders) AS daily_orders,
+           (SELECT COUNT(*) FROM stats_daily_locations) AS daily_locations,
+           (SELECT COUNT(*) FROM stats_daily_feedback) AS daily_feedback
+"""
+
+
+def rebuild_rollups(conn):
+    """Пересчет дневных агрегатов через соединение sqlite3; возвращает число строк"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for statement in REBUILD_ROLLUPS_SQL:
+            conn.execute(statement)
+        row = conn.execute(ROLLUP_SIZES_SQL).fetchone()
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return dict(row)
@@ -0,0 +1,140 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from database.pool import pragma_statements
+
+
+class SQLitePool:
+    """
+    Пул соединений sqlite3 для многопоточного веб-сервера.
+
+    Каждый поток воркера получает собственное соединение для чтения,
+    а все записи проходят через одно общее соединение под блокировкой.
+    Соединения открываются лениво, поэтому пул безопасно создавать
+    до fork() воркеров gunicorn.
+    """
+
+    def __init__(self, path, pragmas=None, statement_cache_size=128):
+        self.path = path
+        self.pragmas = pragmas or {}
+        self.statement_cache_size = statement_cache_size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._writer = None
+        self._readers = []
+        self._pid = os.getpid()
+        self._stats = {
+            'checkouts': 0,
+            'hits': 0,
+            'misses': 0,
+            'write_checkouts': 0,
+            'write_waits': 0,
+            'write_wait_seconds': 0.0,
+        }
+
+    def _connect(self, read_only=False, shared=False):
+        conn = sqlite3.connect(
+            self.path,
+            check_same_thread=not shared,
+            cached_statements=self.statement_cache_size,
+        )
+        conn.row_factory = sqlite3.Row
+        for statement in pragma_statements(self.pragmas):
+            conn.execute(statement)
+        if read_only:
+            conn.execute("PRAGMA query_only = 1")
+        return conn
+
+    def _check_fork(self):
+        # После fork() унаследованные соединения использовать нельзя
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._local = threading.local()
+                    self._readers = []
+                    self._writer = None
+                    self._write_lock = threading.Lock()
+                    self._pid = os.getpid()
+
+    def reader(self):
+        """Получение соединения для чтения, закрепленного за текущим потоком"""
+        self._check_fork()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect(read_only=True)
+            self._local.conn = conn
+            with self._lock:
+                self._readers.append(conn)
+                self._stats['misses'] += 1
+                self._stats['checkouts'] += 1
+        else:
+            with self._lock:
+                self._stats['hits'] += 1
+                self._stats['checkouts'] += 1
+        return conn
+
+    def release(self, conn):
+        """Возврат соединения для чтения после запроса"""
+        if conn.in_transaction:
+            conn.rollback()
+
+    @contextmanager
+    def write(self):
+        """Получение общего соединения для записи с commit/rollback"""
+        self._check_fork()
+        waited = 0.0
+        if not self._write_lock.acquire(blocking=False):
+            started = time.perf_counter()
+            self._write_lock.acquire()
+            waited = time.perf_counter() - started
+        try:
+            with self._lock:
+                self._stats['write_checkouts'] += 1
+                if waited:
+                    self._stats['write_waits'] += 1
+                    self._stats['write_wait_seconds'] += waited
+            self._ensure_writer()
+            try:
+                yield self._writer
+            except BaseException:
+                self._writer.rollback()
+                raise
+            else:
+                self._writer.commit()
+        finally:
+            self._write_lock.release()
+
+    def _ensure_writer(self):
+        if self._writer is None:
+            self._writer = self._connect(shared=True)
+
+    def stats(self):
+        """Статистика использования пула"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['readers_open'] = len(self._readers)
+        stats['writer_open'] = self._writer is not None
+        stats['hit_rate'] = round(stats['hits'] / stats['checkouts'], 4) if stats['checkouts'] else 0
+        stats['write_wait_seconds'] = round(stats['write_wait_seconds'], 6)
+        stats['pid'] = os.getpid()
+        return stats
+
+    def close(self):
+        """Закрытие всех соединений пула"""
+        with self._write_lock:
+            with self._lock:
+                for conn in self._readers:
+                    try:
+                        conn.close()
+                    except sqlite3.ProgrammingError:
+                        # Соединение принадлежит другому потоку
+                        pass
+                self._readers = []
+                self._local = threading.local()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
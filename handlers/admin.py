@@ -1,13 +1,20 @@
 from aiogram import Router
-from aiogram.types import Message, WebAppInfo
+from aiogram.types import Message, WebAppInfo, FSInputFile, BufferedInputFile
 from aiogram.filters import Command
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from config import ADMIN_IDS, WEB_APP_URL
-import matplotlib.pyplot as plt
-import io
-import base64
-from database.db import get_stats_data
-from services.stats import generate_stats_image
+import asyncio
+import os
+import tempfile
+from database.db import (
+    get_stats_version, export_orders, create_broadcast,
+    get_telegram_file_id, save_telegram_file_id, delete_telegram_file_id, users_cache
+)
+from services.export import EXPORT_FORMATS, export_filename
+from services.scheduler import stats_text
+from utils.validation import validate_date_format
+from services.stats import generate_stats_image, cache_key
 router = Router()
 
 def is_admin(user_id):
@@ -73,37 +80,150 @@ async def stats_command(message: Message):
         await message.answer("❌ У вас нет прав администратора")
         return
     
+    caption = "📊 Аналитика Почтового Бюро"
     try:
-        # Генерируем изображение статистики
-        stats_image = await generate_stats_image()
+        version = await get_stats_version()
         
-        # Отправляем изображение
-        await message.answer_photo(
-            photo=stats_image,
-            caption="📊 Аналитика Почтового Бюро"
+        # Изображение этой версии уже загружено в Telegram — отправляем по file_id
+        file_id = await get_telegram_file_id(cache_key(version))
+        if file_id:
+            try:
+                await message.answer_photo(photo=file_id, caption=caption)
+                return
+            except TelegramBadRequest as e:
+                print(f"file_id статистики недействителен, загружаем заново: {e}")
+                await delete_telegram_file_id(cache_key(version))
+        
+        # Изображение берется из кэша или рисуется в отдельном процессе
+        rendered_version, stats_image = await generate_stats_image(version)
+        
+        # Отправляем изображение и запоминаем file_id
+        sent = await message.answer_photo(
+            photo=BufferedInputFile(stats_image, filename="stats.png"),
+            caption=caption
         )
+        await save_telegram_file_id(cache_key(rendered_version), sent.photo[-1].file_id, prefix="stats_")
+    except asyncio.TimeoutError:
+        await message.answer("❌ Аналитика строится слишком долго, попробуйте позже")
     except Exception as e:
         print(f"Error generating stats: {e}")
         await message.answer("❌ Ошибка генерации аналитики")
 
+NOTIFY_USAGE = """Использование:
+/notify <telegram_id> <сообщение> - одному пользователю
+/notify all <сообщение> - всем пользователям
+/notify pending <сообщение> - пользователям с заказами в ожидании
+/notify date <YYYY-MM-DD> <сообщение> - записанным на дату
+/notify range <id диапазона> <сообщение> - записанным в диапазон"""
+
+def parse_notify_args(text):
+    """Разбор /notify: (сегмент, значение, сообщение) или None"""
+    args = text.split(maxsplit=1)
+    if len(args) < 2:
+        return None
+    target = args[1].split(maxsplit=1)[0]
+    
+    if target in ('all', 'pending'):
+        parts = args[1].split(maxsplit=1)
+        return (target, None, parts[1]) if len(parts) == 2 else None
+    
+    if target in ('date', 'range'):
+        parts = args[1].split(maxsplit=2)
+        if len(parts) < 3:
+            return None
+        value = parts[1]
+        if target == 'date' and not validate_date_format(value):
+            return None
+        if target == 'range' and not value.isdigit():
+            return None
+        return target, value, parts[2]
+    
+    parts = args[1].split(maxsplit=1)
+    if len(parts) < 2 or not parts[0].isdigit():
+        return None
+    return 'user', parts[0], parts[1]
+
 @router.message(Command("notify"))
 async def notify_command(message: Message):
     if not is_admin(message.from_user.id):
         await message.answer("❌ У вас нет прав администратора")
         return
-        
-    args = message.text.split(maxsplit=2)
-    if len(args) < 3:
-        await message.answer("Использование: /notify <user_id> <сообщение>")
+    
+    parsed = parse_notify_args(message.text)
+    if not parsed:
+        await message.answer(NOTIFY_USAGE)
         return
-        
+    segment, value, text = parsed
+    
+    try:
+        # Статусное сообщение создается заранее: его будет редактировать отчет о прогрессе
+        status_message = await message.answer("📣 Рассылка ставится в очередь...")
+        broadcast_id, total = await create_broadcast(
+            segment, value, text,
+            admin_chat_id=message.chat.id,
+            status_message_id=status_message.message_id
+        )
+        if total == 0:
+            await status_message.edit_text(f"📭 Рассылка #{broadcast_id}: нет получателей")
+        else:
+            await status_message.edit_text(f"📣 Рассылка #{broadcast_id} в очереди: получателей {total}")
+    except Exception as e:
+        print(f"Error creating broadcast: {e}")
+        await message.answer("❌ Ошибка создания рассылки")
+
+@router.message(Command("export"))
+async def export_command(message: Message):
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет прав администратора")
+        return
+    
+    # /export [csv|ndjson] [статус] [с YYYY-MM-DD] [по YYYY-MM-DD]
+    fmt = 'csv'
+    status = None
+    dates = []
+    for arg in message.text.split()[1:]:
+        if arg in EXPORT_FORMATS:
+            fmt = arg
+        elif validate_date_format(arg):
+            dates.append(arg)
+        elif arg in ('pending', 'met', 'delivered', 'cancelled'):
+            status = arg
+        else:
+            await message.answer("Использование: /export [csv|ndjson] [статус] [с YYYY-MM-DD] [по YYYY-MM-DD]")
+            return
+    date_from = dates[0] if dates else None
+    date_to = dates[1] if len(dates) > 1 else None
+    
+    # Выгрузка пишется во временный файл по частям и отправляется документом
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}")
     try:
-        user_id = int(args[1])
-        text = args[2]
-        # Здесь должна быть логика отправки уведомления
-        await message.answer(f"✅ Уведомление отправлено пользователю {user_id}")
-    except ValueError:
-        await message.answer("❌ Неверный формат ID пользователя")
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as file:
+            count = await export_orders(file, fmt, status, date_from, date_to)
+        await message.answer_document(
+            FSInputFile(path, filename=export_filename(fmt)),
+            caption=f"📤 Выгрузка заказов: {count}"
+        )
+    except Exception as e:
+        print(f"Error exporting orders: {e}")
+        await message.answer("❌ Ошибка выгрузки заказов")
+    finally:
+        os.remove(path)
+
+@router.message(Command("queue"))
+async def queue_command(message: Message, update_scheduler=None):
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет прав администратора")
+        return
+    
+    if update_scheduler is None:
+        await message.answer("Планировщик обновлений не подключен")
+        return
+    cache = users_cache.stats()
+    await message.answer(
+        f"{stats_text(update_scheduler.stats())}\n\n"
+        f"👤 Кэш пользователей: {cache['size']} из {cache['maxsize']}, "
+        f"попаданий {cache['hits']}, промахов {cache['misses']} ({cache['hit_rate']:.0%})"
+    )
 
 @router.message(Command("help"))
 async def admin_help(message: Message):
@@ -117,7 +237,11 @@ async def admin_help(message: Message):
 /locations - Управление локациями
 /orders - Управление заказами
 /stats - Аналитика
+/export [csv|ndjson] [статус] [с] [по] - Выгрузка заказов файлом
 /notify <user_id> <сообщение> - Отправить уведомление пользователю
+/notify all|pending <сообщение> - Рассылка по сегменту
+/notify date <дата>|range <id> <сообщение> - Рассылка записанным на дату или в диапазон
+/queue - Очередь обработки обновлений
 /help - Помощь"""
     
     await message.answer(help_text)
\ No newline at end of file
@@ -2,7 +2,9 @@ from aiogram import Router, F
 from aiogram.types import Message, WebAppInfo, InlineKeyboardButton, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.filters import CommandStart, Command
-from database.db import create_user, get_user_by_telegram_id, get_orders_by_user
+from aiogram.exceptions import TelegramBadRequest
+from database.db import create_user, get_user_letters_page
+from keyboards.user_keyboards import LETTERS_PAGE_PREFIX, get_letters_page_menu
 from config import WEB_APP_URL, ADMIN_IDS
 
 router = Router()
@@ -68,71 +70,88 @@ async def start_command(message: Message):
             reply_markup=keyboard.as_markup()
         )
 
-@router.callback_query(F.data == "my_letters")
-async def my_letters(callback: CallbackQuery):
+# Статусы заказа в списке «Мои письма»
+ORDER_STATUS_TEXT = {
+    'pending': 'ожидает',
+    'met': 'встреча состоялась',
+    'delivered': 'доставлено',
+    'cancelled': 'отменено'
+}
+
+def format_letter(order):
+    """Описание одного заказа в списке «Мои письма»"""
+    # Формируем информацию о типах открыток
+    card_types = []
+    if order['card_type_1_count'] and order['card_type_1_count'] > 0:
+        card_types.append(f"красные: {order['card_type_1_count']}")
+    if order['card_type_2_count'] and order['card_type_2_count'] > 0:
+        card_types.append(f"синие: {order['card_type_2_count']}")
+    if order['card_type_3_count'] and order['card_type_3_count'] > 0:
+        card_types.append(f"зеленые: {order['card_type_3_count']}")
+    card_info = ", ".join(card_types) if card_types else "нет открыток"
+    
+    status_text = ORDER_STATUS_TEXT.get(order['status'], order['status'])
+    created_date = order['created_at'][:10] if order['created_at'] else 'неизвестно'
+    
+    lines = [
+        f"📦 Заказ #{order['id']}:",
+        f"   Открытки: {card_info}",
+        f"   Статус: {status_text}",
+    ]
+    if order['window_start'] and order['window_end']:
+        lines.append(f"   Время встречи: {order['window_start']}-{order['window_end']}")
+    lines.append(f"   Дата: {created_date}")
+    return "\n".join(lines)
+
+def format_letters_page(user, orders):
+    """Текст страницы «Мои письма»: заказы страницы и счетчики пользователя"""
+    parts = ["📬 Ваши письма и заказы:"]
+    parts.extend(format_letter(order) for order in orders)
+    parts.append("\n".join([
+        f"Всего отправлено: {user['total_letters']}",
+        f"Категория A: {user['category_a_count']}",
+        f"Категория B: {user['category_b_count']}",
+        f"Категория C: {user['category_c_count']}",
+    ]))
+    parts.append(f"Ваша роль: {user['role_in_chat']}")
+    return "\n\n".join(parts)
+
+async def show_letters_page(callback: CallbackQuery, cursor=None, backward=False):
     user_telegram_id = callback.from_user.id
-    print(f"Запрос заказов для пользователя с Telegram ID: {user_telegram_id}")
     
     try:
-        # Получаем заказы пользователя по Telegram ID
-        orders = await get_orders_by_user(user_telegram_id)
-        print(f"Найдено {len(orders) if orders else 0} заказов для пользователя {user_telegram_id}")
+        try:
+            user, orders, prev_cursor, next_cursor = await get_user_letters_page(
+                user_telegram_id, cursor, backward)
+        except ValueError:
+            # Неверный курсор из callback_data
+            user, orders = None, []
+        if cursor and not orders:
+            # Заказы соседней страницы исчезли: показываем первую
+            user, orders, prev_cursor, next_cursor = await get_user_letters_page(user_telegram_id)
         
-        if not orders or len(orders) == 0:
+        if not orders:
             await callback.message.edit_text("У вас пока нет заказов.")
-            await callback.answer()
-            return
-        
-        orders_text = "📬 Ваши письма и заказы:\n\n"
-        for order in orders:
-            # Подсчитываем общее количество открыток
-            total_cards = (order['card_type_1_count'] or 0) + \
-                         (order['card_type_2_count'] or 0) + \
-                         (order['card_type_3_count'] or 0)
-            
-            # Формируем информацию о типах открыток
-            card_types = []
-            if order['card_type_1_count'] and order['card_type_1_count'] > 0:
-                card_types.append(f"красные: {order['card_type_1_count']}")
-            if order['card_type_2_count'] and order['card_type_2_count'] > 0:
-                card_types.append(f"синие: {order['card_type_2_count']}")
-            if order['card_type_3_count'] and order['card_type_3_count'] > 0:
-                card_types.append(f"зеленые: {order['card_type_3_count']}")
-            
-            card_info = ", ".join(card_types) if card_types else "нет открыток"
-            
-            # Статус заказа
-            status_text = {
-                'pending': 'ожидает',
-                'met': 'встреча состоялась',
-                'delivered': 'доставлено',
-                'cancelled': 'отменено'
-            }.get(order['status'], order['status'])
-            
-            # Форматируем дату
-            created_date = order['created_at'][:10] if order['created_at'] else 'неизвестно'
-            
-            # Время встречи
-            time_info = ""
-            if order['window_start'] and order['window_end']:
-                time_info = f"\n   Время встречи: {order['window_start']}-{order['window_end']}"
-            
-            orders_text += f"📦 Заказ #{order['id']}:\n"
-            orders_text += f"   Открытки: {card_info}\n"
-            orders_text += f"   Статус: {status_text}{time_info}\n"
-            orders_text += f"   Дата: {created_date}\n\n"
-        
-        # Получаем информацию о пользователе
-        user = await get_user_by_telegram_id(user_telegram_id)
-        if user:
-            orders_text += f"Всего отправлено: {user['total_letters']}\n"
-            orders_text += f"Категория A: {user['category_a_count']}\n"
-            orders_text += f"Категория B: {user['category_b_count']}\n"
-            orders_text += f"Категория C: {user['category_c_count']}\n\n"
-            orders_text += f"Ваша роль: {user['role_in_chat']}"
-        
-        await callback.message.edit_text(orders_text)
+        else:
+            await callback.message.edit_text(
+                format_letters_page(user, orders),
+                reply_markup=get_letters_page_menu(prev_cursor, next_cursor)
+            )
+    except TelegramBadRequest as e:
+        # Повторное нажатие на ту же страницу: сообщение не изменилось
+        if "message is not modified" not in str(e):
+            print(f"Error showing user orders: {e}")
     except Exception as e:
         print(f"Error getting user orders: {e}")
         await callback.message.edit_text("Ошибка получения данных пользователя")
-    await callback.answer()
\ No newline at end of file
+    await callback.answer()
+
+@router.callback_query(F.data == "my_letters")
+async def my_letters(callback: CallbackQuery):
+    print(f"Запрос заказов для пользователя с Telegram ID: {callback.from_user.id}")
+    await show_letters_page(callback)
+
+@router.callback_query(F.data.startswith(LETTERS_PAGE_PREFIX))
+async def my_letters_page(callback: CallbackQuery):
+    _, direction, cursor = callback.data.split(":", 2)
+    await show_letters_page(callback, cursor, backward=direction == "prev")
@@ -2,6 +2,9 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import WebAppInfo
 from config import WEB_APP_URL
 
+# callback_data переходов по страницам «Мои письма»: letters:next:<курсор>
+LETTERS_PAGE_PREFIX = "letters:"
+
 def get_main_menu():
     keyboard = InlineKeyboardBuilder()
     keyboard.button(
@@ -24,4 +27,18 @@ def get_order_menu():
         text="🏠 Главное меню",
         callback_data="main_menu"
     )
-    return keyboard.as_markup()
\ No newline at end of file
+    return keyboard.as_markup()
+
+def get_letters_page_menu(prev_cursor=None, next_cursor=None):
+    keyboard = InlineKeyboardBuilder()
+    if prev_cursor:
+        keyboard.button(
+            text="⬅️ Новее",
+            callback_data=f"{LETTERS_PAGE_PREFIX}prev:{prev_cursor}"
+        )
+    if next_cursor:
+        keyboard.button(
+            text="Старше ➡️",
+            callback_data=f"{LETTERS_PAGE_PREFIX}next:{next_cursor}"
+        )
+    return keyboard.as_markup()
@@ -1,24 +1,118 @@
 import asyncio
 import logging
+import signal
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.fsm.storage.memory import MemoryStorage
-from config import BOT_TOKEN
+from config import (
+    BOT_TOKEN, BOT_MODE, FSM_STORAGE, TELEGRAM_API_URL, BOT_METRICS_HOST, BOT_METRICS_PORT,
+)
 from handlers import user, admin, callbacks
-from database.db import init_db
+from database.db import init_db, close_db
+from services.broadcast import BroadcastReporter
+from services.fsm_storage import SQLiteStorage
+from services.leader import BotLease
+from services.metrics import MetricsServer
+from services.stats import warm_up_stats_executor, shutdown_stats_executor
+from services.outbox import OutboxWorker
+from services.scheduler import UpdateScheduler
+from services.webhook import WebhookServer
 
-logging.basicConfig(level=logging.INFO)
+# Точка входа бота: импортирует только aiogram и модули бота (без Flask).
+# Веб-сервер (app.py) запускает ее в отдельном процессе через run_bot().
+
+async def run_webhook(dp, bot, lease):
+    """Прием обновлений через webhook до сигнала остановки или потери аренды"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    
+    async def on_lost():
+        stop.set()
+    lease.start(on_lost=on_lost)
+    
+    server = WebhookServer(dp, bot)
+    await dp.emit_startup(bot=bot)
+    try:
+        await server.start()
+        await stop.wait()
+    finally:
+        await server.stop()
+        await dp.emit_shutdown(bot=bot)
+        await bot.session.close()
+
+async def run_polling(dp, bot, lease):
+    """Прием обновлений через getUpdates; потеря аренды останавливает поллинг"""
+    lease.start(on_lost=dp.stop_polling)
+    # Пока зарегистрирован webhook, getUpdates не работает
+    await bot.delete_webhook()
+    await dp.start_polling(bot)
 
 async def main():
     await init_db()
+    print("✅ База данных инициализирована.")
+    
+    # Только один процесс бота на все воркеры и ручные запуски
+    lease = BotLease()
+    if not await lease.acquire():
+        print("⚠️ Бот уже запущен другим процессом (аренда занята)")
+        await close_db()
+        return
     
-    bot = Bot(token="7904102055:AAHd6J6ah1gnTqb4i8zh3HlPq0POXG7uf3A")
-    dp = Dispatcher(storage=MemoryStorage())
+    bot = Bot(token=BOT_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)))
+    # Состояния диалогов в базе переживают перезапуск; хранилище закрывается
+    # (с записью оставшихся изменений) в dp.emit_shutdown
+    storage = SQLiteStorage() if FSM_STORAGE == 'sqlite' else MemoryStorage()
+    dp = Dispatcher(storage=storage)
     
     dp.include_router(user.router)
     dp.include_router(admin.router)
     dp.include_router(callbacks.router)
     
-    await dp.start_polling(bot)
+    # Параллельная обработка обновлений с очередью на каждого пользователя
+    UpdateScheduler().install(dp)
+    
+    # Отправка уведомлений из очереди и прогресс рассылок
+    outbox_worker = OutboxWorker()
+    outbox_worker.start()
+    broadcast_reporter = BroadcastReporter()
+    broadcast_reporter.start(bot)
+    
+    # Процесс отрисовки /stats запускается заранее, в фоне
+    stats_warm_up = asyncio.create_task(warm_up_stats_executor())
+    
+    # Метрики бота для Prometheus; занятый порт не мешает работе бота
+    metrics_server = MetricsServer(BOT_METRICS_HOST, BOT_METRICS_PORT)
+    if BOT_METRICS_PORT:
+        try:
+            await metrics_server.start()
+        except OSError as e:
+            print(f"❌ Не удалось запустить сервер метрик: {e}")
+    
+    print(f"🤖 Telegram бот запущен ({BOT_MODE})!")
+    try:
+        if BOT_MODE == 'webhook':
+            await run_webhook(dp, bot, lease)
+        else:
+            await run_polling(dp, bot, lease)
+    finally:
+        await lease.stop()
+        await broadcast_reporter.stop()
+        await outbox_worker.stop()
+        await metrics_server.stop()
+        # Прогрев мог не завершиться: задача отменяется до остановки пула
+        stats_warm_up.cancel()
+        await asyncio.gather(stats_warm_up, return_exceptions=True)
+        shutdown_stats_executor()
+        await close_db()
+        print("🛑 Telegram бот остановлен.")
+
+def run_bot():
+    """Запуск бота с собственным event loop (в том числе в дочернем процессе)"""
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
 
 if __name__ == "__main__":
-    await main()
\ No newline at end of file
+    run_bot()
\ No newline at end of file
@@ -0,0 +1,235 @@
+import threading
+
+RANGES_SQL = "SELECT * FROM meeting_time_ranges ORDER BY date, start_time"
+WINDOWS_SQL = "SELECT * FROM meeting_windows ORDER BY range_id, start_time"
+
+# Активные диапазоны за период вместе с окнами и оставшейся вместимостью
+PERIOD_SQL = """
+    SELECT r.id AS range_id, r.date, r.start_time AS range_start, r.end_time AS range_end,
+           r.window_duration_min, r.max_meetings_per_window,
+           w.id AS window_id, w.start_time, w.end_time, w.is_available,
+           MAX(r.max_meetings_per_window - w.current_bookings, 0) AS remaining
+    FROM meeting_time_ranges r
+    LEFT JOIN meeting_windows w ON w.range_id = r.id
+    WHERE r.date BETWEEN ? AND ? AND r.is_active = 1
+    ORDER BY r.date, r.start_time, r.id, w.start_time
+"""
+
+
+class AvailabilityIndex:
+    """
+    Индекс доступности слотов в памяти процесса: дата → диапазоны → окна.
+
+    Загружается целиком из SQLite и обновляется на месте при бронировании,
+    отмене, переключении и удалении диапазонов, поэтому свои изменения
+    видны сразу. Изменения других процессов обнаруживаются по версии
+    availability_version, которую триггеры увеличивают только при записи
+    в диапазоны и окна: если версия в базе не совпадает с версией индекса,
+    индекс перезагружается. Изменение на месте получает версии до и после
+    своей транзакции (versions) и переносит индекс на новую версию, если до
+    транзакции он был актуален, поэтому свои записи перезагрузку не вызывают.
+
+    Каждое изменение на месте увеличивает generation. Строки для load()
+    читаются без блокировки индекса, поэтому загрузку снимка, прочитанного
+    до такого изменения, load() отклоняет: иначе старый снимок затер бы
+    только что примененное бронирование или инвалидацию.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._ranges = {}
+        self._windows = {}
+        self._window_range = {}
+        self._dates = {}
+        self.version = None
+        self.loaded = False
+        self.generation = 0
+
+    def needs_reload(self, version):
+        return not self.loaded or version != self.version
+
+    def _advance(self, versions):
+        # Вызывается под блокировкой после изменения на месте
+        if versions is not None and self.loaded and self.version == versions[0]:
+            self.version = versions[1]
+
+    def invalidate(self):
+        """Пометить индекс устаревшим (перезагрузится при следующем чтении)"""
+        with self._lock:
+            self.loaded = False
+            self.generation += 1
+
+    def load(self, ranges, windows, version=None, generation=None):
+        """
+        Полная загрузка из строк meeting_time_ranges и meeting_windows (уже отсортированных).
+        generation — значение self.generation до чтения строк; если индекс с
+        тех пор изменился, снимок отбрасывается и возвращается False.
+        """
+        range_map = {}
+        date_map = {}
+        for row in ranges:
+            time_range = dict(row)
+            range_map[time_range['id']] = time_range
+            date_map.setdefault(time_range['date'], []).append(time_range['id'])
+
+        window_map = {range_id: [] for range_id in range_map}
+        window_range = {}
+        for row in windows:
+            window = dict(row)
+            if window['range_id'] in window_map:
+                window_map[window['range_id']].append(window)
+                window_range[window['id']] = window['range_id']
+
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            self._ranges = range_map
+            self._windows = window_map
+            self._window_range = window_range
+            self._dates = date_map
+            self.version = version
+            self.loaded = True
+            return True
+
+    # Чтение
+    def active_ranges_by_date(self, date):
+        with self._lock:
+            return [
+                dict(self._ranges[range_id])
+                for range_id in self._dates.get(date, [])
+                if self._ranges[range_id]['is_active']
+            ]
+
+    def windows_by_range(self, range_id, only_available=False):
+        with self._lock:
+            return [
+                dict(window)
+                for window in self._windows.get(range_id, [])
+                if not only_available or window['is_available']
+            ]
+
+    def remaining_capacity(self, window):
+        time_range = self._ranges.get(window['range_id'])
+        if not time_range:
+            return 0
+        return max((time_range['max_meetings_per_window'] or 0) - (window['current_bookings'] or 0), 0)
+
+    # Обновление на месте после успешной записи в SQLite
+    def _find_window(self, window_id):
+        range_id = self._window_range.get(window_id)
+        if range_id is None:
+            return None
+        for window in self._windows.get(range_id, []):
+            if window['id'] == window_id:
+                return window
+        return None
+
+    def apply_booking(self, window_id, user_id, versions=None):
+        with self._lock:
+            window = self._find_window(window_id)
+            if window is None:
+                return
+            max_meetings = self._ranges[window['range_id']]['max_meetings_per_window']
+            self.generation += 1
+            window['current_bookings'] = (window['current_bookings'] or 0) + 1
+            window['assigned_user_id'] = user_id
+            window['is_available'] = 0 if window['current_bookings'] >= max_meetings else 1
+            self._advance(versions)
+
+    def apply_release(self, window_id, versions=None):
+        with self._lock:
+            window = self._find_window(window_id)
+            if window is None:
+                return
+            self.generation += 1
+            window['current_bookings'] = max((window['current_bookings'] or 0) - 1, 0)
+            window['assigned_user_id'] = None
+            window['is_available'] = 1
+            self._advance(versions)
+
+    def set_range_active(self, range_id, is_active, versions=None):
+        with self._lock:
+            self.generation += 1
+            if range_id in self._ranges:
+                self._ranges[range_id]['is_active'] = int(bool(is_active))
+                self._advance(versions)
+
+    def remove_range(self, range_id, versions=None):
+        with self._lock:
+            self.generation += 1
+            time_range = self._ranges.pop(range_id, None)
+            if time_range is None:
+                return
+            for window in self._windows.pop(range_id, []):
+                self._window_range.pop(window['id'], None)
+            date_ranges = self._dates.get(time_range['date'], [])
+            if range_id in date_ranges:
+                date_ranges.remove(range_id)
+            self._advance(versions)
+
+    # Проверка согласованности с SQLite
+    def compare(self, ranges, windows):
+        """Список расхождений между индексом и свежими строками из SQLite"""
+        fresh = AvailabilityIndex()
+        fresh.load(ranges, windows)
+        differences = []
+        with self._lock:
+            for range_id in set(self._ranges) | set(fresh._ranges):
+                ours = self._ranges.get(range_id)
+                theirs = fresh._ranges.get(range_id)
+                if ours != theirs:
+                    differences.append({'range_id': range_id, 'index': ours, 'sqlite': theirs})
+                ours_windows = {w['id']: w for w in self._windows.get(range_id, [])}
+                fresh_windows = {w['id']: w for w in fresh._windows.get(range_id, [])}
+                for window_id in set(ours_windows) | set(fresh_windows):
+                    if ours_windows.get(window_id) != fresh_windows.get(window_id):
+                        differences.append({
+                            'window_id': window_id,
+                            'index': ours_windows.get(window_id),
+                            'sqlite': fresh_windows.get(window_id)
+                        })
+        return differences
+
+
+def fetch_rows_sync(conn):
+    """Чтение строк для индекса через соединение sqlite3"""
+    ranges = conn.execute(RANGES_SQL).fetchall()
+    windows = conn.execute(WINDOWS_SQL).fetchall()
+    return ranges, windows
+
+
+async def fetch_rows(db):
+    """Чтение строк для индекса через соединение aiosqlite"""
+    async with db.execute(RANGES_SQL) as cursor:
+        ranges = await cursor.fetchall()
+    async with db.execute(WINDOWS_SQL) as cursor:
+        windows = await cursor.fetchall()
+    return ranges, windows
+
+
+def group_period_rows(dates, rows):
+    """Группировка строк PERIOD_SQL: дата → диапазоны → окна"""
+    days = {date: [] for date in dates}
+    ranges = {}
+    for row in rows:
+        time_range = ranges.get(row['range_id'])
+        if time_range is None:
+            time_range = {
+                'id': row['range_id'],
+                'start_time': row['range_start'],
+                'end_time': row['range_end'],
+                'window_duration_min': row['window_duration_min'],
+                'max_meetings_per_window': row['max_meetings_per_window'],
+                'windows': []
+            }
+            ranges[row['range_id']] = time_range
+            days.setdefault(row['date'], []).append(time_range)
+        if row['window_id'] is not None:
+            time_range['windows'].append({
+                'id': row['window_id'],
+                'start_time': row['start_time'],
+                'end_time': row['end_time'],
+                'is_available': row['is_available'],
+                'remaining': row['remaining']
+            })
+    return [{'date': date, 'ranges': day_ranges} for date, day_ranges in days.items()]
@@ -0,0 +1,72 @@
+import asyncio
+
+from config import BROADCAST_PROGRESS_INTERVAL
+from database import broadcasts
+from database.db import get_running_broadcasts, get_broadcast_progress, finish_broadcast
+
+
+class BroadcastReporter:
+    """
+    Отображение прогресса рассылок в процессе бота.
+
+    Периодически пересчитывает статусы уведомлений каждой незавершенной
+    рассылки и редактирует одно статусное сообщение администратора.
+    Незавершенные рассылки читаются из базы, поэтому после перезапуска
+    бота отчет продолжается с того же места, а сообщения досылает очередь.
+    """
+
+    def __init__(self, interval=BROADCAST_PROGRESS_INTERVAL):
+        self.bot = None
+        self.interval = interval
+        self._last_text = {}
+        self._task = None
+
+    def start(self, bot):
+        """Запуск отчета фоновой задачей текущего event loop"""
+        self.bot = bot
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        while True:
+            try:
+                await self.report()
+            except Exception as e:
+                print(f"❌ Ошибка обновления прогресса рассылок: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def report(self):
+        """Обновление статусных сообщений всех незавершенных рассылок"""
+        for broadcast in await get_running_broadcasts():
+            counts = await get_broadcast_progress(broadcast['id'])
+            text = broadcasts.progress_text(broadcast, counts)
+            if self._last_text.get(broadcast['id']) != text:
+                await self.show(broadcast, text)
+                self._last_text[broadcast['id']] = text
+            if counts.get('pending', 0) == 0:
+                await finish_broadcast(broadcast['id'])
+                self._last_text.pop(broadcast['id'], None)
+                print(f"✅ Рассылка #{broadcast['id']} завершена: {counts}")
+
+    async def show(self, broadcast, text):
+        if not broadcast['admin_chat_id'] or not broadcast['status_message_id']:
+            return
+        try:
+            await self.bot.edit_message_text(
+                text=text,
+                chat_id=broadcast['admin_chat_id'],
+                message_id=broadcast['status_message_id']
+            )
+        except Exception as e:
+            # Сообщение могли удалить; рассылка при этом продолжается
+            print(f"⚠️ Не удалось обновить статус рассылки #{broadcast['id']}: {e}")
@@ -0,0 +1,113 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+# Выгрузка заказов для бухгалтерии.
+# Строки читаются из курсора SQLite пачками и сразу превращаются в текст,
+# поэтому расход памяти не зависит от количества заказов.
+
+EXPORT_BATCH_SIZE = 500
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+EXPORT_COLUMNS = [
+    'id', 'created_at', 'updated_at', 'status', 'telegram_id', 'user_name',
+    'client_name', 'recipient_name', 'delivery_address',
+    'location_name', 'custom_location', 'window_start', 'window_end',
+    'card_type_1_count', 'card_type_2_count', 'card_type_3_count',
+    'is_anonymous', 'delivery_delay_days', 'target_delivery_date', 'cancelled_reason',
+]
+
+EXPORT_SQL = """
+    SELECT o.id, o.created_at, o.updated_at, o.status, u.telegram_id, u.full_name AS user_name,
+           o.client_name, o.recipient_name, o.delivery_address,
+           l.name AS location_name, o.custom_location,
+           mw.start_time AS window_start, mw.end_time AS window_end,
+           o.card_type_1_count, o.card_type_2_count, o.card_type_3_count,
+           o.is_anonymous, o.delivery_delay_days, o.target_delivery_date, o.cancelled_reason
+    FROM orders o
+    LEFT JOIN users u ON o.user_id = u.id
+    LEFT JOIN meeting_windows mw ON o.meeting_window_id = mw.id
+    LEFT JOIN locations l ON o.location_id = l.id
+"""
+
+
+def build_export_query(status=None, date_from=None, date_to=None):
+    """
+    Запрос выгрузки с фильтрами по статусу и датам создания (YYYY-MM-DD, включительно).
+    Даты сравниваются с created_at напрямую, чтобы работали индексы.
+    """
+    conditions = []
+    params = []
+    if status:
+        conditions.append("o.status = ?")
+        params.append(status)
+    if date_from:
+        conditions.append("o.created_at >= ?")
+        params.append(date_from)
+    if date_to:
+        next_day = datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1)
+        conditions.append("o.created_at < ?")
+        params.append(next_day.strftime("%Y-%m-%d"))
+
+    query = EXPORT_SQL
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY o.created_at, o.id"
+    return query, params
+
+
+def export_filename(fmt):
+    return f"orders_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+
+
+def export_header(fmt):
+    """Начало файла: BOM и заголовок для CSV (Excel корректно открывает кириллицу)"""
+    if fmt == 'csv':
+        return '\ufeff' + format_rows([EXPORT_COLUMNS], fmt)
+    return ''
+
+
+def format_rows(rows, fmt):
+    """Пачка строк в текстовом виде"""
+    if fmt == 'ndjson':
+        return ''.join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + '\n'
+            for row in rows
+        )
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def iter_export(cursor, fmt):
+    """Генератор текста выгрузки из курсора sqlite3"""
+    try:
+        yield export_header(fmt)
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            yield format_rows(rows, fmt)
+    finally:
+        cursor.close()
+
+
+async def write_export(db, file, fmt, status=None, date_from=None, date_to=None):
+    """Запись выгрузки в текстовый файл через соединение aiosqlite; возвращает число заказов"""
+    query, params = build_export_query(status, date_from, date_to)
+    count = 0
+    file.write(export_header(fmt))
+    async with db.execute(query, params) as cursor:
+        while True:
+            rows = await cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            file.write(format_rows(rows, fmt))
+            count += len(rows)
+    return count
@@ -0,0 +1,153 @@
+import asyncio
+import time
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage
+
+from config import FSM_FLUSH_INTERVAL, FSM_CACHE_TTL, FSM_TTL
+from database.db import load_fsm_record, save_fsm_records, cleanup_fsm
+from database.fsm import dump_data
+
+# Как часто удалять из базы записи старше FSM_TTL
+CLEANUP_INTERVAL = 3600
+
+
+class FSMRecord:
+    """Состояние и данные одного ключа в кэше хранилища"""
+
+    __slots__ = ('state', 'data', 'data_json', 'last_used')
+
+    def __init__(self, state, data):
+        self.state = state
+        self.data = data
+        # Сериализованные данные для записи в базу; None — данных нет
+        self.data_json = dump_data(data) if data else None
+        self.last_used = time.monotonic()
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-хранилище aiogram в SQLite с кэшем в памяти процесса.
+
+    Чтение идет из кэша, в базу — только при первом обращении к ключу.
+    Запись меняет кэш и помечает ключ измененным; фоновая задача раз в
+    flush_interval секунд записывает все измененные ключи одной
+    транзакцией, поэтому несколько изменений одного диалога между
+    сбросами дают одну запись. При close() оставшиеся изменения
+    записываются сразу.
+
+    Кэш рассчитан на один процесс бота (его гарантирует аренда бота):
+    изменения из других процессов ключ увидит после вытеснения из кэша.
+    Неактивные ключи вытесняются через cache_ttl секунд, записи в базе
+    удаляются через ttl секунд после последнего изменения.
+    """
+
+    def __init__(self, flush_interval=FSM_FLUSH_INTERVAL, cache_ttl=FSM_CACHE_TTL, ttl=FSM_TTL):
+        self.flush_interval = flush_interval
+        self.cache_ttl = cache_ttl
+        self.ttl = ttl
+        self._cache = {}
+        self._dirty = set()
+        self._flush_lock = asyncio.Lock()
+        self._last_cleanup = 0.0
+        self._task = None
+
+    async def _record(self, key):
+        record = self._cache.get(key)
+        if record is None:
+            state, data = await load_fsm_record(key)
+            # Ключ мог загрузить или изменить параллельный вызов
+            record = self._cache.get(key)
+            if record is None:
+                record = self._cache[key] = FSMRecord(state, data)
+        record.last_used = time.monotonic()
+        return record
+
+    def _mark_dirty(self, key):
+        self._dirty.add(key)
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def set_state(self, key, state=None):
+        record = await self._record(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._mark_dirty(key)
+
+    async def get_state(self, key):
+        return (await self._record(key)).state
+
+    async def set_data(self, key, data):
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        # Сериализуем сразу: несериализуемые данные — ошибка в обработчике,
+        # а не потерянная при сбросе запись
+        data_json = dump_data(data) if data else None
+        record = await self._record(key)
+        record.data = data.copy()
+        record.data_json = data_json
+        self._mark_dirty(key)
+
+    async def get_data(self, key):
+        return (await self._record(key)).data.copy()
+
+    async def flush(self):
+        """Запись измененных ключей в базу; число записанных ключей"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return 0
+            keys, self._dirty = self._dirty, set()
+            records = [(key, self._cache[key].state, self._cache[key].data_json) for key in keys]
+            try:
+                await save_fsm_records(records)
+            except BaseException:
+                # Запишем при следующем сбросе (более новые изменения уже в _dirty)
+                self._dirty |= keys
+                raise
+            return len(records)
+
+    def evict(self, now=None):
+        """Вытеснение из кэша записанных и давно не используемых ключей"""
+        now = time.monotonic() if now is None else now
+        expired = [
+            key for key, record in self._cache.items()
+            if now - record.last_used > self.cache_ttl and key not in self._dirty
+        ]
+        for key in expired:
+            del self._cache[key]
+        return len(expired)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"❌ Ошибка записи состояний FSM: {e}")
+            self.evict()
+
+            now = time.monotonic()
+            if now - self._last_cleanup >= CLEANUP_INTERVAL:
+                self._last_cleanup = now
+                try:
+                    deleted = await cleanup_fsm(self.ttl)
+                    if deleted:
+                        print(f"🧹 Удалено устаревших записей FSM: {deleted}")
+                except Exception as e:
+                    print(f"❌ Ошибка очистки FSM: {e}")
+
+    async def close(self):
+        """Остановка фоновой задачи и запись оставшихся изменений"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"❌ Ошибка записи состояний FSM: {e}")
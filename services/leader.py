@@ -0,0 +1,136 @@
+import asyncio
+import os
+import sqlite3
+import threading
+
+from config import BOT_LEASE_TTL, BOT_LEASE_INTERVAL
+from database import leases
+from database.db import acquire_lease, renew_lease, release_lease
+from database.migrate import migrate
+
+# Через эту переменную окружения воркер передает запущенному им процессу
+# бота идентификатор уже занятой аренды
+LEASE_HOLDER_ENV = 'BOT_LEASE_HOLDER'
+
+
+class BotLease:
+    """
+    Аренда бота в процессе бота.
+
+    Бот занимает аренду при старте (или подтверждает аренду, которую занял
+    запустивший его воркер) и продлевает ее фоновой задачей. Если продлить
+    не удалось, потому что аренду занял другой процесс, вызывается on_lost,
+    и поллинг останавливается: двух ботов, читающих getUpdates, не бывает.
+    """
+
+    def __init__(self, name=leases.BOT_LEASE, ttl=BOT_LEASE_TTL, interval=BOT_LEASE_INTERVAL):
+        self.name = name
+        self.ttl = ttl
+        self.interval = interval
+        self.holder = os.environ.get(LEASE_HOLDER_ENV) or leases.new_holder()
+        self.held = False
+        self._task = None
+
+    async def acquire(self):
+        """Занять аренду; False — бот уже запущен другим процессом"""
+        self.held = await acquire_lease(self.name, self.holder, self.ttl)
+        return self.held
+
+    def start(self, on_lost):
+        """Запуск продления аренды фоновой задачей текущего event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run(on_lost))
+        return self._task
+
+    async def stop(self):
+        """Остановка продления и освобождение аренды"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.held:
+            await release_lease(self.name, self.holder)
+            self.held = False
+
+    async def run(self, on_lost):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                renewed = await renew_lease(self.name, self.holder, self.ttl)
+            except Exception as e:
+                # Временная ошибка базы: пробуем снова, пока аренда не истекла
+                print(f"❌ Ошибка продления аренды бота: {e}")
+                continue
+            if not renewed:
+                self.held = False
+                print("⚠️ Аренда бота занята другим процессом, бот останавливается")
+                try:
+                    await on_lost()
+                except Exception as e:
+                    print(f"❌ Ошибка остановки бота: {e}")
+                return
+
+
+class BotSupervisor:
+    """
+    Запуск единственного процесса бота из воркеров веб-сервера.
+
+    Каждый воркер раз в interval секунд проверяет аренду бота. Если она
+    свободна или просрочена (бот не запускался или его процесс умер),
+    воркер занимает ее и запускает процесс бота через start_bot(holder).
+    Дальше аренду продлевает сам бот, поэтому перезапуск воркера, который
+    его запустил, не приводит ко второму боту.
+    """
+
+    def __init__(self, db_path, start_bot, bot_alive, name=leases.BOT_LEASE,
+                 ttl=BOT_LEASE_TTL, interval=BOT_LEASE_INTERVAL):
+        self.db_path = db_path
+        self.start_bot = start_bot
+        self.bot_alive = bot_alive
+        self.name = name
+        self.ttl = ttl
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Запуск проверки аренды в фоновом потоке"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name='bot-supervisor', daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        # Таблица аренды создается миграцией; веб-сервер может стартовать раньше бота
+        try:
+            migrate(self.db_path)
+        except Exception as e:
+            print(f"❌ Ошибка применения миграций: {e}")
+        while not self._stop.is_set():
+            try:
+                self.check()
+            except Exception as e:
+                print(f"❌ Ошибка проверки аренды бота: {e}")
+            self._stop.wait(self.interval)
+
+    def check(self):
+        """Запуск бота, если аренда свободна; True — бот запущен этим воркером"""
+        if self.bot_alive():
+            return False
+        holder = leases.new_holder()
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                acquired = leases.acquire_sync(conn, self.name, holder, self.ttl)
+        finally:
+            conn.close()
+        if acquired:
+            print(f"👑 Аренда бота занята воркером {os.getpid()}")
+            self.start_bot(holder)
+        return acquired
@@ -0,0 +1,373 @@
+# Метрики процесса в текстовом формате Prometheus (/metrics).
+#
+# Запись метрики не берет блокировок: каждый поток пишет в свою копию
+# значений (threading.local), а при выдаче /metrics копии суммируются.
+# Значения завершившихся потоков переносятся в общий итог.
+# Воркеры gunicorn раз в interval секунд сохраняют снимок своих значений
+# в общий каталог (<pid>.json, start_snapshots), а /metrics любого воркера
+# суммирует снимки всех процессов — запросы Prometheus к разным воркерам
+# видят одни и те же итоги. Бот отдает свои метрики на отдельном порту
+# (MetricsServer).
+import abc
+import bisect
+import inspect
+import itertools
+import json
+import os
+import threading
+import time
+from functools import wraps
+
+from database import booking
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Границы корзин гистограмм, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+# Все метрики процесса в порядке объявления
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(abc.ABC):
+    """Основа счетчиков и гистограмм: значения по меткам, по потокам"""
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Значения текущего потока: {метки: значение}
+        self._local = threading.local()
+        # Номер копии → (поток, его значения)
+        self._shards = {}
+        self._shard_ids = itertools.count()
+        # Значения завершившихся потоков
+        self._retired = {}
+        self._collect_lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            self._shards[next(self._shard_ids)] = (threading.current_thread(), shard)
+            return shard
+
+    @abc.abstractmethod
+    def _merge(self, total, shard):
+        """Прибавление значений shard к total ({метки: значение})"""
+
+    def collect(self):
+        """Сумма значений всех потоков: {метки: значение}"""
+        with self._collect_lock:
+            total = {}
+            self._merge(total, self._retired)
+            for shard_id, (thread, shard) in list(self._shards.items()):
+                if thread.is_alive():
+                    self._merge(total, shard)
+                else:
+                    # Поток больше не пишет: его значения переходят в итог
+                    del self._shards[shard_id]
+                    self._merge(self._retired, shard)
+                    self._merge(total, shard)
+        return total
+
+    @abc.abstractmethod
+    def samples(self, values):
+        """Строки значений {метки: значение} в текстовом формате"""
+
+    def render(self, values=None):
+        if values is None:
+            values = self.collect()
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        lines.extend(self.samples(values))
+        return lines
+
+
+class Counter(Metric):
+    """Монотонный счетчик (имя метрики должно оканчиваться на _total)"""
+
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def _merge(self, total, shard):
+        for labels, value in list(shard.items()):
+            total[labels] = total.get(labels, 0) + value
+
+    def samples(self, values):
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    """Гистограмма длительностей: корзины, сумма и количество наблюдений"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        shard = self._shard()
+        values = shard.get(labels)
+        if values is None:
+            # Число попаданий в каждую корзину (последняя — +Inf) и сумма
+            values = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def time(self, *labels):
+        """Контекстный менеджер, замеряющий время блока"""
+        return _Timer(self, labels)
+
+    def _merge(self, total, shard):
+        for labels, values in list(shard.items()):
+            values = list(values)
+            current = total.get(labels)
+            if current is None:
+                total[labels] = values
+            else:
+                for i, value in enumerate(values):
+                    current[i] += value
+
+    def samples(self, values):
+        bounds = self.buckets + (float('inf'),)
+        for labels, values in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, values):
+                cumulative += count
+                label_text = _format_labels(self.labelnames, labels, [('le', _format_value(bound))])
+                yield f"{self.name}_bucket{label_text} {cumulative}"
+            label_text = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_text} {_format_value(values[-1])}"
+            yield f"{self.name}_count{label_text} {cumulative}"
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+def timed(histogram, *labels):
+    """Декоратор корутины: длительность каждого вызова в histogram"""
+    def decorator(function):
+        @wraps(function)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, *labels)
+        return wrapper
+    return decorator
+
+
+def instrument_module(namespace, histogram):
+    """
+    Замер времени всех публичных корутин модуля (метка — имя функции).
+    Вызывается в конце модуля с globals(): импортирующие модули получают
+    уже обернутые функции.
+    """
+    module = namespace['__name__']
+    for name, function in list(namespace.items()):
+        if (not name.startswith('_') and inspect.iscoroutinefunction(function)
+                and function.__module__ == module):
+            namespace[name] = timed(histogram, name)(function)
+
+
+def snapshot():
+    """Значения всех метрик процесса для JSON: {имя: [[метки, значение], ...]}"""
+    return {
+        metric.name: [[list(labels), value] for labels, value in metric.collect().items()]
+        for metric in REGISTRY
+    }
+
+
+def write_snapshot(directory):
+    """Снимок значений процесса в directory/<pid>.json (атомарная замена файла)"""
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot(), f)
+    os.replace(temp_path, path)
+
+
+def read_snapshots(directory):
+    """Снимки всех процессов из directory; недочитанные файлы пропускаются"""
+    snapshots = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+class _SnapshotWriter:
+    """Поток, сохраняющий снимок процесса раз в interval секунд"""
+
+    def __init__(self, directory, interval):
+        self.directory = directory
+        self.interval = interval
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='metrics-snapshots', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                write_snapshot(self.directory)
+            except OSError as e:
+                print(f"❌ Ошибка сохранения метрик в {self.directory}: {e}")
+
+
+_snapshot_writer = None
+
+
+def start_snapshots(directory, interval):
+    """
+    Периодические снимки метрик процесса в directory. Поток не переживает
+    fork(), поэтому воркеры gunicorn (в том числе с --preload) запускают
+    свой поток после fork.
+    """
+    global _snapshot_writer
+    os.makedirs(directory, exist_ok=True)
+    first_start = _snapshot_writer is None
+    _snapshot_writer = _SnapshotWriter(directory, interval)
+    _snapshot_writer.start()
+    if first_start and hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=lambda: _snapshot_writer.start())
+
+
+def render(directory=None):
+    """
+    Все метрики в текстовом формате Prometheus: значения текущего процесса
+    или, если задан directory, сумма снимков всех процессов из него
+    """
+    if directory is None:
+        lines = []
+        for metric in REGISTRY:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    # Свой снимок обновляется перед чтением, чтобы ответ включал последние значения
+    write_snapshot(directory)
+    snapshots = read_snapshots(directory)
+    lines = []
+    for metric in REGISTRY:
+        total = {}
+        for values in snapshots:
+            metric._merge(total, {tuple(labels): value for labels, value in values.get(metric.name, ())})
+        lines.extend(metric.render(total))
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """HTTP-сервер /metrics для процесса бота (aiohttp)"""
+
+    def __init__(self, host, port, path='/metrics'):
+        self.host = host
+        self.port = port
+        self.path = path
+        self._runner = None
+
+    async def handle(self, request):
+        from aiohttp import web
+        return web.Response(body=render().encode('utf-8'), headers={'Content-Type': CONTENT_TYPE})
+
+    async def start(self):
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get(self.path, self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        print(f"📈 Метрики бота доступны на {self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+# Метрики приложения
+HTTP_REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds',
+    'Время обработки HTTP-запросов веб-сервера',
+    ('method', 'route', 'status'),
+)
+BOT_HANDLER_DURATION = Histogram(
+    'bot_handler_duration_seconds',
+    'Время работы обработчиков бота',
+    ('handler',),
+)
+DB_FUNCTION_DURATION = Histogram(
+    'db_function_duration_seconds',
+    'Время выполнения функций database/db.py',
+    ('function',),
+    buckets=DB_BUCKETS,
+)
+BOOKINGS = Counter(
+    'bookings_total',
+    'Попытки бронирования окна: success, conflict (окно занято), limit, error',
+    ('source', 'result'),
+)
+NOTIFICATION_SEND_DURATION = Histogram(
+    'notification_send_duration_seconds',
+    'Время отправки уведомлений из очереди в Telegram',
+    ('result',),
+)
+
+
+def booking_result(error):
+    """Метка result для BOOKINGS по тексту ошибки бронирования"""
+    if error is None:
+        return 'success'
+    if error == booking.WINDOW_ERROR:
+        return 'conflict'
+    if error == booking.LIMIT_ERROR:
+        return 'limit'
+    return 'error'
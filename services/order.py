@@ -1,33 +1,24 @@
-from database.db import create_order, book_window, get_order_by_id
+from database.db import book_order
 from datetime import datetime, timedelta
 
 async def process_order(user_id, window_id, location_data, card_data, anonymous=False, delay_days=0):
     """
-    Обработка заказа
+    Обработка заказа: бронирование окна и создание заказа одной транзакцией
     """
-    # Бронируем временное окно
-    if not await book_window(window_id, user_id):
-        return None, "Временное окно уже занято"
-    
     # Рассчитываем дату доставки
     target_delivery_date = None
     if delay_days > 0:
         target_delivery_date = (datetime.now() + timedelta(days=delay_days)).date()
     
-    # Создаем заказ
-    order_id = await create_order(
-        user_id=user_id,
-        meeting_window_id=window_id,
-        location_id=location_data.get('location_id'),
-        custom_location=location_data.get('custom_location'),
-        is_anonymous=anonymous,
-        delivery_delay_days=delay_days,
-        target_delivery_date=target_delivery_date,
-        card_counts=card_data.get('counts', {}),
-        card_descriptions=card_data.get('descriptions', {})
-    )
-    
-    return order_id, None
+    return await book_order(user_id, window_id, {
+        'location_id': location_data.get('location_id'),
+        'custom_location': location_data.get('custom_location'),
+        'is_anonymous': anonymous,
+        'delivery_delay_days': delay_days,
+        'target_delivery_date': target_delivery_date,
+        'card_counts': card_data.get('counts', {}),
+        'card_descriptions': card_data.get('descriptions', {})
+    })
 
 async def mark_order_met(order_id):
     """
@@ -49,12 +40,8 @@ async def cancel_order(order_id, reason):
     """
     Отменить заказ
     """
-    from database.db import update_order_status, free_window
-    from database.db import get_order_by_id
-    
-    order = await get_order_by_id(order_id)
-    if order and order['meeting_window_id']:
-        await free_window(order['meeting_window_id'])
+    from database.db import update_order_status
     
+    # Окно освобождается внутри update_order_status
     await update_order_status(order_id, 'cancelled', reason)
     return True
\ No newline at end of file
@@ -0,0 +1,180 @@
+import asyncio
+import time
+
+import aiohttp
+
+from config import (
+    BOT_TOKEN, TELEGRAM_API_URL, OUTBOX_BATCH_SIZE, OUTBOX_POLL_INTERVAL,
+    OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_BASE, OUTBOX_RETRY_MAX,
+    OUTBOX_GLOBAL_RATE, OUTBOX_CHAT_INTERVAL,
+)
+from database.db import fetch_due_notifications, save_notification_results
+from services.metrics import NOTIFICATION_SEND_DURATION
+
+# Результаты отправки одного уведомления
+DELIVERED = 'delivered'
+RETRY = 'retry'
+FAILED = 'failed'
+
+
+class RateLimiter:
+    """
+    Ограничение частоты отправки: не больше rate сообщений в секунду всего
+    и не чаще одного сообщения в chat_interval секунд в один чат.
+
+    Каждому вызову acquire() выдается свой момент отправки, поэтому
+    параллельные отправки выстраиваются в очередь без лишних ожиданий.
+    """
+
+    def __init__(self, rate, chat_interval):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.chat_interval = chat_interval
+        self._next_global = 0.0
+        self._next_chat = {}
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, chat_id):
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_global, self._next_chat.get(chat_id, 0.0))
+            self._next_global = slot + self.interval
+            self._next_chat[chat_id] = slot + self.chat_interval
+            if len(self._next_chat) > 10000:
+                self._next_chat = {chat: at for chat, at in self._next_chat.items() if at > now}
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def pause_chat(self, chat_id, seconds):
+        """Пауза для чата после ответа 429 (retry_after)"""
+        until = time.monotonic() + seconds
+        self._next_chat[chat_id] = max(self._next_chat.get(chat_id, 0.0), until)
+
+
+def retry_delay(attempts):
+    """Экспоненциальная задержка перед повторной попыткой"""
+    return min(OUTBOX_RETRY_BASE * (2 ** attempts), OUTBOX_RETRY_MAX)
+
+
+class OutboxWorker:
+    """
+    Воркер очереди уведомлений в процессе бота.
+
+    Забирает пачку очередных строк из notifications, отправляет их через
+    общий aiohttp-сеанс с учетом лимитов Telegram и записывает результаты
+    одной транзакцией: delivered, повтор с экспоненциальной задержкой
+    или failed после OUTBOX_MAX_ATTEMPTS попыток и при постоянных ошибках.
+    """
+
+    def __init__(self, token=BOT_TOKEN, api_url=TELEGRAM_API_URL, batch_size=OUTBOX_BATCH_SIZE,
+                 poll_interval=OUTBOX_POLL_INTERVAL, max_attempts=OUTBOX_MAX_ATTEMPTS):
+        self.url = f"{api_url}/bot{token}/sendMessage"
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.limiter = RateLimiter(OUTBOX_GLOBAL_RATE, OUTBOX_CHAT_INTERVAL)
+        self._session = None
+        self._task = None
+
+    def start(self):
+        """Запуск воркера фоновой задачей текущего event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        """Остановка воркера и закрытие сеанса"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        timeout = aiohttp.ClientTimeout(total=30)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            self._session = session
+            print("📨 Воркер очереди уведомлений запущен")
+            try:
+                while True:
+                    try:
+                        processed = await self.process_batch()
+                    except Exception as e:
+                        print(f"❌ Ошибка обработки очереди уведомлений: {e}")
+                        processed = 0
+                    if processed < self.batch_size:
+                        await asyncio.sleep(self.poll_interval)
+            finally:
+                self._session = None
+
+    async def process_batch(self):
+        """Отправка одной пачки уведомлений; возвращает их количество"""
+        rows = await fetch_due_notifications(time.time(), self.batch_size)
+        if not rows:
+            return 0
+
+        # Исключение в отправке одного уведомления не должно терять
+        # результаты остальных: оно считается ошибкой этой строки
+        results = await asyncio.gather(*(self.send(row) for row in rows), return_exceptions=True)
+
+        delivered = []
+        retries = []
+        failed = []
+        for row, outcome in zip(rows, results):
+            if isinstance(outcome, BaseException):
+                if not isinstance(outcome, Exception):
+                    raise outcome
+                print(f"❌ Ошибка отправки уведомления {row['id']}: {outcome!r}")
+                outcome = RETRY, f"Ошибка отправки: {outcome!r}", 0
+            result, error, retry_after = outcome
+            if result == DELIVERED:
+                delivered.append(row['id'])
+            elif result == RETRY and row['attempts'] + 1 < self.max_attempts:
+                delay = max(retry_delay(row['attempts']), retry_after)
+                retries.append((time.time() + delay, error, row['id']))
+            else:
+                failed.append((error, row['id']))
+        await save_notification_results(delivered, retries, failed)
+
+        if failed:
+            print(f"❌ Не удалось доставить уведомлений: {len(failed)}")
+        return len(rows)
+
+    async def send(self, row):
+        """Отправка одного уведомления; возвращает (результат, текст ошибки, retry_after)"""
+        if not row['chat_id']:
+            return FAILED, "Не указан chat_id", 0
+
+        await self.limiter.acquire(row['chat_id'])
+        # Время запроса к Telegram, без ожидания лимитов
+        started = time.perf_counter()
+        result = await self.post(row)
+        NOTIFICATION_SEND_DURATION.observe(time.perf_counter() - started, result[0])
+        return result
+
+    async def post(self, row):
+        """Запрос sendMessage и разбор ответа Telegram"""
+        try:
+            async with self._session.post(self.url, json={
+                'chat_id': row['chat_id'],
+                'text': row['message'],
+            }) as response:
+                data = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            return RETRY, f"Сетевая ошибка: {e!r}", 0
+
+        if data.get('ok'):
+            return DELIVERED, None, 0
+
+        code = data.get('error_code', response.status)
+        description = data.get('description', '')
+        error = f"{code}: {description}"
+        if code == 429:
+            retry_after = (data.get('parameters') or {}).get('retry_after', 1)
+            self.limiter.pause_chat(row['chat_id'], retry_after)
+            return RETRY, error, retry_after
+        if code >= 500:
+            return RETRY, error, 0
+        # 400/403: чат не найден, бот заблокирован и т.п. — повтор не поможет
+        return FAILED, error, 0
@@ -0,0 +1,160 @@
+import asyncio
+import time
+
+from aiogram import BaseMiddleware
+
+from config import UPDATE_CONCURRENCY
+from services.metrics import BOT_HANDLER_DURATION
+
+
+def ordering_key(data):
+    """Ключ очереди обновления: пользователь, иначе чат; None — без упорядочивания"""
+    user = data.get('event_from_user')
+    if user is not None:
+        return user.id
+    chat = data.get('event_chat')
+    if chat is not None:
+        return chat.id
+    return None
+
+
+class UpdateScheduler(BaseMiddleware):
+    """
+    Планировщик обработки обновлений (outer middleware на dp.update).
+
+    Обновления разных пользователей обрабатываются параллельно, но не больше
+    concurrency одновременно; обновления одного пользователя — строго по
+    очереди, в порядке поступления (asyncio.Lock отдает блокировку ожидающим
+    по порядку). Сначала берется очередь пользователя, потом общий слот,
+    поэтому ожидающие своей очереди обновления не занимают слоты.
+
+    Считает глубину очереди и время работы каждого обработчика
+    (через HandlerTimer на событиях роутеров).
+    """
+
+    def __init__(self, concurrency=UPDATE_CONCURRENCY):
+        self.concurrency = concurrency
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.timer = HandlerTimer(self)
+        # Ключ → [блокировка, число обновлений в очереди ключа]
+        self._queues = {}
+        self.waiting = 0
+        self.max_waiting = 0
+        self.running = 0
+        self.processed = 0
+        self._handlers = {}
+
+    def install(self, dp):
+        """Подключение к диспетчеру: очередь на update, замер времени на событиях"""
+        dp.update.outer_middleware(self)
+        for name, observer in dp.observers.items():
+            if name not in ('update', 'error'):
+                observer.middleware(self.timer)
+        dp['update_scheduler'] = self
+
+    def _enter_queue(self, key):
+        if key is None:
+            return None
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = [asyncio.Lock(), 0]
+        queue[1] += 1
+        return queue[0]
+
+    def _leave_queue(self, key):
+        if key is None:
+            return
+        queue = self._queues[key]
+        queue[1] -= 1
+        if queue[1] == 0:
+            del self._queues[key]
+
+    async def __call__(self, handler, event, data):
+        key = ordering_key(data)
+        lock = self._enter_queue(key)
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        started = False
+        try:
+            if lock is not None:
+                await lock.acquire()
+            try:
+                async with self.semaphore:
+                    self.waiting -= 1
+                    started = True
+                    self.running += 1
+                    try:
+                        return await handler(event, data)
+                    finally:
+                        self.running -= 1
+                        self.processed += 1
+            finally:
+                if lock is not None:
+                    lock.release()
+        finally:
+            if not started:
+                # Отмена во время ожидания
+                self.waiting -= 1
+            self._leave_queue(key)
+
+    def record(self, name, seconds):
+        """Учет времени работы обработчика"""
+        stats = self._handlers.get(name)
+        if stats is None:
+            stats = self._handlers[name] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] = max(stats[2], seconds)
+        BOT_HANDLER_DURATION.observe(seconds, name)
+
+    def stats(self):
+        """Состояние очереди и время обработчиков (мс)"""
+        return {
+            'concurrency': self.concurrency,
+            'running': self.running,
+            'waiting': self.waiting,
+            'max_waiting': self.max_waiting,
+            'active_users': len(self._queues),
+            'processed': self.processed,
+            'handlers': {
+                name: {
+                    'count': count,
+                    'avg_ms': round(total / count * 1000, 1),
+                    'max_ms': round(longest * 1000, 1),
+                }
+                for name, (count, total, longest) in sorted(self._handlers.items())
+            },
+        }
+
+
+class HandlerTimer(BaseMiddleware):
+    """Замер времени обработчиков (inner middleware на событиях роутеров)"""
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            handler_object = data.get('handler')
+            name = handler_object.callback.__name__ if handler_object is not None else 'unknown'
+            self.scheduler.record(name, time.perf_counter() - started)
+
+
+def stats_text(stats):
+    """Текст состояния планировщика для администратора"""
+    lines = [
+        "⚙️ Обработка обновлений:",
+        f"Выполняется: {stats['running']} из {stats['concurrency']}",
+        f"В очереди: {stats['waiting']} (максимум {stats['max_waiting']})",
+        f"Пользователей в работе: {stats['active_users']}",
+        f"Обработано: {stats['processed']}",
+    ]
+    if stats['handlers']:
+        lines.append("")
+        lines.append("Обработчики (количество, среднее / максимум, мс):")
+        for name, handler in stats['handlers'].items():
+            lines.append(f"{name}: {handler['count']}, {handler['avg_ms']} / {handler['max_ms']}")
+    return "\n".join(lines)
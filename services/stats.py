@@ -1,32 +1,261 @@
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import numpy as np
-import calendar
-from datetime import datetime
+import asyncio
+import importlib
+import multiprocessing
+import os
 import sqlite3
 import io
-from config import DATABASE_PATH
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from config import DATABASE_PATH, STATS_RENDER_TIMEOUT, STATS_CACHE_DIR, STATS_CACHE_MAX_BYTES
+from database import rollups
 
-async def generate_stats_image():
+# Запросы и отрисовка статистики выполняются в отдельном процессе,
+# чтобы не блокировать event loop бота. Процесс запускается заранее
+# с уже импортированным matplotlib (backend Agg), а одновременные
+# вызовы /stats ждут одну общую отрисовку.
+#
+# Готовые PNG хранятся на диске по версии данных (stats_counters.data_version,
+# увеличивается триггерами при изменении данных) и используются и ботом,
+# и веб-сервером, пока данные не изменятся.
+
+# Увеличивается при изменении оформления графиков
+STATS_RENDER_VERSION = 3
+
+_executor = None
+_renders = {}
+# Фоновые отрисовки веб-сервера: версия данных → (Future, время запуска)
+_web_renders = {}
+_web_renders_lock = threading.Lock()
+
+def _init_worker():
+    """
+    Прогрев процесса отрисовки: импорт matplotlib и выбор backend Agg
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    # NumPy нужен запросам статистики: импортируется заранее, не при первом /stats
+    importlib.import_module('numpy')
+    plt.close(plt.figure())
+
+def _ping():
+    return True
+
+def get_executor():
+    """
+    Пул из одного процесса отрисовки (spawn: без унаследованных потоков и соединений)
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker
+        )
+    return _executor
+
+async def warm_up_stats_executor():
+    """
+    Запуск процесса отрисовки при старте бота, а не при первом /stats
+    """
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(get_executor(), _ping)
+
+def shutdown_stats_executor(kill=False):
+    """
+    Остановка процесса отрисовки; kill=True — без ожидания зависшей задачи
+    """
+    global _executor
+    executor, _executor = _executor, None
+    if executor is None:
+        return
+    if kill:
+        # ProcessPoolExecutor не умеет прерывать запущенную задачу
+        for process in list(getattr(executor, '_processes', {}).values()):
+            process.terminate()
+    executor.shutdown(wait=not kill, cancel_futures=True)
+
+# Кэш изображений на диске
+def cache_key(version):
+    """
+    Ключ изображения: оформление графиков и версия данных
+    """
+    return f"stats_r{STATS_RENDER_VERSION}_v{version}"
+
+def cache_path(version):
+    return os.path.join(STATS_CACHE_DIR, f"{cache_key(version)}.png")
+
+def read_cached_image(version):
+    """
+    PNG для версии данных из кэша или None
+    """
+    path = cache_path(version)
+    try:
+        with open(path, 'rb') as f:
+            png = f.read()
+    except FileNotFoundError:
+        return None
+    # Время доступа для вытеснения давно не использованных файлов
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return png
+
+def store_cached_image(version, png):
+    """
+    Сохранение PNG в кэш (атомарно) и вытеснение старых файлов сверх лимита
+    """
+    os.makedirs(STATS_CACHE_DIR, exist_ok=True)
+    path = cache_path(version)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(png)
+    os.replace(tmp_path, path)
+    evict_cache(keep=path)
+
+def evict_cache(keep=None, max_bytes=None):
+    """
+    Удаление давно не использованных изображений, пока кэш больше лимита
     """
-    Генерация изображения со статистикой
+    max_bytes = STATS_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    files = []
+    total = 0
+    for entry in os.scandir(STATS_CACHE_DIR):
+        if entry.is_file() and entry.name.endswith('.png'):
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            pass
+
+async def _render_in_process(version):
+    loop = asyncio.get_running_loop()
+    try:
+        future = loop.run_in_executor(get_executor(), build_stats_png, DATABASE_PATH)
+        try:
+            rendered_version, png = await asyncio.wait_for(future, STATS_RENDER_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"❌ Отрисовка статистики не уложилась в {STATS_RENDER_TIMEOUT} с, процесс перезапускается")
+            shutdown_stats_executor(kill=True)
+            raise
+        await asyncio.to_thread(store_cached_image, rendered_version, png)
+        return rendered_version, png
+    finally:
+        _renders.pop(version, None)
+
+def latest_cached_image():
+    """
+    Самое свежее изображение текущего оформления из кэша: (версия, PNG) или None
+    """
+    prefix = f"stats_r{STATS_RENDER_VERSION}_v"
+    latest = None
+    try:
+        entries = list(os.scandir(STATS_CACHE_DIR))
+    except FileNotFoundError:
+        return None
+    for entry in entries:
+        name = entry.name
+        if name.startswith(prefix) and name.endswith('.png'):
+            try:
+                version = int(name[len(prefix):-len('.png')])
+            except ValueError:
+                continue
+            if latest is None or version > latest:
+                latest = version
+    if latest is None:
+        return None
+    png = read_cached_image(latest)
+    return None if png is None else (latest, png)
+
+def submit_render(version, db_path=DATABASE_PATH):
     """
+    Фоновая отрисовка для синхронного кода (веб-сервер): одна на версию данных,
+    в процессе пула. Возвращает Future, который завершается после сохранения
+    PNG в кэш на диске. Зависшая дольше STATS_RENDER_TIMEOUT отрисовка
+    перезапускается вместе с процессом.
+    """
+    with _web_renders_lock:
+        entry = _web_renders.get(version)
+        if entry is not None and time.monotonic() - entry[1] > STATS_RENDER_TIMEOUT:
+            print(f"❌ Отрисовка статистики не уложилась в {STATS_RENDER_TIMEOUT} с, процесс перезапускается")
+            del _web_renders[version]
+            shutdown_stats_executor(kill=True)
+            entry = None
+        if entry is None:
+            stored = Future()
+            entry = _web_renders[version] = (stored, time.monotonic())
+            render = get_executor().submit(build_stats_png, db_path)
+            render.add_done_callback(lambda done: _finish_web_render(version, done, stored))
+        return entry[0]
+
+def _finish_web_render(version, render, stored):
+    error = None
+    try:
+        rendered_version, png = render.result()
+        store_cached_image(rendered_version, png)
+    except BaseException as e:
+        print(f"❌ Ошибка отрисовки статистики: {e!r}")
+        error = e
+    with _web_renders_lock:
+        # Запись могла уже смениться перезапущенной отрисовкой
+        entry = _web_renders.get(version)
+        if entry is not None and entry[0] is stored:
+            del _web_renders[version]
+    if error is None:
+        stored.set_result((rendered_version, png))
+    else:
+        stored.set_exception(error)
+
+async def generate_stats_image(version):
+    """
+    PNG со статистикой для версии данных: (версия отрисованных данных, bytes).
+    Берется из кэша, иначе рисуется в процессе пула; одновременные вызовы
+    получают результат одной отрисовки, event loop при этом не блокируется.
+    """
+    png = await asyncio.to_thread(read_cached_image, version)
+    if png is not None:
+        return version, png
+    
+    render = _renders.get(version)
+    if render is None:
+        render = _renders[version] = asyncio.ensure_future(_render_in_process(version))
+    return await asyncio.shield(render)
+
+def build_stats_png(db_path):
+    """
+    Запросы и отрисовка (в процессе пула или в веб-сервере): (версия данных, PNG)
+    """
+    data = query_stats_data(db_path)
+    return data['data_version'], render_stats_image(data)
+
+def render_stats_image(data):
+    """
+    Отрисовка графиков статистики в PNG
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    
     fig, axes = plt.subplots(2, 3, figsize=(18, 12))
     fig.suptitle('📊 Аналитика Почтового Бюро', fontsize=16)
     
-    # Получаем данные
-    data = await get_stats_data()
-    
-    # 1. Динамика заказов по типам писем по дням
-    if data['orders_by_type']:
-        dates = [item['date'] for item in data['orders_by_type']]
-        a_counts = [item['a_count'] for item in data['orders_by_type']]
-        b_counts = [item['b_count'] for item in data['orders_by_type']]
-        c_counts = [item['c_count'] for item in data['orders_by_type']]
-        
-        axes[0, 0].plot(dates, a_counts, label='Категория A', marker='o')
-        axes[0, 0].plot(dates, b_counts, label='Категория B', marker='s')
-        axes[0, 0].plot(dates, c_counts, label='Категория C', marker='^')
+    # 1. Динамика заказов по типам открыток по дням
+    orders_by_type = data['orders_by_type']
+    if len(orders_by_type['dates']):
+        dates = orders_by_type['dates']
+        axes[0, 0].plot(dates, orders_by_type['card_1'], label='Красные', marker='o', color='red')
+        axes[0, 0].plot(dates, orders_by_type['card_2'], label='Синие', marker='s', color='blue')
+        axes[0, 0].plot(dates, orders_by_type['card_3'], label='Зеленые', marker='^', color='green')
         axes[0, 0].set_title('Динамика заказов по типам')
         axes[0, 0].legend()
         axes[0, 0].tick_params(axis='x', rotation=45)
@@ -35,24 +264,23 @@ async def generate_stats_image():
         axes[0, 0].set_title('Динамика заказов по типам')
     
     # 2. Распределение по популярности мест встреч
-    if data['locations_popularity']:
-        locations = [item['name'] for item in data['locations_popularity'][:10]]
-        counts = [item['count'] for item in data['locations_popularity'][:10]]
+    locations = data['locations_popularity']
+    if len(locations['names']):
+        names = locations['names'][:10]
+        counts = locations['count'][:10]
         
-        axes[0, 1].bar(range(len(locations)), counts)
+        axes[0, 1].bar(range(len(names)), counts)
         axes[0, 1].set_title('Популярность мест встреч')
-        axes[0, 1].set_xticks(range(len(locations)))
-        axes[0, 1].set_xticklabels(locations, rotation=45, ha='right')
+        axes[0, 1].set_xticks(range(len(names)))
+        axes[0, 1].set_xticklabels(names, rotation=45, ha='right')
     else:
         axes[0, 1].text(0.5, 0.5, 'Нет данных', ha='center', va='center')
         axes[0, 1].set_title('Популярность мест встреч')
     
     # 3. Рейтинг обратной связи по дням
-    if data['feedback_ratings']:
-        dates = [item['date'] for item in data['feedback_ratings']]
-        ratings = [item['avg_rating'] for item in data['feedback_ratings']]
-        
-        axes[0, 2].plot(dates, ratings, marker='o', color='green')
+    ratings = data['feedback_ratings']
+    if len(ratings['dates']):
+        axes[0, 2].plot(ratings['dates'], ratings['avg_rating'], marker='o', color='green')
         axes[0, 2].set_title('Средний рейтинг обратной связи')
         axes[0, 2].tick_params(axis='x', rotation=45)
     else:
@@ -60,11 +288,9 @@ async def generate_stats_image():
         axes[0, 2].set_title('Средний рейтинг обратной связи')
     
     # 4. Scatter: разница между созданием заказа и выполнением
-    if data['order_time_diff']:
-        dates = [item['date'] for item in data['order_time_diff']]
-        diffs = [item['hours_diff'] for item in data['order_time_diff']]
-        
-        axes[1, 0].scatter(dates, diffs, alpha=0.6)
+    time_diff = data['order_time_diff']
+    if len(time_diff['dates']):
+        axes[1, 0].scatter(time_diff['dates'], time_diff['hours_diff'], alpha=0.6)
         axes[1, 0].set_title('Время обработки заказов (часы)')
         axes[1, 0].tick_params(axis='x', rotation=45)
     else:
@@ -72,15 +298,9 @@ async def generate_stats_image():
         axes[1, 0].set_title('Время обработки заказов (часы)')
     
     # 5. Heatmap: число заказов по дням месяца
-    if data['orders_heatmap']:
-        heatmap_data = np.zeros((12, 31))
-        for item in data['orders_heatmap']:
-            month = item['month'] - 1
-            day = item['day'] - 1
-            if month < 12 and day < 31:
-                heatmap_data[month][day] = item['count']
-        
-        im = axes[1, 1].imshow(heatmap_data, cmap='YlOrRd', aspect='auto')
+    heatmap = data['orders_heatmap']
+    if heatmap.any():
+        im = axes[1, 1].imshow(heatmap, cmap='YlOrRd', aspect='auto')
         axes[1, 1].set_title('Активность по дням')
         axes[1, 1].set_xlabel('День месяца')
         axes[1, 1].set_ylabel('Месяц')
@@ -90,11 +310,9 @@ async def generate_stats_image():
         axes[1, 1].set_title('Активность по дням')
     
     # 6. Статусы заказов
-    if data['order_statuses']:
-        statuses = [item['status'] for item in data['order_statuses']]
-        counts = [item['count'] for item in data['order_statuses']]
-        
-        axes[1, 2].pie(counts, labels=statuses, autopct='%1.1f%%')
+    statuses = data['order_statuses']
+    if len(statuses['status']):
+        axes[1, 2].pie(statuses['count'], labels=statuses['status'], autopct='%1.1f%%')
         axes[1, 2].set_title('Распределение заказов по статусам')
     else:
         axes[1, 2].text(0.5, 0.5, 'Нет данных', ha='center', va='center')
@@ -104,81 +322,119 @@ async def generate_stats_image():
     
     # Сохраняем в байты
     buf = io.BytesIO()
-    plt.savefig(buf, format='png', dpi=300, bbox_inches='tight')
-    buf.seek(0)
-    plt.close()
+    fig.savefig(buf, format='png', dpi=300, bbox_inches='tight')
+    plt.close(fig)
     
-    return buf
+    return buf.getvalue()
 
-async def get_stats_data():
+# Номер юлианского дня для 1970-01-01 (julianday() + 0.5 округляется до целых дней)
+UNIX_EPOCH_DAY = 2440588
+
+def _day_labels(days):
     """
-    Получение данных для статистики
+    Целые номера дней в строки YYYY-MM-DD
     """
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
+    import numpy as np
+    return np.datetime_as_string((days - UNIX_EPOCH_DAY).astype('datetime64[D]'), unit='D')
+
+def _group_by_day(days, *values):
+    """
+    Уникальные дни и суммы значений по каждому дню
+    """
+    import numpy as np
+    unique_days, index = np.unique(days, return_inverse=True)
+    sums = [np.bincount(index, weights=value, minlength=len(unique_days)) for value in values]
+    return unique_days, sums
+
+def query_stats_data(db_path):
+    """
+    Получение данных для статистики из дневных агрегатов (stats_daily_*):
+    строки читаются в массивы NumPy (даты — целые номера дней), ряды
+    считаются векторно
+    """
+    import numpy as np
+    
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
-    data = {}
-    
-    # Заказы по типам
-    cursor.execute("""
-        SELECT DATE(created_at) as date,
-               SUM(category_a_count) as a_count,
-               SUM(category_b_count) as b_count,
-               SUM(category_c_count) as c_count
-        FROM users
-        GROUP BY DATE(created_at)
-        ORDER BY date
-    """)
-    data['orders_by_type'] = [dict(row) for row in cursor.fetchall()]
-    
-    # Популярность локаций
-    cursor.execute("""
-        SELECT l.name, COUNT(o.id) as count
-        FROM locations l
-        LEFT JOIN orders o ON l.id = o.location_id
-        GROUP BY l.id
-        ORDER BY count DESC
-    """)
-    data['locations_popularity'] = [dict(row) for row in cursor.fetchall()]
-    
-    # Рейтинги обратной связи
-    cursor.execute("""
-        SELECT DATE(created_at) as date, AVG(rating) as avg_rating
-        FROM feedback
-        GROUP BY DATE(created_at)
-        ORDER BY date
-    """)
-    data['feedback_ratings'] = [dict(row) for row in cursor.fetchall()]
-    
-    # Разница во времени обработки
-    cursor.execute("""
-        SELECT DATE(created_at) as date,
-               AVG(JULIANDAY(updated_at) - JULIANDAY(created_at)) * 24 as hours_diff
-        FROM orders
-        WHERE status IN ('delivered', 'met')
-        GROUP BY DATE(created_at)
-        ORDER BY date
-    """)
-    data['order_time_diff'] = [dict(row) for row in cursor.fetchall()]
-    
-    # Heatmap данных
-    cursor.execute("""
-        SELECT strftime('%m', created_at) as month,
-               strftime('%d', created_at) as day,
-               COUNT(*) as count
-        FROM orders
-        GROUP BY month, day
-    """)
-    data['orders_heatmap'] = [dict(row) for row in cursor.fetchall()]
+    # Все запросы читают один снимок базы вместе с его версией
+    cursor.execute("BEGIN")
+    cursor.execute("SELECT data_version FROM stats_counters WHERE id = 1")
+    row = cursor.fetchone()
+    data = {'data_version': row[0] if row else 0}
     
-    # Статусы заказов
-    cursor.execute("""
-        SELECT status, COUNT(*) as count
-        FROM orders
-        GROUP BY status
-    """)
-    data['order_statuses'] = [dict(row) for row in cursor.fetchall()]
+    # Статусы и локации — маленькие справочники, агрегаты ссылаются на них номерами
+    status_names = [row[0] for row in cursor.execute(
+        "SELECT DISTINCT status FROM stats_daily_orders WHERE status != '' ORDER BY status"
+    )]
+    locations = cursor.execute("SELECT id, name FROM locations ORDER BY id").fetchall()
+    
+    # Заказы по дню и статусу
+    daily_orders = cursor.execute(rollups.DAILY_ORDERS_SQL).fetchall()
+    status_codes = {name: code for code, name in enumerate(status_names)}
+    orders = np.fromiter(
+        ((day, status_codes.get(status, -1), *values) for day, status, *values in daily_orders),
+        dtype=[('day', 'i8'), ('status', 'i8'), ('orders', 'i8'), ('card_1', 'f8'),
+               ('card_2', 'f8'), ('card_3', 'f8'), ('hours_sum', 'f8'), ('hours_count', 'f8')],
+        count=len(daily_orders)
+    )
+    
+    # Заказы по местам встреч за все дни
+    cursor.execute(rollups.DAILY_LOCATIONS_SQL)
+    location_orders = np.fromiter(cursor, dtype=[('location', 'i8'), ('orders', 'i8')])
     
+    # Отзывы по дням
+    cursor.execute(rollups.DAILY_FEEDBACK_SQL)
+    feedback = np.fromiter(cursor, dtype=[('day', 'i8'), ('rated', 'f8'), ('rating_sum', 'f8')])
     conn.close()
-    return data
\ No newline at end of file
+    
+    # Заказы по типам открыток по дню создания
+    days, (card_1, card_2, card_3) = _group_by_day(orders['day'], orders['card_1'], orders['card_2'], orders['card_3'])
+    data['orders_by_type'] = {
+        'dates': _day_labels(days), 'card_1': card_1, 'card_2': card_2, 'card_3': card_3
+    }
+    
+    # Популярность локаций (включая локации без заказов)
+    location_ids = np.array([location[0] for location in locations], dtype=np.int64)
+    max_id = max(int(location_ids.max(initial=-1)), int(location_orders['location'].max(initial=-1)))
+    per_location = np.bincount(location_orders['location'], weights=location_orders['orders'], minlength=max_id + 1)
+    location_counts = per_location[location_ids].astype(np.int64)
+    order = np.argsort(-location_counts, kind='stable')
+    data['locations_popularity'] = {
+        'names': [locations[i][1] for i in order], 'count': location_counts[order]
+    }
+    
+    # Средний рейтинг по дням (без учета отзывов без оценки, как AVG)
+    rated = feedback['rated'] > 0
+    data['feedback_ratings'] = {
+        'dates': _day_labels(feedback['day'][rated]),
+        'avg_rating': feedback['rating_sum'][rated] / feedback['rated'][rated]
+    }
+    
+    # Среднее время обработки (часы) состоявшихся и доставленных заказов
+    # по дню создания
+    done_codes = [status_codes[name] for name in ('delivered', 'met') if name in status_codes]
+    done = orders[np.isin(orders['status'], done_codes)]
+    days, (hours_sum, hours_count) = _group_by_day(done['day'], done['hours_sum'], done['hours_count'])
+    timed = hours_count > 0
+    data['order_time_diff'] = {
+        'dates': _day_labels(days[timed]), 'hours_diff': hours_sum[timed] / hours_count[timed]
+    }
+    
+    # Heatmap: месяц × день месяца
+    dates = (orders['day'] - UNIX_EPOCH_DAY).astype('datetime64[D]')
+    months = dates.astype('datetime64[M]')
+    month_index = months.astype(np.int64) % 12
+    day_index = (dates - months.astype('datetime64[D]')).astype(np.int64)
+    data['orders_heatmap'] = np.bincount(
+        month_index * 31 + day_index, weights=orders['orders'], minlength=12 * 31
+    ).reshape(12, 31)
+    
+    # Статусы заказов
+    status_counts = np.bincount(
+        orders['status'][orders['status'] >= 0], weights=orders['orders'][orders['status'] >= 0],
+        minlength=len(status_names)
+    ).astype(np.int64)
+    data['order_statuses'] = {'status': status_names, 'count': status_counts}
+    
+    return data
@@ -0,0 +1,82 @@
+import asyncio
+import hmac
+
+from aiohttp import web
+from aiogram.types import Update
+
+from config import (
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_SECRET,
+)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    """
+    Прием обновлений Telegram через webhook на aiohttp.
+
+    Запрос проверяется по секретному заголовку, обновление передается в тот
+    же Dispatcher (и те же роутеры), что и при polling, а ответ 200 уходит
+    сразу, не дожидаясь обработки. Число одновременно обрабатываемых
+    обновлений и порядок обновлений одного пользователя обеспечивает
+    UpdateScheduler диспетчера.
+    """
+
+    def __init__(self, dp, bot, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET,
+                 host=WEBHOOK_HOST, port=WEBHOOK_PORT):
+        self.dp = dp
+        self.bot = bot
+        self.path = path
+        self.secret = secret
+        self.host = host
+        self.port = port
+        self._tasks = set()
+        self._runner = None
+
+    def application(self):
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        return app
+
+    async def start(self, url=WEBHOOK_URL):
+        """Запуск HTTP-сервера и регистрация webhook в Telegram (если задан url)"""
+        self._runner = web.AppRunner(self.application())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        print(f"🌐 Webhook принимает обновления на {self.host}:{self.port}{self.path}")
+
+        if url:
+            await self.bot.set_webhook(
+                f"{url}{self.path}",
+                secret_token=self.secret,
+                allowed_updates=self.dp.resolve_used_update_types()
+            )
+            print(f"✅ Webhook зарегистрирован: {url}{self.path}")
+
+    async def stop(self, timeout=10):
+        """Остановка сервера с ожиданием уже принятых обновлений"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+
+    async def handle(self, request):
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), self.secret):
+            return web.Response(status=401)
+        try:
+            data = await request.json()
+            update = Update.model_validate(data, context={'bot': self.bot})
+        except ValueError:
+            return web.Response(status=400)
+
+        task = asyncio.create_task(self.process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response(status=200)
+
+    async def process(self, update):
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            print(f"❌ Ошибка обработки обновления {update.update_id}: {e}")
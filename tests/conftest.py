@@ -0,0 +1,61 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Тесты запускаются из корня репозитория: python -m pytest
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# config.py читает окружение при импорте
+os.environ.setdefault("BOT_TOKEN", "123456:test-token")
+os.environ.setdefault("DATABASE_PATH", os.path.join(tempfile.mkdtemp(), "bot.db"))
+os.environ.setdefault("BOT_METRICS_PORT", "0")
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Путь к новой базе со всеми миграциями"""
+    from database.migrate import migrate
+    path = str(tmp_path / "bot.db")
+    migrate(path)
+    return path
+
+
+@pytest.fixture
+def bot_db(tmp_path, monkeypatch):
+    """
+    database.db на временной базе. Тест сам вызывает init_db()/close_db()
+    внутри своего event loop; кэши модуля сбрасываются до и после теста.
+    """
+    from database import db
+    path = str(tmp_path / "bot.db")
+    monkeypatch.setattr(db, "DB_PATH", path)
+    db.availability.invalidate()
+    db.users_cache.clear()
+    yield path
+    db.pool = None
+    db.availability.invalidate()
+    db.users_cache.clear()
+
+
+@pytest.fixture
+def web(db_path, monkeypatch):
+    """
+    Модуль web_app_server на временной базе со своим пулом соединений;
+    индекс доступности и кэш пользователей сбрасываются
+    """
+    import web_app_server
+    from config import DB_PRAGMAS
+    from database.sync_pool import SQLitePool
+    pool = SQLitePool(db_path, pragmas=DB_PRAGMAS)
+    monkeypatch.setattr(web_app_server, "DB_PATH", db_path)
+    monkeypatch.setattr(web_app_server, "db_pool", pool)
+    web_app_server.availability.invalidate()
+    web_app_server.users_cache.clear()
+    yield web_app_server
+    pool.close()
+    web_app_server.availability.invalidate()
+    web_app_server.users_cache.clear()
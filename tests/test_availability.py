@@ -0,0 +1,101 @@
+import asyncio
+import sqlite3
+
+from database import db
+
+DATE = "2030-01-01"
+
+
+def count_loads(monkeypatch, index):
+    """Счетчик полных перезагрузок индекса"""
+    loads = []
+    original = index.load
+
+    def load(*args, **kwargs):
+        loads.append(kwargs.get('version'))
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(index, "load", load)
+    return loads
+
+
+def deactivate_range(path, range_id):
+    """Изменение диапазона из другого процесса, мимо индекса"""
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            conn.execute("UPDATE meeting_time_ranges SET is_active = 0 WHERE id = ?", (range_id,))
+    finally:
+        conn.close()
+
+
+def test_bot_reloads_only_on_availability_changes(bot_db, monkeypatch):
+    loads = count_loads(monkeypatch, db.availability)
+
+    async def scenario():
+        await db.init_db()
+        try:
+            range_id = await db.create_time_range(DATE, "10:00", "10:30", 10, 2)
+            [window, *_] = await db.get_all_windows_by_range(range_id)
+            await db.get_availability()
+            loads.clear()
+
+            # Свои бронирования, отмены и записи в другие таблицы — без перезагрузки
+            order_id, error = await db.book_order(3000, window['id'], {})
+            assert order_id and error is None
+            await db.create_user(3001, "other", "Тест")
+            user = await db.get_user_by_telegram_id(3001)
+            await db.send_notification(user['id'], "сообщение")
+            await db.update_order_status(order_id, 'cancelled', "тест")
+            await db.toggle_time_range(range_id, False)
+            await db.toggle_time_range(range_id, True)
+            assert await db.get_active_time_ranges_by_date(DATE)
+            [indexed, *_] = await db.get_all_windows_by_range(range_id)
+            assert indexed['current_bookings'] == 0
+            assert loads == []
+
+            # Изменение диапазона другим процессом перезагружает индекс
+            deactivate_range(bot_db, range_id)
+            assert await db.get_active_time_ranges_by_date(DATE) == []
+            assert len(loads) == 1
+            await db.get_availability()
+            assert len(loads) == 1
+        finally:
+            await db.close_db()
+
+    asyncio.run(scenario())
+
+
+def test_web_reloads_only_on_availability_changes(web, db_path, monkeypatch):
+    loads = count_loads(monkeypatch, web.availability)
+
+    async def prepare():
+        monkeypatch.setattr(db, "DB_PATH", db_path)
+        await db.init_db()
+        try:
+            range_id = await db.create_time_range(DATE, "10:00", "10:30", 10, 2)
+            await db.create_user(4000, "user", "Тест")
+            return range_id
+        finally:
+            await db.close_db()
+            db.pool = None
+            db.availability.invalidate()
+            db.users_cache.clear()
+
+    range_id = asyncio.run(prepare())
+    with web.app.app_context():
+        [window, *_] = web.get_availability().windows_by_range(range_id)
+    assert len(loads) == 1
+
+    client = web.app.test_client()
+    response = client.post('/api/orders', json={'user_id': 4000, 'window_id': window['id']})
+    assert response.status_code == 201, response.get_json()
+    with web.app.app_context():
+        [indexed, *_] = web.get_availability().windows_by_range(range_id)
+    assert indexed['current_bookings'] == 1
+    assert len(loads) == 1
+
+    deactivate_range(db_path, range_id)
+    with web.app.app_context():
+        assert web.get_availability().active_ranges_by_date(DATE) == []
+    assert len(loads) == 2
@@ -0,0 +1,188 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+from database import booking
+from database import db
+
+DATE = "2030-01-01"
+
+
+def create_range(path, windows=1, capacity=1):
+    """Активный диапазон с windows окнами вместимостью capacity; id окон"""
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            range_id = conn.execute("""
+                INSERT INTO meeting_time_ranges
+                (date, start_time, end_time, window_duration_min, max_meetings_per_window)
+                VALUES (?, '10:00', '20:00', 10, ?)
+            """, (DATE, capacity)).lastrowid
+            return [
+                conn.execute(
+                    "INSERT INTO meeting_windows (range_id, start_time, end_time) VALUES (?, ?, ?)",
+                    (range_id, f"10:{i:02d}", f"10:{i + 1:02d}")
+                ).lastrowid
+                for i in range(windows)
+            ]
+    finally:
+        conn.close()
+
+
+def window_row(path, window_id):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return conn.execute("SELECT * FROM meeting_windows WHERE id = ?", (window_id,)).fetchone()
+    finally:
+        conn.close()
+
+
+def book_concurrently(path, requests):
+    """
+    Одновременные бронирования из отдельных потоков, у каждого свое
+    соединение sqlite3 (как у воркеров веб-сервера). requests — список
+    (telegram_id, window_id); возвращает список (order_id, ошибка).
+    """
+    barrier = threading.Barrier(len(requests))
+    results = [None] * len(requests)
+
+    def worker(index, telegram_id, window_id):
+        conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            barrier.wait()
+            order_id, _, error, _ = booking.reserve_and_create_order_sync(conn, telegram_id, window_id, {})
+            results[index] = (order_id, error)
+        finally:
+            conn.close()
+
+    threads = [
+        threading.Thread(target=worker, args=(index, telegram_id, window_id))
+        for index, (telegram_id, window_id) in enumerate(requests)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_bookings_fill_window_exactly(db_path):
+    capacity = 3
+    [window_id] = create_range(db_path, capacity=capacity)
+
+    results = book_concurrently(db_path, [(1000 + i, window_id) for i in range(60)])
+
+    booked = [order_id for order_id, error in results if order_id]
+    assert len(booked) == capacity
+    assert {error for order_id, error in results if not order_id} == {booking.WINDOW_ERROR}
+
+    window = window_row(db_path, window_id)
+    assert window['current_bookings'] == capacity
+    assert window['is_available'] == 0
+
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0] == capacity
+    finally:
+        conn.close()
+
+
+def test_concurrent_bookings_respect_unfinished_limit(db_path):
+    window_ids = create_range(db_path, windows=20, capacity=5)
+
+    results = book_concurrently(db_path, [(42, window_id) for window_id in window_ids])
+
+    booked = [order_id for order_id, error in results if order_id]
+    assert len(booked) == booking.MAX_UNFINISHED_ORDERS
+    assert {error for order_id, error in results if not order_id} == {booking.LIMIT_ERROR}
+
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute("SELECT SUM(current_bookings) FROM meeting_windows").fetchone()[0] == \
+            booking.MAX_UNFINISHED_ORDERS
+    finally:
+        conn.close()
+
+
+# Потоков-бронирующих и бронирований каждого в бенчмарке:
+# BOOKING_BENCHMARK_BOOKERS=16 python -m pytest -s tests/test_booking.py
+BENCHMARK_BOOKERS = int(os.environ.get("BOOKING_BENCHMARK_BOOKERS", "8"))
+BENCHMARK_BOOKINGS = int(os.environ.get("BOOKING_BENCHMARK_BOOKINGS", "50"))
+
+
+def test_concurrent_booking_throughput(db_path):
+    """
+    Бенчмарк бронирования: BENCHMARK_BOOKERS потоков со своими соединениями
+    бронируют одно окно, вместимости хватает на всех; бронирований в секунду
+    """
+    total = BENCHMARK_BOOKERS * BENCHMARK_BOOKINGS
+    [window_id] = create_range(db_path, capacity=total)
+    barrier = threading.Barrier(BENCHMARK_BOOKERS + 1)
+    errors = []
+
+    def booker(index):
+        conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            barrier.wait()
+            for i in range(BENCHMARK_BOOKINGS):
+                order_id, _, error, _ = booking.reserve_and_create_order_sync(
+                    conn, 10000 + index * BENCHMARK_BOOKINGS + i, window_id, {})
+                if not order_id:
+                    errors.append(error)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=booker, args=(index,)) for index in range(BENCHMARK_BOOKERS)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    rate = total / elapsed
+    print(f"\n{BENCHMARK_BOOKERS} потоков, {total} бронирований: {elapsed:.2f} с, {rate:.0f} в секунду")
+
+    assert errors == []
+    window = window_row(db_path, window_id)
+    assert window['current_bookings'] == total
+    assert window['is_available'] == 0
+    # Нижняя граница с большим запасом: ловит возврат к блокировкам на секунды
+    assert rate > 50
+
+
+def test_bot_bookings_and_idempotent_cancel(bot_db):
+    capacity = 2
+
+    async def scenario():
+        await db.init_db()
+        try:
+            range_id = await db.create_time_range(DATE, "10:00", "10:10", 10, capacity)
+            [window] = await db.get_all_windows_by_range(range_id)
+
+            results = await asyncio.gather(*(
+                db.book_order(2000 + i, window['id'], {}) for i in range(100)
+            ))
+            booked = [order_id for order_id, error in results if order_id]
+            assert len(booked) == capacity
+            assert {error for order_id, error in results if not order_id} == {booking.WINDOW_ERROR}
+            [indexed] = (await db.get_availability()).windows_by_range(range_id)
+            assert indexed['current_bookings'] == capacity
+
+            # Повторная отмена не освобождает место второй раз
+            for _ in range(3):
+                await db.update_order_status(booked[0], 'cancelled', "тест")
+            assert window_row(bot_db, window['id'])['current_bookings'] == capacity - 1
+            [indexed] = (await db.get_availability()).windows_by_range(range_id)
+            assert indexed['current_bookings'] == capacity - 1
+            assert indexed['is_available'] == 1
+        finally:
+            await db.close_db()
+
+    asyncio.run(scenario())
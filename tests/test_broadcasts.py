@@ -0,0 +1,150 @@
+import asyncio
+import sqlite3
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from database import db
+from services.broadcast import BroadcastReporter
+from services.outbox import OutboxWorker
+
+TOKEN = "123456:test-token"
+FIRST_DATE = "2030-01-01"
+SECOND_DATE = "2030-01-02"
+
+
+def recipients(path, broadcast_id):
+    conn = sqlite3.connect(path)
+    try:
+        return sorted(chat_id for (chat_id,) in conn.execute(
+            "SELECT chat_id FROM notifications WHERE broadcast_id = ?", (broadcast_id,)))
+    finally:
+        conn.close()
+
+
+def broadcast_row(path, broadcast_id):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return conn.execute("SELECT * FROM broadcasts WHERE id = ?", (broadcast_id,)).fetchone()
+    finally:
+        conn.close()
+
+
+async def book(telegram_id, range_id, status=None):
+    """Заказ пользователя в первом окне диапазона, при необходимости — в статусе status"""
+    await db.create_user(telegram_id, f"user{telegram_id}", "Тест")
+    [window, *_] = await db.get_all_windows_by_range(range_id)
+    order_id, error = await db.book_order(telegram_id, window['id'], {})
+    assert error is None
+    if status:
+        await db.update_order_status(order_id, status, "тест" if status == 'cancelled' else None)
+
+
+def test_segment_filters(bot_db):
+    async def scenario():
+        await db.init_db()
+        try:
+            first_range = await db.create_time_range(FIRST_DATE, "10:00", "10:30", 10, 10)
+            second_range = await db.create_time_range(SECOND_DATE, "10:00", "10:30", 10, 10)
+            await book(801, first_range)
+            await book(802, second_range, 'met')
+            await book(803, first_range, 'completed')
+            await book(804, second_range)
+            await db.create_user(805, "user805", "Без заказов")
+            await book(806, first_range, 'cancelled')
+
+            expected = [
+                ('all', None, [801, 802, 803, 804, 805, 806]),
+                ('user', '805', [805]),
+                ('pending', None, [801, 804]),
+                # date и range: заказы в ожидании и состоявшиеся встречи
+                ('date', FIRST_DATE, [801]),
+                ('date', SECOND_DATE, [802, 804]),
+                ('range', str(first_range), [801]),
+                ('range', str(second_range), [802, 804]),
+            ]
+            for segment, value, chat_ids in expected:
+                broadcast_id, total = await db.create_broadcast(segment, value, f"рассылка {segment}")
+                assert total == len(chat_ids), segment
+                assert recipients(bot_db, broadcast_id) == chat_ids, (segment, value)
+                assert broadcast_row(bot_db, broadcast_id)['total'] == total
+                assert broadcast_row(bot_db, broadcast_id)['status'] == 'running'
+
+            # Пустой сегмент сразу завершен
+            broadcast_id, total = await db.create_broadcast('user', '999', "никому")
+            assert total == 0
+            assert broadcast_row(bot_db, broadcast_id)['status'] == 'finished'
+        finally:
+            await db.close_db()
+
+    asyncio.run(scenario())
+
+
+class FakeBot:
+    """Бот для BroadcastReporter: запоминает тексты статусного сообщения"""
+
+    def __init__(self):
+        self.texts = []
+
+    async def edit_message_text(self, text, chat_id, message_id):
+        self.texts.append(text)
+
+
+def test_resumed_broadcast_skips_sent_recipients(bot_db):
+    received = []
+
+    async def send_message(request):
+        payload = await request.json()
+        received.append(payload['chat_id'])
+        return web.json_response({'ok': True, 'result': {'message_id': 1}})
+
+    async def send_batch(api_url):
+        """Одна пачка из двух уведомлений новым воркером, как после перезапуска"""
+        worker = OutboxWorker(token=TOKEN, api_url=api_url, batch_size=2)
+        async with aiohttp.ClientSession() as session:
+            worker._session = session
+            return await worker.process_batch()
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_post(f"/bot{TOKEN}/sendMessage", send_message)
+        server = TestServer(app)
+        await server.start_server()
+        api_url = str(server.make_url('')).rstrip('/')
+        try:
+            await db.init_db()
+            try:
+                for telegram_id in range(901, 906):
+                    await db.create_user(telegram_id, f"user{telegram_id}", "Тест")
+                broadcast_id, total = await db.create_broadcast('all', None, "новости", 1, 10)
+                assert total == 5
+                assert await send_batch(api_url) == 2
+            finally:
+                await db.close_db()
+
+            # Перезапуск бота: новое соединение, новый воркер и отчет
+            await db.init_db()
+            try:
+                bot = FakeBot()
+                reporter = BroadcastReporter()
+                reporter.bot = bot
+                await reporter.report()
+                assert bot.texts[-1].endswith("Доставлено: 2 из 5\nОшибок: 0")
+
+                while await send_batch(api_url):
+                    pass
+                await reporter.report()
+                assert bot.texts[-1].startswith(f"✅ Рассылка #{broadcast_id} завершена")
+                assert await db.get_running_broadcasts() == []
+            finally:
+                await db.close_db()
+        finally:
+            await server.close()
+
+        # Каждый получатель — ровно одно сообщение
+        assert sorted(received) == list(range(901, 906))
+        assert broadcast_row(bot_db, broadcast_id)['status'] == 'finished'
+
+    asyncio.run(scenario())
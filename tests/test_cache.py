@@ -0,0 +1,125 @@
+import asyncio
+import sqlite3
+
+from database import db
+from utils.cache import LRUCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_hits_misses_eviction_and_ttl():
+    clock = Clock()
+    cache = LRUCache(maxsize=2, ttl=10, clock=clock)
+
+    assert cache.get('a') is None
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    # 'b' использовался давнее 'a' и вытесняется первым
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+
+    clock.now = 10
+    assert cache.get('a') is None
+
+    cache.set('d', 4)
+    cache.invalidate('d')
+    cache.invalidate('missing')
+    assert cache.get('d') is None
+    cache.clear()
+    assert cache.get('c') is None
+
+    assert cache.stats() == {
+        'size': 0, 'maxsize': 2, 'ttl': 10,
+        'hits': 3, 'misses': 5, 'hit_rate': 0.375,
+        'evictions': 1, 'invalidations': 2,
+    }
+
+
+def test_zero_size_cache_stores_nothing():
+    cache = LRUCache(maxsize=0, ttl=10)
+    cache.set('a', 1)
+    assert cache.get('a') is None
+    assert cache.stats()['size'] == 0
+
+
+def add_letters(path, telegram_id, count):
+    """Изменение счетчиков пользователя другим процессом (веб-сервером)"""
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            conn.execute("UPDATE users SET total_letters = total_letters + ? WHERE telegram_id = ?",
+                         (count, telegram_id))
+    finally:
+        conn.close()
+
+
+def test_bot_caches_only_immutable_user_fields(bot_db):
+    cache = db.users_cache
+    # Счетчики кэша модуля накоплены и другими тестами
+    start = cache.stats()
+
+    async def scenario():
+        await db.init_db()
+        try:
+            await db.create_user(600, "user", "Тест")
+            assert cache.stats()['size'] == 1
+            user = await db.get_user_by_telegram_id(600)
+            assert dict(user) == {'id': user['id'], 'telegram_id': 600}
+            # Повторный /start не обращается к базе
+            await db.create_user(600, "user", "Тест")
+            hits = cache.stats()['hits']
+            assert hits == start['hits'] + 2
+
+            # Отсутствующий пользователь не кэшируется
+            assert await db.get_user_by_telegram_id(601) is None
+            assert cache.get(601) is None
+
+            # Счетчики, измененные своим и другим процессом, видны сразу,
+            # хотя строка пользователя остается в кэше
+            await db.update_user_stats(user['id'], 'A')
+            add_letters(bot_db, 600, 5)
+            letters_user, orders, _, _ = await db.get_user_letters_page(600)
+            assert letters_user['total_letters'] == 6
+            assert letters_user['category_a_count'] == 1
+            assert orders == []
+            assert await db.get_user_by_telegram_id(600) == user
+            assert cache.stats()['hits'] == hits + 1
+            assert cache.stats()['invalidations'] == start['invalidations']
+        finally:
+            await db.close_db()
+
+    asyncio.run(scenario())
+
+
+def test_web_order_uses_cached_user(web, db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.execute("""
+                INSERT INTO meeting_time_ranges
+                (date, start_time, end_time, window_duration_min, max_meetings_per_window)
+                VALUES ('2030-01-01', '10:00', '10:10', 10, 5)
+            """)
+            window_id = conn.execute(
+                "INSERT INTO meeting_windows (range_id, start_time, end_time) VALUES (1, '10:00', '10:10')"
+            ).lastrowid
+    finally:
+        conn.close()
+    client = web.app.test_client()
+    start = web.users_cache.stats()
+
+    for _ in range(2):
+        response = client.post('/api/orders', json={'user_id': 610, 'window_id': window_id})
+        assert response.status_code == 201
+    stats = client.get('/api/cache-stats').get_json()['users']
+    assert stats['size'] == 1
+    assert (stats['hits'] - start['hits'], stats['misses'] - start['misses']) == (1, 1)
+    assert set(web.users_cache.get(610).keys()) == {'id', 'telegram_id'}
@@ -0,0 +1,78 @@
+import random
+import sqlite3
+
+from database import counters, maintenance
+
+STATUSES = ('pending', 'confirmed', 'completed', 'cancelled')
+
+
+def read_counters(path):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return dict(conn.execute(counters.STATS_COUNTERS_SQL).fetchone())
+    finally:
+        conn.close()
+
+
+def assert_matches_rebuild(path):
+    """Счетчики триггеров совпадают с пересчетом rebuild-counters с нуля"""
+    maintained = read_counters(path)
+    maintenance.rebuild_counters(path)
+    assert read_counters(path) == maintained
+
+
+def test_triggers_match_rebuild_counters(db_path):
+    rng = random.Random(3)
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            user_ids = [
+                conn.execute("INSERT INTO users (telegram_id, full_name) VALUES (?, 'Тест')",
+                             (1000 + i,)).lastrowid
+                for i in range(30)
+            ]
+            order_ids = [
+                conn.execute("INSERT INTO orders (user_id, status) VALUES (?, ?)",
+                             (rng.choice(user_ids), rng.choice(STATUSES))).lastrowid
+                for _ in range(200)
+            ]
+            # Часть отзывов без оценки: в среднем не учитываются
+            feedback_ids = [
+                conn.execute("INSERT INTO feedback (order_id, rating) VALUES (?, ?)",
+                             (order_id, rng.choice([None, 1, 2, 3, 4, 5]))).lastrowid
+                for order_id in rng.sample(order_ids, 80)
+            ]
+        assert_matches_rebuild(db_path)
+
+        with conn:
+            for order_id in rng.sample(order_ids, 120):
+                conn.execute("UPDATE orders SET status = ? WHERE id = ?", (rng.choice(STATUSES), order_id))
+            # Обновление всех заказов одним запросом и без смены статуса
+            conn.execute("UPDATE orders SET status = 'pending' WHERE id % 7 = 0")
+            conn.execute("UPDATE orders SET status = status, client_name = 'Тест'")
+            for feedback_id in rng.sample(feedback_ids, 40):
+                conn.execute("UPDATE feedback SET rating = ? WHERE id = ?",
+                             (rng.choice([None, 1, 5]), feedback_id))
+        assert_matches_rebuild(db_path)
+
+        with conn:
+            for order_id in rng.sample(order_ids, 60):
+                conn.execute("DELETE FROM orders WHERE id = ?", (order_id,))
+            conn.execute("DELETE FROM orders WHERE status = 'cancelled'")
+            for feedback_id in rng.sample(feedback_ids, 30):
+                conn.execute("DELETE FROM feedback WHERE id = ?", (feedback_id,))
+            for user_id in rng.sample(user_ids, 10):
+                conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
+        assert_matches_rebuild(db_path)
+
+        # Откаченная транзакция не меняет счетчики
+        before = read_counters(db_path)
+        conn.execute("BEGIN")
+        conn.execute("DELETE FROM orders")
+        conn.execute("DELETE FROM users")
+        conn.rollback()
+        assert read_counters(db_path) == before
+        assert_matches_rebuild(db_path)
+    finally:
+        conn.close()
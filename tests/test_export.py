@@ -0,0 +1,100 @@
+import csv
+import io
+import json
+import sqlite3
+
+from services import export
+
+ORDERS = [
+    # created_at, status, recipient_name, delivery_address
+    ("2030-01-02 09:00:00", 'pending', 'Иванов', 'Москва, ул. "Тверская", 1'),
+    ("2030-01-01 10:00:00", 'completed', 'Петров', 'Тверь'),
+    ("2030-01-01 10:00:00", 'pending', 'Сидоров', 'строка 1\nстрока 2'),
+    ("2030-01-03 00:00:00", 'cancelled', 'Смирнов', ''),
+    ("2030-01-01 23:59:59", 'completed', 'Кузнецов', 'Казань'),
+]
+
+
+def insert_orders(path):
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            user_id = conn.execute(
+                "INSERT INTO users (telegram_id, username, full_name) VALUES (700, 'user', 'Тест Тестов')"
+            ).lastrowid
+            return [
+                conn.execute("""
+                    INSERT INTO orders (user_id, created_at, status, recipient_name, delivery_address,
+                                        card_type_1_count)
+                    VALUES (?, ?, ?, ?, ?, 2)
+                """, (user_id, *order)).lastrowid
+                for order in ORDERS
+            ]
+    finally:
+        conn.close()
+
+
+def test_csv_export_is_streamed(web, db_path, monkeypatch):
+    ids = insert_orders(db_path)
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 2)
+    formatted = []
+    format_rows = export.format_rows
+
+    def spy(rows, fmt):
+        formatted.append(len(rows))
+        return format_rows(rows, fmt)
+
+    monkeypatch.setattr(export, "format_rows", spy)
+
+    response = web.app.test_client().get('/api/orders/export', query_string={'format': 'csv'},
+                                         buffered=False)
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.content_type == 'text/csv; charset=utf-8'
+    assert response.headers['Content-Disposition'].startswith('attachment; filename=orders_')
+    # stream_with_context доходит до первого yield: готов только заголовок
+    assert formatted == [1]
+
+    # Каждая пачка курсора формируется только когда ее забирает клиент
+    chunks = []
+    for chunk in response.response:
+        chunks.append(chunk if isinstance(chunk, str) else chunk.decode('utf-8'))
+        assert len(formatted) == len(chunks)
+    response.close()
+    assert formatted == [1, 2, 2, 1]
+
+    text = ''.join(chunks)
+    assert text.startswith('\ufeff')
+    rows = list(csv.reader(io.StringIO(text[1:])))
+    assert rows[0] == export.EXPORT_COLUMNS
+    records = [dict(zip(rows[0], row)) for row in rows[1:]]
+
+    # По created_at, при равных — по id
+    order = sorted(range(len(ORDERS)), key=lambda i: (ORDERS[i][0], ids[i]))
+    assert [int(record['id']) for record in records] == [ids[i] for i in order]
+    for record, i in zip(records, order):
+        created_at, status, recipient_name, delivery_address = ORDERS[i]
+        assert record['created_at'] == created_at
+        assert record['status'] == status
+        assert record['recipient_name'] == recipient_name
+        assert record['delivery_address'] == delivery_address
+        assert record['user_name'] == 'Тест Тестов'
+        assert record['telegram_id'] == '700'
+        assert record['card_type_1_count'] == '2'
+        assert record['location_name'] == ''
+
+
+def test_export_filters_and_ndjson(web, db_path):
+    ids = insert_orders(db_path)
+    client = web.app.test_client()
+
+    response = client.get('/api/orders/export', query_string={
+        'format': 'ndjson', 'status': 'completed', 'from': '2030-01-01', 'to': '2030-01-01'
+    })
+    assert response.status_code == 200
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line)['id'] for line in lines] == [ids[1], ids[4]]
+    assert json.loads(lines[0])['recipient_name'] == 'Петров'
+
+    assert client.get('/api/orders/export', query_string={'format': 'xlsx'}).status_code == 400
+    assert client.get('/api/orders/export', query_string={'from': '01.01.2030'}).status_code == 400
@@ -0,0 +1,211 @@
+import asyncio
+import os
+import sqlite3
+import time
+
+import pytest
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from database import db
+from services import fsm_storage
+from services.fsm_storage import SQLiteStorage
+
+
+class OrderForm(StatesGroup):
+    location = State()
+    confirm = State()
+
+
+KEY = StorageKey(bot_id=1, chat_id=100, user_id=100)
+OTHER_KEY = StorageKey(bot_id=1, chat_id=200, user_id=200)
+
+
+def stored_rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        states = dict(conn.execute("SELECT user_id, state FROM fsm_states").fetchall())
+        data = dict(conn.execute("SELECT user_id, data FROM fsm_data").fetchall())
+        return states, data
+    finally:
+        conn.close()
+
+
+def run(scenario):
+    async def wrapper():
+        await db.init_db()
+        try:
+            await scenario()
+        finally:
+            await db.close_db()
+    asyncio.run(wrapper())
+
+
+def new_storage():
+    # Фоновый сброс не мешает тестам: сбрасывают сами тесты
+    return SQLiteStorage(flush_interval=3600, cache_ttl=60)
+
+
+@pytest.fixture
+def saves(monkeypatch):
+    """Пачки, переданные в save_fsm_records"""
+    calls = []
+
+    async def save(records):
+        calls.append(sorted(key.user_id for key, _, _ in records))
+        await db.save_fsm_records(records)
+
+    monkeypatch.setattr(fsm_storage, "save_fsm_records", save)
+    return calls
+
+
+def test_changes_are_coalesced_until_flush(bot_db, saves):
+    async def scenario():
+        storage = new_storage()
+        await storage.set_state(KEY, OrderForm.location)
+        await storage.update_data(KEY, {'location': 'Главпочтамт'})
+        await storage.set_state(KEY, OrderForm.confirm)
+        await storage.update_data(KEY, {'cards': 3})
+        await storage.set_state(OTHER_KEY, OrderForm.location)
+
+        # До сброса в базе ничего нет
+        assert stored_rows(bot_db) == ({}, {})
+        assert await storage.flush() == 2
+        assert saves == [[100, 200]]
+        assert await storage.flush() == 0
+        assert saves == [[100, 200]]
+
+        states, data = stored_rows(bot_db)
+        assert states == {100: OrderForm.confirm.state, 200: OrderForm.location.state}
+        assert data == {100: '{"location":"Главпочтамт","cards":3}'}
+
+        # Новое хранилище (перезапуск бота) читает состояние и данные из базы
+        restarted = new_storage()
+        assert await restarted.get_state(KEY) == OrderForm.confirm.state
+        assert await restarted.get_data(KEY) == {'location': 'Главпочтамт', 'cards': 3}
+        assert await restarted.get_data(OTHER_KEY) == {}
+        await restarted.close()
+        await storage.close()
+
+    run(scenario)
+
+
+def test_dirty_keys_survive_eviction(bot_db, saves):
+    async def scenario():
+        storage = new_storage()
+        await storage.set_state(KEY, OrderForm.location)
+        await storage.set_data(KEY, {'location': 'Главпочтамт'})
+
+        # Измененный, но не записанный ключ не вытесняется даже после cache_ttl
+        later = time.monotonic() + storage.cache_ttl * 10
+        assert storage.evict(now=later) == 0
+        assert await storage.get_state(KEY) == OrderForm.location.state
+
+        await storage.flush()
+        assert storage.evict(now=time.monotonic() + storage.cache_ttl * 10) == 1
+        assert KEY not in storage._cache
+
+        # Вытесненный ключ загружается из базы
+        assert await storage.get_state(KEY) == OrderForm.location.state
+        assert await storage.get_data(KEY) == {'location': 'Главпочтамт'}
+        await storage.close()
+
+    run(scenario)
+
+
+def test_failed_flush_keeps_keys_dirty(bot_db, monkeypatch):
+    async def scenario():
+        storage = new_storage()
+        await storage.set_state(KEY, OrderForm.location)
+        await storage.set_data(KEY, {'location': 'Главпочтамт'})
+
+        async def broken_save(records):
+            raise sqlite3.OperationalError("database is locked")
+
+        monkeypatch.setattr(fsm_storage, "save_fsm_records", broken_save)
+        with pytest.raises(sqlite3.OperationalError):
+            await storage.flush()
+        assert storage.evict(now=time.monotonic() + storage.cache_ttl * 10) == 0
+
+        monkeypatch.setattr(fsm_storage, "save_fsm_records", db.save_fsm_records)
+        assert await storage.flush() == 1
+        assert stored_rows(bot_db) == (
+            {100: OrderForm.location.state}, {100: '{"location":"Главпочтамт"}'}
+        )
+        await storage.close()
+
+    run(scenario)
+
+
+def test_close_flushes_and_clearing_deletes_rows(bot_db):
+    async def scenario():
+        storage = new_storage()
+        await storage.set_state(KEY, OrderForm.location)
+        await storage.set_data(KEY, {'location': 'Главпочтамт'})
+        await storage.close()
+        assert stored_rows(bot_db) == (
+            {100: OrderForm.location.state}, {100: '{"location":"Главпочтамт"}'}
+        )
+
+        # Завершенный диалог: пустые состояние и данные удаляют строки
+        storage = new_storage()
+        await storage.set_state(KEY, None)
+        await storage.set_data(KEY, {})
+        await storage.close()
+        assert stored_rows(bot_db) == ({}, {})
+
+    run(scenario)
+
+
+# Пользователей и шагов диалога каждого в бенчмарке:
+# FSM_BENCHMARK_USERS=10000 python -m pytest -s tests/test_fsm_storage.py
+BENCHMARK_USERS = int(os.environ.get("FSM_BENCHMARK_USERS", "1000"))
+BENCHMARK_STEPS = int(os.environ.get("FSM_BENCHMARK_STEPS", "10"))
+
+
+async def dialog_rate(storage):
+    """Операций get/set в секунду: каждый шаг диалога — как у обработчика с FSMContext"""
+    keys = [StorageKey(bot_id=1, chat_id=user_id, user_id=user_id) for user_id in range(1, BENCHMARK_USERS + 1)]
+    started = time.perf_counter()
+    for step in range(BENCHMARK_STEPS):
+        for key in keys:
+            await storage.get_state(key)
+            await storage.get_data(key)
+            await storage.update_data(key, {'step': step})
+            await storage.set_state(key, OrderForm.confirm if step % 2 else OrderForm.location)
+    # get_state, get_data, update_data (get + set), set_state
+    return len(keys) * BENCHMARK_STEPS * 5 / (time.perf_counter() - started)
+
+
+def test_storage_throughput_benchmark(bot_db):
+    """
+    Бенчмарк get/set: SQLiteStorage с кэшем и отложенной записью против
+    MemoryStorage aiogram; запись в базу — одна пачка при сбросе
+    """
+    async def scenario():
+        memory = MemoryStorage()
+        memory_rate = await dialog_rate(memory)
+        await memory.close()
+
+        storage = new_storage()
+        # Первый проход читает каждый ключ из базы, второй — только из кэша
+        cold_rate = await dialog_rate(storage)
+        sqlite_rate = await dialog_rate(storage)
+        started = time.perf_counter()
+        assert await storage.flush() == BENCHMARK_USERS
+        flush_time = time.perf_counter() - started
+        await storage.close()
+
+        print(f"\n{BENCHMARK_USERS} пользователей × {BENCHMARK_STEPS} шагов: MemoryStorage {memory_rate:.0f} оп/с, "
+              f"SQLiteStorage {cold_rate:.0f} оп/с с чтением из базы, {sqlite_rate:.0f} оп/с из кэша, "
+              f"сброс {flush_time * 1000:.0f} мс")
+
+        # Между сбросами операции не обращаются к базе; разница с MemoryStorage —
+        # сериализация данных в set_data и отметка времени использования ключа
+        assert sqlite_rate > memory_rate / 10
+        states, data = stored_rows(bot_db)
+        assert len(states) == len(data) == BENCHMARK_USERS
+        assert data[1] == '{"step":%d}' % (BENCHMARK_STEPS - 1)
+
+    run(scenario)
@@ -0,0 +1,135 @@
+import asyncio
+import sqlite3
+
+from database import db, leases
+from services import leader
+from services.leader import BotLease, BotSupervisor
+
+TTL = 30
+
+
+class Clock:
+    """Управляемое время для database.leases вместо модуля time"""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+def lease_row(path):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return conn.execute(leases.SELECT_LEASE_SQL, (leases.BOT_LEASE,)).fetchone()
+    finally:
+        conn.close()
+
+
+def test_two_holders_acquire_renew_takeover_release(bot_db, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(leases, "time", clock)
+
+    async def scenario():
+        await db.init_db()
+        try:
+            first = BotLease(ttl=TTL, interval=0.01)
+            second = BotLease(ttl=TTL, interval=0.01)
+            assert first.holder != second.holder
+
+            assert await first.acquire()
+            assert not await second.acquire()
+            row = lease_row(bot_db)
+            assert row['holder'] == first.holder
+            assert row['expires_at'] == clock.now + TTL
+
+            # Продление сдвигает срок: второй не занимает аренду и после исходного срока
+            clock.now += TTL - 1
+            assert await db.renew_lease(leases.BOT_LEASE, first.holder, TTL)
+            assert not await db.renew_lease(leases.BOT_LEASE, second.holder, TTL)
+            clock.now += TTL - 1
+            assert not await second.acquire()
+            assert lease_row(bot_db)['holder'] == first.holder
+
+            # Владелец не продлевал дольше ttl: аренду занимает второй
+            clock.now += 2
+            assert await second.acquire()
+            assert lease_row(bot_db)['holder'] == second.holder
+            assert lease_row(bot_db)['acquired_at'] == clock.now
+
+            # Первый узнает о потере при следующем продлении
+            lost = asyncio.Event()
+
+            async def on_lost():
+                lost.set()
+
+            first.start(on_lost)
+            await asyncio.wait_for(lost.wait(), 5)
+            assert not first.held
+            # Остановка потерявшего аренду не освобождает чужую аренду
+            await first.stop()
+            assert lease_row(bot_db)['holder'] == second.holder
+
+            await second.stop()
+            assert lease_row(bot_db) is None
+            assert await first.acquire()
+            await first.stop()
+            assert lease_row(bot_db) is None
+        finally:
+            await db.close_db()
+
+    asyncio.run(scenario())
+
+
+def test_supervisor_starts_one_bot_and_bot_confirms_lease(bot_db, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(leases, "time", clock)
+    started = []
+    supervisors = [
+        BotSupervisor(bot_db, start_bot=started.append, bot_alive=lambda: False, ttl=TTL)
+        for _ in range(2)
+    ]
+
+    async def migrate():
+        await db.init_db()
+        await db.close_db()
+
+    asyncio.run(migrate())
+
+    # Два воркера проверяют аренду: бота запускает только первый
+    assert supervisors[0].check()
+    assert not supervisors[1].check()
+    assert len(started) == 1
+    [holder] = started
+
+    # Процесс бота получает идентификатор аренды через окружение и подтверждает ее
+    monkeypatch.setenv(leader.LEASE_HOLDER_ENV, holder)
+
+    async def bot_process():
+        await db.init_db()
+        try:
+            lease = BotLease(ttl=TTL)
+            assert lease.holder == holder
+            assert await lease.acquire()
+            clock.now += TTL / 2
+            assert await db.renew_lease(leases.BOT_LEASE, holder, TTL)
+        finally:
+            await db.close_db()
+
+    asyncio.run(bot_process())
+    assert not supervisors[1].check()
+
+    # Процесс бота умер, аренда просрочена: бота запускает другой воркер
+    clock.now += TTL + 1
+    assert supervisors[1].check()
+    assert len(started) == 2 and started[1] != holder
+    assert lease_row(bot_db)['holder'] == started[1]
+
+
+def test_lease_status():
+    row = {'holder': 'host:1:abc', 'heartbeat_at': 100.0, 'expires_at': 130.0}
+    assert leases.lease_status(None) == {'held': False}
+    status = leases.lease_status(row, now=110.0)
+    assert status['held'] and status['expires_in'] == 20.0 and status['heartbeat_age'] == 10.0
+    assert not leases.lease_status(row, now=131.0)['held']
@@ -0,0 +1,93 @@
+import asyncio
+import sqlite3
+
+from database import db
+from database.migrate import migrate
+
+SAME_TIME = "2030-01-01 10:00:00"
+
+
+def insert_orders(path, telegram_id, created):
+    """Заказы пользователя с заданными created_at; id в порядке вставки"""
+    migrate(path)
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO users (telegram_id, full_name) VALUES (?, 'Тест')",
+                         (telegram_id,))
+            user_id = conn.execute("SELECT id FROM users WHERE telegram_id = ?", (telegram_id,)).fetchone()[0]
+            return [
+                conn.execute("INSERT INTO orders (user_id, created_at) VALUES (?, ?)",
+                             (user_id, created_at)).lastrowid
+                for created_at in created
+            ]
+    finally:
+        conn.close()
+
+
+def page_ids(page):
+    user, orders, prev_cursor, next_cursor = page
+    return [order['id'] for order in orders], prev_cursor is not None, next_cursor is not None
+
+
+def run(scenario):
+    async def wrapper():
+        await db.init_db()
+        try:
+            await scenario()
+        finally:
+            await db.close_db()
+    asyncio.run(wrapper())
+
+
+def test_letters_pages_forward_and_back(bot_db):
+    ids = insert_orders(bot_db, 700, [SAME_TIME] * 4 + ["2030-01-02 09:00:00", "2029-12-31 00:00:00",
+                                                        "2030-01-01 09:59:59"])
+    # Заказы другого пользователя на страницы не попадают
+    insert_orders(bot_db, 701, [SAME_TIME] * 3)
+    expected = [ids[4]] + sorted(ids[:4], reverse=True) + [ids[6], ids[5]]
+
+    async def scenario():
+        first = await db.get_user_letters_page(700, page_size=3)
+        assert first[0]['total_letters'] == 0
+        assert page_ids(first) == (expected[:3], False, True)
+
+        # Граница страницы проходит между заказами с одинаковым created_at
+        second = await db.get_user_letters_page(700, first[3], page_size=3)
+        assert page_ids(second) == (expected[3:6], True, True)
+        last = await db.get_user_letters_page(700, second[3], page_size=3)
+        assert page_ids(last) == (expected[6:], True, False)
+
+        # Назад по prev_cursor — те же страницы и те же курсоры
+        back = await db.get_user_letters_page(700, last[2], backward=True, page_size=3)
+        assert page_ids(back) == page_ids(second)
+        assert back[2:] == second[2:]
+        back = await db.get_user_letters_page(700, back[2], backward=True, page_size=3)
+        assert page_ids(back) == page_ids(first)
+        assert back[3] == first[3]
+
+    run(scenario)
+
+
+def test_letters_page_boundaries(bot_db):
+    ids = insert_orders(bot_db, 710, [SAME_TIME] * 6)
+    insert_orders(bot_db, 711, [])
+    newest_first = sorted(ids, reverse=True)
+
+    async def scenario():
+        # Последняя полная страница — без next_cursor
+        first = await db.get_user_letters_page(710, page_size=3)
+        last = await db.get_user_letters_page(710, first[3], page_size=3)
+        assert page_ids(last) == (newest_first[3:], True, False)
+        back = await db.get_user_letters_page(710, last[2], backward=True, page_size=3)
+        assert page_ids(back) == (newest_first[:3], False, True)
+
+        # Одна страница целиком
+        assert page_ids(await db.get_user_letters_page(710, page_size=6)) == (newest_first, False, False)
+
+        # Пользователь без заказов и неизвестный пользователь
+        user, orders, prev_cursor, next_cursor = await db.get_user_letters_page(711, page_size=3)
+        assert user['total_letters'] == 0 and orders == [] and prev_cursor is next_cursor is None
+        assert await db.get_user_letters_page(712, page_size=3) == (None, [], None, None)
+
+    run(scenario)
@@ -0,0 +1,120 @@
+import multiprocessing
+import threading
+
+import pytest
+
+from services import metrics
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Пустой REGISTRY на время теста: метрики приложения не попадают в вывод"""
+    monkeypatch.setattr(metrics, "REGISTRY", [])
+    return metrics.REGISTRY
+
+
+def test_metric_requires_merge_and_samples():
+    class Incomplete(metrics.Metric):
+        type = 'gauge'
+
+    with pytest.raises(TypeError):
+        Incomplete('incomplete', 'Без _merge и samples')
+
+
+def test_exposition_format(registry):
+    requests = metrics.Counter('requests_total', 'Запросы', ('path',))
+    duration = metrics.Histogram('duration_seconds', 'Длительность', ('route',), buckets=(0.1, 1))
+    requests.inc('/a')
+    requests.inc('/a', amount=2)
+    requests.inc('say "hi"\\\n')
+    duration.observe(0.05, 'x')
+    duration.observe(0.1, 'x')
+    duration.observe(0.5, 'x')
+    duration.observe(3, 'x')
+
+    assert metrics.render().splitlines() == [
+        '# HELP requests_total Запросы',
+        '# TYPE requests_total counter',
+        'requests_total{path="/a"} 3',
+        'requests_total{path="say \\"hi\\"\\\\\\n"} 1',
+        '# HELP duration_seconds Длительность',
+        '# TYPE duration_seconds histogram',
+        'duration_seconds_bucket{route="x",le="0.1"} 2',
+        'duration_seconds_bucket{route="x",le="1"} 3',
+        'duration_seconds_bucket{route="x",le="+Inf"} 4',
+        'duration_seconds_sum{route="x"} 3.65',
+        'duration_seconds_count{route="x"} 4',
+    ]
+
+
+def test_shards_of_live_and_finished_threads(registry):
+    counter = metrics.Counter('events_total', 'События', ('kind',))
+    histogram = metrics.Histogram('latency_seconds', 'Задержка', buckets=(1,))
+    release = threading.Event()
+    ready = threading.Barrier(5)
+
+    def record(wait):
+        for _ in range(100):
+            counter.inc('a')
+            histogram.observe(0.5)
+        ready.wait()
+        if wait:
+            release.wait()
+
+    # Два потока еще пишут, два завершились, плюс значения текущего потока
+    threads = [threading.Thread(target=record, args=(i < 2,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    for thread in threads[2:]:
+        thread.join()
+    counter.inc('b', amount=5)
+
+    # Повторный сбор не переносит значения завершившихся потоков дважды
+    for _ in range(2):
+        assert counter.collect() == {('a',): 400, ('b',): 5}
+        assert histogram.collect() == {(): [400, 0, 200.0]}
+
+    release.set()
+    for thread in threads[:2]:
+        thread.join()
+    assert counter.collect() == {('a',): 400, ('b',): 5}
+    assert histogram.collect() == {(): [400, 0, 200.0]}
+
+
+def record_in_worker(directory):
+    """Воркер: свои значения в свой снимок"""
+    requests = next(metric for metric in metrics.REGISTRY if metric.name == 'requests_total')
+    duration = next(metric for metric in metrics.REGISTRY if metric.name == 'duration_seconds')
+    requests.inc('/a', amount=4)
+    requests.inc('/b')
+    duration.observe(2)
+    metrics.write_snapshot(directory)
+
+
+def test_render_sums_snapshots_of_all_workers(registry, tmp_path):
+    requests = metrics.Counter('requests_total', 'Запросы', ('path',))
+    duration = metrics.Histogram('duration_seconds', 'Длительность', buckets=(1,))
+    requests.inc('/a')
+    duration.observe(0.5)
+
+    # Воркеры gunicorn — процессы, созданные fork() после импорта метрик
+    context = multiprocessing.get_context('fork')
+    for _ in range(2):
+        worker = context.Process(target=record_in_worker, args=(str(tmp_path),))
+        worker.start()
+        worker.join()
+        assert worker.exitcode == 0
+    (tmp_path / "broken.json").write_text('{"requests_total": [[', encoding='utf-8')
+
+    # Снимки содержат и значения родителя на момент fork(): 1 + 2 × (1 + 4)
+    lines = metrics.render(str(tmp_path)).splitlines()
+    assert 'requests_total{path="/a"} 11' in lines
+    assert 'requests_total{path="/b"} 2' in lines
+    assert 'duration_seconds_bucket{le="1"} 3' in lines
+    assert 'duration_seconds_bucket{le="+Inf"} 5' in lines
+    assert 'duration_seconds_sum 5.5' in lines
+    assert 'duration_seconds_count 5' in lines
+
+    # Без каталога — только значения текущего процесса
+    assert 'requests_total{path="/a"} 1' in metrics.render().splitlines()
@@ -0,0 +1,87 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+from database import booking
+from database import db
+from database.migrate import MIGRATIONS_DIR, get_schema_version, list_migrations, migrate
+from services.availability import PERIOD_SQL
+from utils.pagination import KEYSET_CONDITION, KEYSET_ORDER
+
+# Горячие запросы: (название, SQL, параметры, индекс, который должен использоваться)
+HOT_QUERIES = [
+    ("unfinished_orders_limit", booking.COUNT_UNFINISHED_SQL, (1,),
+     "COVERING INDEX idx_orders_user_status"),
+    ("admin_orders_by_status",
+     f"{db.ORDERS_SELECT_SQL} WHERE o.status = ? AND {KEYSET_CONDITION} {KEYSET_ORDER} LIMIT 51",
+     ("pending", "2030-01-01 00:00:00", 1), "INDEX idx_orders_status_created"),
+    ("windows_by_range",
+     "SELECT * FROM meeting_windows WHERE range_id = ? ORDER BY start_time",
+     (1,), "INDEX idx_meeting_windows_range"),
+    ("active_ranges_by_date",
+     "SELECT * FROM meeting_time_ranges WHERE date = ? AND is_active = 1 ORDER BY start_time",
+     ("2030-01-01",), "INDEX idx_time_ranges_date_active"),
+    ("availability_period", PERIOD_SQL, ("2030-01-01", "2030-01-31"),
+     "INDEX idx_time_ranges_date_active"),
+    ("user_letters_page",
+     db.USER_LETTERS_SQL.format(condition=f"AND {KEYSET_CONDITION}", order=KEYSET_ORDER),
+     ("2030-01-01 00:00:00", 1, 1, 6), "INDEX idx_orders_user_created"),
+]
+
+
+def query_plan(path, sql, params):
+    conn = sqlite3.connect(path)
+    try:
+        return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+    finally:
+        conn.close()
+
+
+def full_scans(plan):
+    """Шаги плана, читающие таблицу целиком (SCAN без индекса)"""
+    return [step for step in plan if step.startswith("SCAN") and "USING" not in step]
+
+
+@pytest.fixture
+def initial_db_path(tmp_path):
+    """База только с исходной схемой (0001), без индексов горячих запросов"""
+    directory = tmp_path / "migrations"
+    directory.mkdir()
+    shutil.copy(os.path.join(MIGRATIONS_DIR, "0001_initial.sql"), directory)
+    path = str(tmp_path / "initial.db")
+    migrate(path, str(directory))
+    return path
+
+
+@pytest.mark.parametrize("name, sql, params, index", HOT_QUERIES, ids=[q[0] for q in HOT_QUERIES])
+def test_hot_query_uses_index(initial_db_path, db_path, name, sql, params, index):
+    before = query_plan(initial_db_path, sql, params)
+    assert full_scans(before), before
+
+    after = query_plan(db_path, sql, params)
+    assert any(index in step for step in after), after
+    assert not full_scans(after), after
+
+
+def test_admin_orders_without_filter_avoid_sort(db_path):
+    plan = query_plan(db_path, f"{db.ORDERS_SELECT_SQL} {KEYSET_ORDER} LIMIT 51", ())
+    assert any("INDEX idx_orders_created" in step for step in plan), plan
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+def test_user_lookup_uses_unique_index(db_path):
+    plan = query_plan(db_path, booking.SELECT_USER_SQL, (1,))
+    assert plan == ["SEARCH users USING COVERING INDEX sqlite_autoindex_users_1 (telegram_id=?)"]
+
+
+def test_migrate_is_idempotent(db_path):
+    latest = list_migrations()[-1][0]
+    assert migrate(db_path) == latest
+
+    conn = sqlite3.connect(db_path)
+    try:
+        assert get_schema_version(conn) == latest
+    finally:
+        conn.close()
@@ -0,0 +1,99 @@
+import base64
+import json
+import sqlite3
+
+import pytest
+
+from utils.pagination import decode_cursor, encode_cursor
+
+SAME_TIME = "2030-01-01 10:00:00"
+
+
+def insert_orders(path, created):
+    """Заказы одного пользователя с заданными created_at; id в порядке вставки"""
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            user_id = conn.execute(
+                "INSERT INTO users (telegram_id, username, full_name) VALUES (500, 'user', 'Тест')"
+            ).lastrowid
+            return [
+                conn.execute("INSERT INTO orders (user_id, created_at) VALUES (?, ?)",
+                             (user_id, created_at)).lastrowid
+                for created_at in created
+            ]
+    finally:
+        conn.close()
+
+
+def walk_pages(client, page_size):
+    """Все страницы /api/orders по next_cursor: список id каждой страницы"""
+    pages = []
+    cursor = None
+    while True:
+        params = {'page_size': page_size}
+        if cursor:
+            params['cursor'] = cursor
+        response = client.get('/api/orders', query_string=params)
+        assert response.status_code == 200
+        body = response.get_json()
+        pages.append([order['id'] for order in body['orders']])
+        cursor = body['next_cursor']
+        if cursor is None:
+            return pages
+
+
+def raw_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def test_keyset_pages_with_identical_created_at(web, db_path):
+    ids = insert_orders(db_path, [SAME_TIME] * 5 + ["2030-01-02 09:00:00", "2029-12-31 23:59:59"])
+    expected = [ids[5]] + sorted(ids[:5], reverse=True) + [ids[6]]
+
+    pages = walk_pages(web.app.test_client(), page_size=3)
+
+    # Заказы с одинаковым created_at идут по id и не повторяются на соседних страницах
+    assert pages == [expected[:3], expected[3:6], expected[6:]]
+
+
+def test_last_full_page_has_no_next_cursor(web, db_path):
+    ids = insert_orders(db_path, [SAME_TIME] * 6)
+
+    pages = walk_pages(web.app.test_client(), page_size=3)
+
+    assert pages == [sorted(ids, reverse=True)[:3], sorted(ids, reverse=True)[3:]]
+
+
+@pytest.mark.parametrize('cursor', [
+    'не base64',
+    raw_cursor(5),
+    raw_cursor([SAME_TIME]),
+    raw_cursor([20300101, 3]),
+    raw_cursor([SAME_TIME, "3"]),
+    raw_cursor([SAME_TIME, True]),
+    raw_cursor([SAME_TIME, 3.5]),
+    raw_cursor({'created_at': SAME_TIME, 'id': 3}),
+])
+def test_bad_cursor_is_rejected(web, cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+    response = web.app.test_client().get('/api/orders', query_string={'cursor': cursor})
+    assert response.status_code == 400
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(SAME_TIME, 42)) == (SAME_TIME, 42)
+
+
+def test_unpaginated_limit(web, db_path):
+    ids = insert_orders(db_path, [SAME_TIME] * 3)
+    client = web.app.test_client()
+
+    response = client.get('/api/orders', query_string={'all': '1', 'limit': '2'})
+    assert response.status_code == 200
+    assert [order['id'] for order in response.get_json()] == sorted(ids, reverse=True)[:2]
+
+    for limit in ('abc', '0', '-1'):
+        response = client.get('/api/orders', query_string={'all': '1', 'limit': limit})
+        assert response.status_code == 400
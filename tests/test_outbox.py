@@ -0,0 +1,100 @@
+import asyncio
+import sqlite3
+import time
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from database import db
+from services.outbox import OutboxWorker
+
+TOKEN = "123456:test-token"
+
+# chat_id → ответ локального Bot API: (HTTP-статус, тело)
+RESPONSES = {
+    101: (200, {'ok': True, 'result': {'message_id': 1}}),
+    102: (429, {'ok': False, 'error_code': 429, 'description': 'Too Many Requests',
+                'parameters': {'retry_after': 7}}),
+    103: (403, {'ok': False, 'error_code': 403, 'description': 'Forbidden: bot was blocked by the user'}),
+    104: (500, {'ok': False, 'error_code': 500, 'description': 'Internal Server Error'}),
+    # Ответ не объект: разбор бросает исключение внутри send()
+    105: (200, []),
+}
+
+
+def notification_rows(path):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return {row['chat_id']: row for row in conn.execute("SELECT * FROM notifications")}
+    finally:
+        conn.close()
+
+
+class worker_session:
+    """Сеанс aiohttp воркера без запуска фонового цикла run()"""
+
+    def __init__(self, worker):
+        self.worker = worker
+
+    async def __aenter__(self):
+        self.worker._session = aiohttp.ClientSession()
+        return self.worker
+
+    async def __aexit__(self, *exc_info):
+        await self.worker._session.close()
+        self.worker._session = None
+
+
+def test_outbox_batch_against_local_bot_api(bot_db):
+    received = []
+
+    async def send_message(request):
+        payload = await request.json()
+        received.append(payload)
+        status, body = RESPONSES[payload['chat_id']]
+        return web.json_response(body, status=status)
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_post(f"/bot{TOKEN}/sendMessage", send_message)
+        server = TestServer(app)
+        await server.start_server()
+        await db.init_db()
+        try:
+            for chat_id in RESPONSES:
+                await db.create_user(chat_id, f"user{chat_id}", "Тест")
+                user = await db.get_user_by_telegram_id(chat_id)
+                await db.send_notification(user['id'], f"сообщение {chat_id}")
+
+            worker = OutboxWorker(token=TOKEN, api_url=str(server.make_url('')).rstrip('/'))
+            async with worker_session(worker):
+                started = time.time()
+                assert await worker.process_batch() == len(RESPONSES)
+
+            assert sorted(payload['chat_id'] for payload in received) == sorted(RESPONSES)
+            assert await db.get_notification_counts() == {'delivered': 1, 'pending': 3, 'failed': 1}
+
+            rows = notification_rows(bot_db)
+            assert all(row['attempts'] == 1 for row in rows.values())
+            assert rows[101]['status'] == 'delivered'
+            assert rows[103]['status'] == 'failed'
+            assert rows[103]['last_error'].startswith('403')
+            # 429: повтор не раньше retry_after
+            assert rows[102]['status'] == 'pending'
+            assert rows[102]['next_attempt_at'] >= started + 7
+            assert rows[104]['status'] == 'pending'
+            # Исключение одной отправки не теряет результаты остальных
+            assert rows[105]['status'] == 'pending'
+            assert 'AttributeError' in rows[105]['last_error']
+
+            # Отложенные уведомления в следующую пачку не попадают
+            async with worker_session(worker):
+                assert await worker.process_batch() == 0
+        finally:
+            await db.close_db()
+            await server.close()
+
+    asyncio.run(scenario())
+
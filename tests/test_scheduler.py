@@ -0,0 +1,139 @@
+import asyncio
+import os
+import random
+import time
+from datetime import datetime
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from services.scheduler import UpdateScheduler
+
+TOKEN = "123456:test-token"
+
+
+def message_update(update_id, user_id, text):
+    return Update.model_validate({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(datetime(2030, 1, 1).timestamp()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f"user{user_id}"},
+            'text': text,
+        },
+    })
+
+
+def test_scheduler_keeps_user_order_and_concurrency_limit():
+    concurrency = 4
+    users = 10
+    per_user = 15
+    rng = random.Random(7)
+
+    # Обновления пользователей перемешаны, у каждого — свой номер по порядку
+    sent = [(user_id, seq) for user_id in range(1, users + 1) for seq in range(per_user)]
+    rng.shuffle(sent)
+    counters = {}
+    updates = []
+    for update_id, (user_id, _) in enumerate(sent, start=1):
+        seq = counters[user_id] = counters.get(user_id, -1) + 1
+        updates.append(message_update(update_id, user_id, str(seq)))
+
+    handled = {}
+    active_users = set()
+    running = 0
+    max_running = 0
+
+    async def scenario():
+        dp = Dispatcher()
+        scheduler = UpdateScheduler(concurrency=concurrency)
+        scheduler.install(dp)
+
+        @dp.message()
+        async def echo(message):
+            nonlocal running, max_running
+            user_id = message.from_user.id
+            # Два обновления одного пользователя не выполняются одновременно
+            assert user_id not in active_users
+            active_users.add(user_id)
+            running += 1
+            max_running = max(max_running, running)
+            try:
+                await asyncio.sleep(rng.uniform(0, 0.005))
+                handled.setdefault(user_id, []).append(int(message.text))
+            finally:
+                running -= 1
+                active_users.discard(user_id)
+
+        bot = Bot(token=TOKEN)
+        try:
+            # Как в поллинге: все обновления обрабатываются параллельными задачами
+            await asyncio.gather(*(dp.feed_update(bot, update) for update in updates))
+        finally:
+            await bot.session.close()
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+
+    assert handled == {user_id: list(range(per_user)) for user_id in range(1, users + 1)}
+    assert max_running <= concurrency
+    # Пользователей больше, чем слотов: лимит достигается
+    assert max_running == concurrency
+    assert stats['processed'] == users * per_user
+    assert stats['running'] == 0 and stats['waiting'] == 0 and stats['active_users'] == 0
+    assert stats['max_waiting'] > concurrency
+    assert stats['handlers']['echo']['count'] == users * per_user
+
+
+# Обновлений в бенчмарке: SCHEDULER_BENCHMARK_UPDATES=20000 python -m pytest -s tests/test_scheduler.py
+BENCHMARK_UPDATES = int(os.environ.get("SCHEDULER_BENCHMARK_UPDATES", "2000"))
+
+
+def feed_rate(updates, concurrency=None, delay=0):
+    """
+    Обновлений в секунду: все обновления подаются параллельными задачами,
+    как в поллинге; обработчик ждет delay секунд (запрос к API, к базе).
+    concurrency=None — диспетчер без планировщика
+    """
+    async def scenario():
+        dp = Dispatcher()
+        if concurrency is not None:
+            UpdateScheduler(concurrency=concurrency).install(dp)
+
+        @dp.message()
+        async def handler(message):
+            await asyncio.sleep(delay)
+
+        bot = Bot(token=TOKEN)
+        try:
+            started = time.perf_counter()
+            await asyncio.gather(*(dp.feed_update(bot, update) for update in updates))
+            return len(updates) / (time.perf_counter() - started)
+        finally:
+            await bot.session.close()
+
+    return asyncio.run(scenario())
+
+
+def test_scheduler_throughput_benchmark():
+    """
+    Бенчмарк планировщика: накладные расходы на обновление без ожидания
+    в обработчике и обновлений в секунду при обработчиках с ожиданием
+    """
+    users = 200
+    updates = [message_update(update_id, update_id % users + 1, "текст")
+               for update_id in range(1, BENCHMARK_UPDATES + 1)]
+
+    baseline = feed_rate(updates)
+    scheduled = feed_rate(updates, concurrency=16)
+    concurrency, delay = 16, 0.05
+    waiting = feed_rate(updates[:500], concurrency=concurrency, delay=delay)
+    print(f"\n{len(updates)} обновлений: без планировщика {baseline:.0f}/с, "
+          f"с планировщиком {scheduled:.0f}/с; обработчик {delay * 1000:.0f} мс, "
+          f"{concurrency} слотов: {waiting:.0f}/с (предел {concurrency / delay:.0f}/с)")
+
+    # Очереди и семафор — малая доля стоимости обработки обновления
+    assert scheduled > baseline * 0.5
+    # При ожидании в обработчиках слоты заняты почти все время
+    assert waiting > concurrency / delay * 0.7
@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Бюджеты времени импорта точек входа, секунды (-X importtime, cumulative).
+# Бот почти все время тратит на aiogram.types, веб-сервер — на Flask.
+# Бюджет бота — около 1,5 измеренного времени (3,3 с)
+BOT_IMPORT_BUDGET = 5.0
+WEB_IMPORT_BUDGET = 1.0
+
+
+def import_times(code, tmp_path):
+    """Время импорта модулей в новом интерпретаторе: {модуль: cumulative, с}"""
+    env = dict(os.environ, DATABASE_PATH=str(tmp_path / "bot.db"), PYTHONPATH=ROOT)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        times[module.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def top_level(times):
+    return {module.split(".")[0] for module in times}
+
+
+def test_bot_entry_point_imports(tmp_path):
+    times = import_times("import main", tmp_path)
+    print(f"\nimport main: {times['main']:.2f} с")
+    assert not top_level(times) & {"flask", "flask_cors", "werkzeug", "web_app_server", "app"}
+    # Аналитика загружается только в процессе отрисовки /stats
+    assert not top_level(times) & {"matplotlib", "numpy"}
+    assert times["main"] < BOT_IMPORT_BUDGET
+
+
+def test_web_entry_point_imports(tmp_path):
+    # Модули, которые импортирует app.py; сам app.py при импорте запускает
+    # наблюдение за арендой бота и здесь не импортируется
+    times = import_times("import web_app_server, services.leader", tmp_path)
+    total = times["web_app_server"] + times["services.leader"]
+    print(f"\nimport web_app_server, services.leader: {total:.2f} с")
+    assert not top_level(times) & {"aiogram", "main", "handlers", "matplotlib", "numpy"}
+    assert total < WEB_IMPORT_BUDGET
@@ -0,0 +1,219 @@
+import asyncio
+import os
+import random
+import sqlite3
+import time
+
+import numpy as np
+import pytest
+
+from services import stats
+
+STATUSES = ('pending', 'met', 'delivered', 'cancelled')
+
+
+def fill_orders(path, count, seed=1):
+    """count заказов с отзывами за последний год по нескольким местам встреч"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            location_ids = [
+                conn.execute("INSERT INTO locations (name, address) VALUES (?, ?)",
+                             (f"Место {i}", f"Адрес {i}")).lastrowid
+                for i in range(5)
+            ]
+            user_ids = [
+                conn.execute("INSERT INTO users (telegram_id, username, full_name) VALUES (?, ?, ?)",
+                             (100000 + i, f"user{i}", f"Пользователь {i}")).lastrowid
+                for i in range(200)
+            ]
+            conn.executemany("""
+                INSERT INTO orders (user_id, location_id, status, card_type_1_count, card_type_2_count,
+                                    card_type_3_count, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, datetime('now', ?), datetime('now', ?))
+            """, [
+                (rng.choice(user_ids), rng.choice(location_ids), rng.choice(STATUSES),
+                 rng.randint(0, 3), rng.randint(0, 3), rng.randint(0, 3),
+                 f"-{age} hours", f"-{max(age - rng.randint(0, 48), 0)} hours")
+                for age in (rng.randint(0, 365 * 24) for _ in range(count))
+            ])
+            conn.execute("""
+                INSERT INTO feedback (order_id, rating, created_at)
+                SELECT id, 1 + id % 5, updated_at FROM orders WHERE status = 'delivered'
+            """)
+    finally:
+        conn.close()
+
+
+def fill_orders_bulk(path, count):
+    """count заказов за два года одним INSERT (триггеры агрегатов срабатывают как обычно)"""
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            conn.executemany("INSERT INTO locations (name, address) VALUES (?, ?)",
+                             [(f"Место {i}", f"Адрес {i}") for i in range(8)])
+            conn.execute("""
+                WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+                INSERT INTO orders (user_id, location_id, status, card_type_1_count, card_type_2_count,
+                                    card_type_3_count, created_at, updated_at)
+                SELECT 1 + i % 5000, 1 + i % 8,
+                       CASE i % 4 WHEN 0 THEN 'pending' WHEN 1 THEN 'met'
+                                  WHEN 2 THEN 'delivered' ELSE 'cancelled' END,
+                       i % 3, i % 2, i % 4,
+                       datetime('2024-01-01', '+' || (i % 730) || ' days', '+' || (i % 24) || ' hours'),
+                       datetime('2024-01-01', '+' || (i % 730) || ' days', '+' || (i % 24 + i % 48) || ' hours')
+                FROM n
+            """, (count,))
+            conn.execute("""
+                INSERT INTO feedback (order_id, rating, created_at)
+                SELECT id, 1 + id % 5, updated_at FROM orders WHERE status = 'delivered'
+            """)
+    finally:
+        conn.close()
+
+
+# Запросы статистики до дневных агрегатов: GROUP BY по всей истории заказов
+RAW_QUERIES = {
+    'orders_by_type': """
+        SELECT DATE(created_at) AS date, SUM(card_type_1_count), SUM(card_type_2_count), SUM(card_type_3_count)
+        FROM orders GROUP BY DATE(created_at) ORDER BY date
+    """,
+    'locations_popularity': """
+        SELECT l.name, COUNT(o.id) AS count
+        FROM locations l LEFT JOIN orders o ON l.id = o.location_id
+        GROUP BY l.id ORDER BY count DESC
+    """,
+    'feedback_ratings': """
+        SELECT DATE(created_at) AS date, AVG(rating) FROM feedback GROUP BY DATE(created_at) ORDER BY date
+    """,
+    'order_time_diff': """
+        SELECT DATE(created_at) AS date, AVG(JULIANDAY(updated_at) - JULIANDAY(created_at)) * 24
+        FROM orders WHERE status IN ('delivered', 'met')
+        GROUP BY DATE(created_at) ORDER BY date
+    """,
+    'orders_heatmap': """
+        SELECT CAST(strftime('%m', created_at) AS INTEGER) AS month,
+               CAST(strftime('%d', created_at) AS INTEGER) AS day, COUNT(*)
+        FROM orders GROUP BY month, day
+    """,
+    'order_statuses': "SELECT status, COUNT(*) FROM orders GROUP BY status",
+}
+
+
+def query_raw(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {name: conn.execute(sql).fetchall() for name, sql in RAW_QUERIES.items()}
+    finally:
+        conn.close()
+
+
+def best_time(function, *args, repeat=3):
+    """Лучшее время из repeat запусков и результат последнего"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+async def max_loop_lag(awaitable, interval=0.005):
+    """Наибольшая задержка тиков event loop, пока выполняется awaitable"""
+    lags = []
+
+    async def ticker():
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - started - interval)
+
+    task = asyncio.create_task(ticker())
+    # Первый тик до начала работы
+    await asyncio.sleep(interval)
+    try:
+        result = await awaitable
+        # Тик, задержанный работой, успевает завершиться
+        await asyncio.sleep(interval * 2)
+    finally:
+        task.cancel()
+    return max(lags), result
+
+
+@pytest.fixture
+def stats_db(db_path, tmp_path, monkeypatch):
+    fill_orders(db_path, 1000)
+    monkeypatch.setattr(stats, "DATABASE_PATH", db_path)
+    monkeypatch.setattr(stats, "STATS_CACHE_DIR", str(tmp_path / "stats_cache"))
+    yield db_path
+    stats.shutdown_stats_executor()
+
+
+def test_stats_render_does_not_block_event_loop(stats_db):
+    """
+    Бенчмарк задержки event loop: отрисовка прямо в loop против процесса пула
+    """
+    async def inline_render():
+        return stats.build_stats_png(stats_db)
+
+    async def scenario():
+        await stats.warm_up_stats_executor()
+        inline_lag, (version, inline_png) = await max_loop_lag(inline_render())
+        started = time.perf_counter()
+        pool_lag, (rendered_version, png) = await max_loop_lag(stats.generate_stats_image(version))
+        render_time = time.perf_counter() - started
+        return inline_lag, pool_lag, render_time, version, rendered_version, png
+
+    inline_lag, pool_lag, render_time, version, rendered_version, png = asyncio.run(scenario())
+    print(f"\nотрисовка в event loop: задержка {inline_lag * 1000:.0f} мс; "
+          f"в процессе пула: {render_time * 1000:.0f} мс, задержка {pool_lag * 1000:.1f} мс")
+
+    assert rendered_version == version
+    assert png.startswith(b'\x89PNG')
+    assert stats.read_cached_image(version) == png
+    # Отрисовка в loop останавливает его на все время работы, в пуле — нет
+    assert inline_lag > 0.2
+    assert pool_lag < 0.1
+    assert pool_lag < inline_lag / 5
+
+
+# Заказов в бенчмарке; по умолчанию меньше миллиона, чтобы тесты шли быстро:
+# STATS_BENCHMARK_ORDERS=1000000 python -m pytest -s tests/test_stats.py
+BENCHMARK_ORDERS = int(os.environ.get("STATS_BENCHMARK_ORDERS", "200000"))
+
+
+def test_stats_query_benchmark(db_path):
+    """
+    Бенчмарк запросов статистики: дневные агрегаты + NumPy против GROUP BY
+    по всем заказам; результаты должны совпадать
+    """
+    fill_orders_bulk(db_path, BENCHMARK_ORDERS)
+
+    rollup_time, data = best_time(stats.query_stats_data, db_path)
+    raw_time, raw = best_time(query_raw, db_path, repeat=1)
+    print(f"\n{BENCHMARK_ORDERS} заказов: агрегаты {rollup_time * 1000:.1f} мс, "
+          f"GROUP BY по заказам {raw_time * 1000:.0f} мс")
+
+    assert dict(zip(data['order_statuses']['status'], data['order_statuses']['count'].tolist())) == \
+        dict(raw['order_statuses'])
+    assert list(zip(data['locations_popularity']['names'], data['locations_popularity']['count'].tolist())) == \
+        raw['locations_popularity']
+
+    heatmap = np.zeros((12, 31))
+    for month, day, count in raw['orders_heatmap']:
+        heatmap[month - 1, day - 1] = count
+    assert np.array_equal(data['orders_heatmap'], heatmap)
+
+    by_type = data['orders_by_type']
+    assert by_type['dates'].tolist() == [row[0] for row in raw['orders_by_type']]
+    assert np.array_equal(np.column_stack([by_type['card_1'], by_type['card_2'], by_type['card_3']]),
+                          np.array([row[1:] for row in raw['orders_by_type']], dtype=float))
+
+    for name, value in (('feedback_ratings', 'avg_rating'), ('order_time_diff', 'hours_diff')):
+        assert data[name]['dates'].tolist() == [row[0] for row in raw[name]]
+        assert np.allclose(data[name][value], [row[1] for row in raw[name]])
+
+    # Агрегаты читают несколько строк на день, а не всю историю
+    assert rollup_time < raw_time / 10
@@ -0,0 +1,74 @@
+import sqlite3
+import time
+
+import pytest
+
+from database import counters
+from services import stats
+
+RENDER_TIMEOUT = 120
+
+
+@pytest.fixture
+def chart(web, tmp_path, monkeypatch):
+    """Клиент веб-сервера с отдельным кэшем изображений и процессом отрисовки"""
+    monkeypatch.setattr(stats, "STATS_CACHE_DIR", str(tmp_path / "stats_cache"))
+    yield web.app.test_client()
+    stats.shutdown_stats_executor()
+
+
+def data_version(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(counters.STATS_VERSION_SQL).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def add_user(path, telegram_id):
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO users (telegram_id, username, full_name) VALUES (?, ?, ?)",
+                (telegram_id, f"user{telegram_id}", "Тест")
+            )
+    finally:
+        conn.close()
+
+
+def test_chart_is_rendered_in_background(chart, db_path):
+    version = data_version(db_path)
+
+    # Кэш пуст: ответ не ждет отрисовку
+    started = time.perf_counter()
+    response = chart.get("/api/stats/chart")
+    assert time.perf_counter() - started < 1
+    assert response.status_code == 202
+    assert response.headers['Retry-After'] == '1'
+
+    # Повторный запрос не запускает вторую отрисовку той же версии
+    future = stats.submit_render(version, db_path)
+    chart.get("/api/stats/chart")
+    assert stats.submit_render(version, db_path) is future
+    future.result(timeout=RENDER_TIMEOUT)
+
+    response = chart.get("/api/stats/chart")
+    assert response.status_code == 200
+    assert response.content_type == 'image/png'
+    first = response.data
+    assert first == stats.read_cached_image(version)
+
+    # Данные изменились: сразу отдается прошлое изображение, новое рисуется в фоне
+    add_user(db_path, 1001)
+    new_version = data_version(db_path)
+    assert new_version != version
+    started = time.perf_counter()
+    response = chart.get("/api/stats/chart")
+    assert time.perf_counter() - started < 1
+    assert response.status_code == 200
+    assert response.data == first
+
+    stats.submit_render(new_version, db_path).result(timeout=RENDER_TIMEOUT)
+    assert stats.latest_cached_image()[0] == new_version
+    assert chart.get("/api/stats/chart").data == stats.read_cached_image(new_version)
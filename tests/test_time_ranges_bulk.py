@@ -0,0 +1,47 @@
+import pytest
+
+RANGE = {'start_time': '10:00', 'end_time': '11:00', 'window_duration_min': 30, 'max_meetings_per_window': 2}
+
+
+@pytest.fixture
+def client(web):
+    return web.app.test_client()
+
+
+def test_bulk_creates_ranges_for_period(client, db_path):
+    response = client.post("/api/time-ranges/bulk", json={
+        'date_from': '2030-01-01', 'date_to': '2030-01-03', 'ranges': [RANGE],
+    })
+    assert response.status_code == 201
+    assert len(response.get_json()['ids']) == 3
+
+
+@pytest.mark.parametrize("payload", [
+    {'date_from': '2030-01-01', 'date_to': '2031-01-01', 'ranges': [RANGE]},
+    {'date_from': '2030-01-01', 'date_to': '9999-12-31', 'ranges': [RANGE]},
+    {'date_from': '2030-01-02', 'date_to': '2030-01-01', 'ranges': [RANGE]},
+    {'dates': [f'2030-01-{day:02d}' for day in range(1, 32)] * 3 + ['2030-02-01'], 'ranges': [RANGE]},
+])
+def test_bulk_rejects_too_long_period(client, payload):
+    response = client.post("/api/time-ranges/bulk", json=payload)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("field", ['window_duration_min', 'max_meetings_per_window'])
+@pytest.mark.parametrize("value", ['abc', None, 0, -5, 1.5, True, [], {}])
+def test_bulk_rejects_invalid_numbers(client, field, value):
+    response = client.post("/api/time-ranges/bulk", json={
+        'dates': ['2030-01-01'], 'ranges': [dict(RANGE, **{field: value})],
+    })
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+@pytest.mark.parametrize("payload", [
+    {'dates': '2030-01-01', 'ranges': [RANGE]},
+    {'dates': [20300101], 'ranges': [RANGE]},
+    {'dates': ['2030-01-01'], 'ranges': ['10:00-11:00']},
+    {'dates': ['2030-01-01'], 'ranges': [dict(RANGE, start_time=1000)]},
+])
+def test_bulk_rejects_malformed_payload(client, payload):
+    assert client.post("/api/time-ranges/bulk", json=payload).status_code == 400
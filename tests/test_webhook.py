@@ -0,0 +1,78 @@
+import asyncio
+import json
+import os
+
+from aiogram import Bot, Dispatcher, F
+from aiohttp.test_utils import TestClient, TestServer
+
+from services.scheduler import UpdateScheduler
+from services.webhook import SECRET_HEADER, WebhookServer
+
+TOKEN = "123456:test-token"
+SECRET = "webhook-test-secret"
+
+# Обновление, полученное от Telegram
+with open(os.path.join(os.path.dirname(__file__), "data", "update_message.json"), encoding="utf-8") as f:
+    UPDATE = json.load(f)
+
+
+def run_webhook(requests):
+    """
+    Запросы к WebhookServer (диспетчер с UpdateScheduler, как в main.py):
+    статусы ответов и тексты сообщений, дошедших до обработчика
+    """
+    handled = []
+
+    async def scenario():
+        dp = Dispatcher()
+        UpdateScheduler().install(dp)
+
+        @dp.message(F.text)
+        async def on_text(message):
+            handled.append((message.from_user.id, message.text))
+
+        bot = Bot(token=TOKEN)
+        server = WebhookServer(dp, bot, path="/telegram/webhook", secret=SECRET)
+        client = TestClient(TestServer(server.application()))
+        await client.start_server()
+        statuses = []
+        try:
+            for headers, body in requests:
+                response = await client.post("/telegram/webhook", data=body, headers=headers)
+                statuses.append(response.status)
+        finally:
+            await client.close()
+            # Ожидание обработки уже принятых обновлений
+            await server.stop()
+            await bot.session.close()
+        return statuses
+
+    return asyncio.run(scenario()), handled
+
+
+def test_webhook_update_reaches_handler():
+    statuses, handled = run_webhook([
+        ({SECRET_HEADER: SECRET, 'Content-Type': 'application/json'}, json.dumps(UPDATE)),
+    ])
+    assert statuses == [200]
+    assert handled == [(UPDATE['message']['from']['id'], UPDATE['message']['text'])]
+
+
+def test_webhook_rejects_wrong_secret():
+    body = json.dumps(UPDATE)
+    statuses, handled = run_webhook([
+        ({SECRET_HEADER: 'wrong-secret'}, body),
+        ({SECRET_HEADER: SECRET[:-1]}, body),
+        ({}, body),
+    ])
+    assert statuses == [401, 401, 401]
+    assert handled == []
+
+
+def test_webhook_rejects_malformed_update():
+    statuses, handled = run_webhook([
+        ({SECRET_HEADER: SECRET}, "not json"),
+        ({SECRET_HEADER: SECRET}, json.dumps({'message': 'no update_id'})),
+    ])
+    assert statuses == [400, 400]
+    assert handled == []
@@ -0,0 +1,55 @@
+import base64
+import json
+
+# Размер страницы по умолчанию и верхняя граница для списков заказов
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Условие keyset-пагинации для сортировки ORDER BY created_at DESC, id DESC
+KEYSET_CONDITION = "(o.created_at, o.id) < (?, ?)"
+KEYSET_ORDER = "ORDER BY o.created_at DESC, o.id DESC"
+
+# Предыдущая страница: строки новее ключа, ближайшие к нему первыми
+KEYSET_BEFORE_CONDITION = "(o.created_at, o.id) > (?, ?)"
+KEYSET_REVERSE_ORDER = "ORDER BY o.created_at ASC, o.id ASC"
+
+def clamp_page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """
+    Размер страницы в пределах 1..maximum
+    """
+    if value in (None, ''):
+        return default
+    return max(1, min(int(value), maximum))
+
+def encode_cursor(created_at, row_id):
+    """
+    Непрозрачный курсор из ключа последней строки страницы
+    """
+    raw = json.dumps([created_at, row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Ключ (created_at, id) из курсора; ValueError при неверном курсоре
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Неверный курсор") from e
+    # bool — подкласс int, но в курсоре его быть не может
+    if not isinstance(created_at, str) or not isinstance(row_id, int) or isinstance(row_id, bool):
+        raise ValueError("Неверный курсор")
+    return created_at, row_id
+
+def split_page(rows, page_size):
+    """
+    Строки страницы и курсор следующей страницы.
+    Запрос должен выбирать page_size + 1 строк: лишняя строка означает,
+    что следующая страница существует.
+    """
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, encode_cursor(last['created_at'], last['id'])
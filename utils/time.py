@@ -20,6 +20,31 @@ def generate_time_windows(start_time, end_time, window_duration_min):
     
     return windows
 
+def build_meeting_windows(range_id, start_time, end_time, window_duration_min):
+    """
+    Строки (range_id, start_time, end_time) всех окон диапазона для executemany
+    """
+    return [
+        (range_id, window['start_time'], window['end_time'])
+        for window in generate_time_windows(start_time, end_time, window_duration_min)
+    ]
+
+def expand_time_ranges(dates, ranges):
+    """
+    Декартово произведение дат и шаблонов диапазонов для массового создания
+    """
+    items = []
+    for date in dates:
+        for time_range in ranges:
+            items.append({
+                'date': date,
+                'start_time': time_range['start_time'],
+                'end_time': time_range['end_time'],
+                'window_duration_min': int(time_range.get('window_duration_min', 10)),
+                'max_meetings_per_window': int(time_range.get('max_meetings_per_window', 1))
+            })
+    return items
+
 def get_week_dates(start_date):
     """
     Получение дат недели
@@ -31,6 +56,18 @@ def get_week_dates(start_date):
         week.append(date.strftime("%Y-%m-%d"))
     return week
 
+def get_dates_between(date_from, date_to):
+    """
+    Получение всех дат от date_from до date_to включительно
+    """
+    start = datetime.strptime(date_from, "%Y-%m-%d")
+    end = datetime.strptime(date_to, "%Y-%m-%d")
+    dates = []
+    while start <= end:
+        dates.append(start.strftime("%Y-%m-%d"))
+        start += timedelta(days=1)
+    return dates
+
 def format_datetime_for_display(dt_string):
     """
     Форматирование даты для отображения
@@ -28,6 +28,20 @@ def validate_card_description(description):
         return False
     return True
 
+def parse_positive_int(value):
+    """
+    Целое число больше нуля (int или строка) или None
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, float):
+        return int(value) if value.is_integer() and value > 0 else None
+    try:
+        val = int(value)
+    except (ValueError, TypeError):
+        return None
+    return val if val > 0 else None
+
 def validate_positive_integer(value):
     """
     Валидация положительного целого числа
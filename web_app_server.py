@@ -1,10 +1,21 @@
-from flask import Flask, render_template, send_from_directory, jsonify, request
+from flask import Flask, render_template, send_from_directory, jsonify, request, g, Response, stream_with_context
 from flask_cors import CORS
 import os
 import json
 from datetime import datetime, timedelta
-import sqlite3
+import time
 from datetime import datetime as dt
+from config import DB_PRAGMAS, DB_STATEMENT_CACHE_SIZE, AVAILABILITY_CHECK, USER_CACHE_SIZE, USER_CACHE_TTL
+from config import METRICS_DIR, METRICS_SNAPSHOT_INTERVAL
+from database import booking, counters, leases, outbox
+from database.migrate import migrate
+from database.sync_pool import SQLitePool
+from services import export, metrics, stats
+from services.availability import AvailabilityIndex, fetch_rows_sync, PERIOD_SQL, group_period_rows
+from utils.cache import LRUCache
+from utils.pagination import KEYSET_CONDITION, KEYSET_ORDER, clamp_page_size, decode_cursor, split_page
+from utils.time import build_meeting_windows, expand_time_ranges, get_dates_between
+from utils.validation import parse_positive_int, validate_date_format, validate_time_format
 
 app = Flask(__name__, 
            template_folder='web_app',
@@ -20,102 +31,150 @@ CORS(app, resources={
 # Путь к базе данных
 DB_PATH = os.environ.get("DATABASE_PATH", "database/bot.db")
 
+# Максимальный период для /api/availability
+MAX_AVAILABILITY_DAYS = 31
+
+# Максимальное количество дат в одном запросе /api/time-ranges/bulk
+MAX_BULK_DAYS = 92
+
+# Пул соединений воркера: потоковые читатели и один общий писатель
+db_pool = SQLitePool(DB_PATH, pragmas=DB_PRAGMAS, statement_cache_size=DB_STATEMENT_CACHE_SIZE)
+
 def get_db():
-    """Получение соединения с базой данных"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Получение соединения для чтения на время запроса"""
+    if 'db' not in g:
+        g.db = db_pool.reader()
+    return g.db
+
+# Снимки метрик воркера для общего /metrics всех воркеров gunicorn
+if METRICS_DIR:
+    metrics.start_snapshots(METRICS_DIR, METRICS_SNAPSHOT_INTERVAL)
+
+# Индекс доступности слотов в памяти воркера
+availability = AvailabilityIndex()
+
+# Строки пользователей по Telegram ID для оформления заказов
+users_cache = LRUCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+def get_availability():
+    """Индекс доступности, перезагруженный после изменений из других процессов"""
+    version = booking.read_availability_version_sync(get_db())
+    if availability.needs_reload(version):
+        # Снимок, прочитанный до изменения индекса на месте, читается заново
+        while True:
+            generation = availability.generation
+            ranges, windows = fetch_rows_sync(get_db())
+            if availability.load(ranges, windows, version=version, generation=generation):
+                break
+    elif AVAILABILITY_CHECK:
+        check_availability()
+    return availability
+
+def begin_availability_write(conn):
+    """Начало транзакции писателя; версия доступности до изменений"""
+    conn.execute("BEGIN IMMEDIATE")
+    return booking.read_availability_version_sync(conn)
+
+def check_availability():
+    """Сравнение индекса доступности с SQLite; при расхождении индекс перезагружается"""
+    generation = availability.generation
+    version = booking.read_availability_version_sync(get_db())
+    ranges, windows = fetch_rows_sync(get_db())
+    if availability.generation != generation:
+        # Индекс изменился во время чтения: сравнение было бы неверным
+        return []
+    differences = availability.compare(ranges, windows)
+    if differences:
+        print(f"⚠️ Индекс доступности расходится с базой: {len(differences)} отличий")
+        availability.load(ranges, windows, version=version, generation=generation)
+    return differences
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    """Время запроса по шаблону маршрута (без значений параметров)"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        metrics.HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - started, request.method, route, response.status_code)
+    return response
+
+@app.teardown_appcontext
+def release_db(exception):
+    """Возврат соединения в пул по завершении запроса"""
+    conn = g.pop('db', None)
+    if conn is not None:
+        db_pool.release(conn)
 
 def init_demo_data():
     """Инициализация демо данных если БД пуста"""
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Проверяем, есть ли данные в meeting_time_ranges
-    cursor.execute("SELECT COUNT(*) FROM meeting_time_ranges")
-    if cursor.fetchone()[0] == 0:
-        print("Добавляем демо временные диапазоны...")
-        # Добавляем демо временные диапазоны на ближайшие несколько дней
-        today = dt.now()
-        for i in range(7):  # 7 дней
-            date = (today + timedelta(days=i)).strftime('%Y-%m-%d')
-            
-            # Утренний диапазон
-            cursor.execute("""
-                INSERT INTO meeting_time_ranges 
-                (date, start_time, end_time, window_duration_min, max_meetings_per_window, is_active) 
-                VALUES (?, '10:00', '12:00', 15, 2, 1)
-            """, (date,))
-            range_id1 = cursor.lastrowid
+    with db_pool.write() as conn:
+        cursor = conn.cursor()
+        
+        # Проверяем, есть ли данные в meeting_time_ranges
+        cursor.execute("SELECT COUNT(*) FROM meeting_time_ranges")
+        if cursor.fetchone()[0] == 0:
+            print("Добавляем демо временные диапазоны...")
+            # Добавляем демо временные диапазоны на ближайшие несколько дней
+            today = dt.now()
+            dates = [(today + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(7)]  # 7 дней
             
-            # Генерируем временные окна для первого диапазона
-            generate_meeting_windows(cursor, range_id1, '10:00', '12:00', 15)
+            # Утренний, послеобеденный и вечерний диапазоны со всеми окнами
+            insert_time_ranges(cursor, expand_time_ranges(dates, [
+                {'start_time': '10:00', 'end_time': '12:00', 'window_duration_min': 15, 'max_meetings_per_window': 2},
+                {'start_time': '14:00', 'end_time': '16:00', 'window_duration_min': 10, 'max_meetings_per_window': 3},
+                {'start_time': '17:00', 'end_time': '19:00', 'window_duration_min': 20, 'max_meetings_per_window': 1}
+            ]))
+        
+            print("Временные диапазоны добавлены")
+        
+        # Проверяем, есть ли локации
+        cursor.execute("SELECT COUNT(*) FROM locations")
+        if cursor.fetchone()[0] == 0:
+            print("Добавляем демо локации...")
+            # Добавляем локации
+            locations = [
+                ('Центральная площадь', 'ул. Ленина, 1'),
+                ('Парк культуры', 'пр. Мира, 15'),
+                ('Библиотека', 'ул. Пушкина, 23'),
+                ('Кафе "У Марины"', 'ул. Гагарина, 5'),
+                ('Магазин "Почта"', 'пр. Победы, 12')
+            ]
             
-            # Послеобеденный диапазон
-            cursor.execute("""
-                INSERT INTO meeting_time_ranges 
-                (date, start_time, end_time, window_duration_min, max_meetings_per_window, is_active) 
-                VALUES (?, '14:00', '16:00', 10, 3, 1)
-            """, (date,))
-            range_id2 = cursor.lastrowid
+            for name, address in locations:
+                cursor.execute("""
+                    INSERT INTO locations (name, address, is_custom, created_by_admin) 
+                    VALUES (?, ?, 0, 1)
+                """, (name, address))
             
-            # Генерируем временные окна для второго диапазона
-            generate_meeting_windows(cursor, range_id2, '14:00', '16:00', 10)
-            
-            # Вечерний диапазон
-            cursor.execute("""
-                INSERT INTO meeting_time_ranges 
-                (date, start_time, end_time, window_duration_min, max_meetings_per_window, is_active) 
-                VALUES (?, '17:00', '19:00', 20, 1, 1)
-            """, (date,))
-            range_id3 = cursor.lastrowid
-            
-            # Генерируем временные окна для третьего диапазона
-            generate_meeting_windows(cursor, range_id3, '17:00', '19:00', 20)
-        
-        conn.commit()
-        print("Временные диапазоны добавлены")
-    
-    # Проверяем, есть ли локации
-    cursor.execute("SELECT COUNT(*) FROM locations")
-    if cursor.fetchone()[0] == 0:
-        print("Добавляем демо локации...")
-        # Добавляем локации
-        locations = [
-            ('Центральная площадь', 'ул. Ленина, 1'),
-            ('Парк культуры', 'пр. Мира, 15'),
-            ('Библиотека', 'ул. Пушкина, 23'),
-            ('Кафе "У Марины"', 'ул. Гагарина, 5'),
-            ('Магазин "Почта"', 'пр. Победы, 12')
-        ]
-        
-        for name, address in locations:
-            cursor.execute("""
-                INSERT INTO locations (name, address, is_custom, created_by_admin) 
-                VALUES (?, ?, 0, 1)
-            """, (name, address))
-        
-        conn.commit()
-        print("Локации добавлены")
-    
-    conn.close()
+            print("Локации добавлены")
 
-def generate_meeting_windows(cursor, range_id, start_time, end_time, window_duration_min):
-    """Генерация временных окон для диапазона"""
-    start_dt = dt.strptime(start_time, "%H:%M")
-    end_dt = dt.strptime(end_time, "%H:%M")
-    
-    current_time = start_dt
-    while current_time + timedelta(minutes=window_duration_min) <= end_dt:
-        next_time = current_time + timedelta(minutes=window_duration_min)
-        
+def insert_time_ranges(cursor, items):
+    """Вставка диапазонов и всех их временных окон в текущей транзакции"""
+    range_ids = []
+    window_rows = []
+    for item in items:
         cursor.execute("""
-            INSERT INTO meeting_windows 
-            (range_id, start_time, end_time, is_available, current_bookings) 
-            VALUES (?, ?, ?, 1, 0)
-        """, (range_id, current_time.strftime("%H:%M"), next_time.strftime("%H:%M")))
-        
-        current_time = next_time
+            INSERT INTO meeting_time_ranges 
+            (date, start_time, end_time, window_duration_min, max_meetings_per_window, is_active) 
+            VALUES (?, ?, ?, ?, ?, 1)
+        """, (item['date'], item['start_time'], item['end_time'],
+              item['window_duration_min'], item['max_meetings_per_window']))
+        range_ids.append(cursor.lastrowid)
+        window_rows.extend(build_meeting_windows(
+            cursor.lastrowid, item['start_time'], item['end_time'], item['window_duration_min']))
+    
+    # Все окна вставляются одним executemany
+    cursor.executemany("""
+        INSERT INTO meeting_windows 
+        (range_id, start_time, end_time, is_available, current_bookings) 
+        VALUES (?, ?, ?, 1, 0)
+    """, window_rows)
+    return range_ids
 
 @app.route("/")
 def index():
@@ -154,21 +213,34 @@ def serve_static(filename):
 def get_time_ranges(date):
     """Получение временных диапазонов для даты"""
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT * FROM meeting_time_ranges 
-            WHERE date = ? AND is_active = 1
-            ORDER BY start_time
-        """, (date,))
-        ranges = [dict(row) for row in cursor.fetchall()]
-        conn.close()
+        ranges = get_availability().active_ranges_by_date(date)
         print(f"Найдено {len(ranges)} диапазонов для даты {date}")
         return jsonify(ranges)
     except Exception as e:
         print(f"Error getting time ranges: {e}")
         return jsonify([]), 500
 
+@app.route("/api/availability")
+def get_period_availability():
+    """Диапазоны с окнами и оставшейся вместимостью на несколько дней одним запросом"""
+    try:
+        date_from = request.args.get('from') or datetime.now().strftime("%Y-%m-%d")
+        if not validate_date_format(date_from):
+            return jsonify({'error': 'Неверный формат даты'}), 400
+        try:
+            days = int(request.args.get('days', 7))
+        except ValueError:
+            return jsonify({'error': 'Неверное количество дней'}), 400
+        if not 1 <= days <= MAX_AVAILABILITY_DAYS:
+            return jsonify({'error': f'Количество дней должно быть от 1 до {MAX_AVAILABILITY_DAYS}'}), 400
+        
+        date_to = (datetime.strptime(date_from, "%Y-%m-%d") + timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        rows = get_db().execute(PERIOD_SQL, (date_from, date_to)).fetchall()
+        return jsonify({'from': date_from, 'days': group_period_rows(get_dates_between(date_from, date_to), rows)})
+    except Exception as e:
+        print(f"Error getting availability: {e}")
+        return jsonify({'error': 'Ошибка загрузки доступности'}), 500
+
 @app.route("/api/time-ranges", methods=['GET'])
 def get_all_time_ranges():
     """Получение всех временных диапазонов"""
@@ -180,7 +252,6 @@ def get_all_time_ranges():
             ORDER BY date DESC, start_time
         """)
         ranges = [dict(row) for row in cursor.fetchall()]
-        conn.close()
         return jsonify(ranges)
     except Exception as e:
         print(f"Error getting all time ranges: {e}")
@@ -192,51 +263,76 @@ def create_time_range():
     try:
         data = request.json
         print(f"Создание диапазона: {data}")
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO meeting_time_ranges 
-            (date, start_time, end_time, window_duration_min, max_meetings_per_window, is_active) 
-            VALUES (?, ?, ?, ?, ?, 1)
-        """, (
-            data.get('date'),
-            data.get('start_time'),
-            data.get('end_time'),
-            data.get('window_duration_min', 10),
-            data.get('max_meetings_per_window', 1)
-        ))
-        
-        range_id = cursor.lastrowid
-        
-        # Генерируем временные окна
-        generate_meeting_windows(cursor, range_id, 
-                               data.get('start_time'), 
-                               data.get('end_time'), 
-                               data.get('window_duration_min', 10))
-        
-        conn.commit()
-        conn.close()
+        with db_pool.write() as conn:
+            range_id = insert_time_ranges(conn.cursor(), expand_time_ranges([data.get('date')], [data]))[0]
+        availability.invalidate()
         
         return jsonify({'id': range_id, 'message': 'Диапазон добавлен успешно'}), 201
     except Exception as e:
         print(f"Error creating time range: {e}")
         return jsonify({'error': 'Ошибка добавления диапазона'}), 500
 
+@app.route("/api/time-ranges/bulk", methods=['POST'])
+def create_time_ranges_bulk():
+    """Массовое создание временных диапазонов на несколько дат"""
+    try:
+        data = request.json or {}
+        dates = data.get('dates')
+        if not dates and data.get('date_from') and data.get('date_to'):
+            if not (validate_date_format(data['date_from']) and validate_date_format(data['date_to'])):
+                return jsonify({'error': 'Неверный формат даты'}), 400
+            # Период проверяется до построения списка дат
+            days = (datetime.strptime(data['date_to'], "%Y-%m-%d") -
+                    datetime.strptime(data['date_from'], "%Y-%m-%d")).days + 1
+            if not 1 <= days <= MAX_BULK_DAYS:
+                return jsonify({'error': f'Количество дней должно быть от 1 до {MAX_BULK_DAYS}'}), 400
+            dates = get_dates_between(data['date_from'], data['date_to'])
+        ranges = data.get('ranges') or []
+        
+        if not dates or not ranges:
+            return jsonify({'error': 'Не указаны даты или диапазоны'}), 400
+        if not isinstance(dates, list) or not isinstance(ranges, list):
+            return jsonify({'error': 'Даты и диапазоны должны быть списками'}), 400
+        if len(dates) > MAX_BULK_DAYS:
+            return jsonify({'error': f'Количество дней должно быть от 1 до {MAX_BULK_DAYS}'}), 400
+        if not all(isinstance(date, str) and validate_date_format(date) for date in dates):
+            return jsonify({'error': 'Неверный формат даты'}), 400
+        for time_range in ranges:
+            if not isinstance(time_range, dict):
+                return jsonify({'error': 'Неверный формат диапазона'}), 400
+            start_time = time_range.get('start_time')
+            end_time = time_range.get('end_time')
+            if not (isinstance(start_time, str) and validate_time_format(start_time) and
+                    isinstance(end_time, str) and validate_time_format(end_time)):
+                return jsonify({'error': 'Неверный формат времени'}), 400
+            if parse_positive_int(time_range.get('window_duration_min', 10)) is None:
+                return jsonify({'error': 'Длительность окна должна быть положительным целым числом'}), 400
+            if parse_positive_int(time_range.get('max_meetings_per_window', 1)) is None:
+                return jsonify({'error': 'Количество встреч в окне должно быть положительным целым числом'}), 400
+        
+        with db_pool.write() as conn:
+            range_ids = insert_time_ranges(conn.cursor(), expand_time_ranges(dates, ranges))
+        availability.invalidate()
+        
+        return jsonify({'ids': range_ids, 'message': f'Добавлено диапазонов: {len(range_ids)}'}), 201
+    except Exception as e:
+        print(f"Error creating time ranges in bulk: {e}")
+        return jsonify({'error': 'Ошибка массового добавления диапазонов'}), 500
+
 @app.route("/api/time-ranges/<int:range_id>", methods=['DELETE'])
 def delete_time_range(range_id):
     """Удаление временного диапазона"""
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        # Сначала удаляем все окна
-        cursor.execute("DELETE FROM meeting_windows WHERE range_id = ?", (range_id,))
-        # Затем удаляем диапазон
-        cursor.execute("DELETE FROM meeting_time_ranges WHERE id = ?", (range_id,))
-        
-        conn.commit()
-        conn.close()
+        with db_pool.write() as conn:
+            before = begin_availability_write(conn)
+            cursor = conn.cursor()
+            
+            # Сначала удаляем все окна
+            cursor.execute("DELETE FROM meeting_windows WHERE range_id = ?", (range_id,))
+            # Затем удаляем диапазон
+            cursor.execute("DELETE FROM meeting_time_ranges WHERE id = ?", (range_id,))
+            versions = before, booking.read_availability_version_sync(conn)
+        availability.remove_range(range_id, versions)
         
         return jsonify({'message': 'Диапазон удален успешно'}), 200
     except Exception as e:
@@ -250,16 +346,16 @@ def toggle_time_range(range_id):
         data = request.json
         is_active = data.get('is_active', False)
         
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE meeting_time_ranges 
-            SET is_active = ? 
-            WHERE id = ?
-        """, (is_active, range_id))
-        
-        conn.commit()
-        conn.close()
+        with db_pool.write() as conn:
+            before = begin_availability_write(conn)
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE meeting_time_ranges 
+                SET is_active = ? 
+                WHERE id = ?
+            """, (is_active, range_id))
+            versions = before, booking.read_availability_version_sync(conn)
+        availability.set_range_active(range_id, is_active, versions)
         
         return jsonify({'message': 'Статус диапазона изменен'}), 200
     except Exception as e:
@@ -270,21 +366,24 @@ def toggle_time_range(range_id):
 def get_time_windows(range_id):
     """Получение временных окон для диапазона"""
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT * FROM meeting_windows 
-            WHERE range_id = ?
-            ORDER BY start_time
-        """, (range_id,))
-        windows = [dict(row) for row in cursor.fetchall()]
-        conn.close()
+        windows = get_availability().windows_by_range(range_id)
         print(f"Найдено {len(windows)} окон для диапазона {range_id}")
         return jsonify(windows)
     except Exception as e:
         print(f"Error getting time windows: {e}")
         return jsonify([]), 500
 
+@app.route("/api/availability/check")
+def get_availability_check():
+    """Проверка согласованности индекса доступности с SQLite"""
+    try:
+        get_availability()
+        differences = check_availability()
+        return jsonify({'consistent': not differences, 'differences': differences})
+    except Exception as e:
+        print(f"Error checking availability index: {e}")
+        return jsonify({'error': 'Ошибка проверки индекса доступности'}), 500
+
 @app.route("/api/locations")
 def get_locations():
     """Получение всех локаций"""
@@ -293,7 +392,6 @@ def get_locations():
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM locations ORDER BY name")
         locations = [dict(row) for row in cursor.fetchall()]
-        conn.close()
         return jsonify(locations)
     except Exception as e:
         print(f"Error getting locations: {e}")
@@ -304,17 +402,15 @@ def create_location():
     """Создание новой локации"""
     try:
         data = request.json
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO locations (name, address, is_custom, created_by_admin) 
-            VALUES (?, ?, 0, 1)
-        """, (data.get('name'), data.get('address')))
-        
-        location_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        with db_pool.write() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                INSERT INTO locations (name, address, is_custom, created_by_admin) 
+                VALUES (?, ?, 0, 1)
+            """, (data.get('name'), data.get('address')))
+            
+            location_id = cursor.lastrowid
         
         return jsonify({'id': location_id, 'message': 'Локация добавлена успешно'}), 201
     except Exception as e:
@@ -325,11 +421,9 @@ def create_location():
 def delete_location(location_id):
     """Удаление локации"""
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM locations WHERE id = ?", (location_id,))
-        conn.commit()
-        conn.close()
+        with db_pool.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM locations WHERE id = ?", (location_id,))
         
         return jsonify({'message': 'Локация удалена успешно'}), 200
     except Exception as e:
@@ -338,12 +432,22 @@ def delete_location(location_id):
 
 @app.route("/api/orders", methods=['GET'])
 def get_orders():
-    """Получение заказов с фильтрацией"""
+    """
+    Получение заказов с фильтрацией постранично (новые первыми).
+    Параметры: status, page_size, cursor (next_cursor предыдущей страницы).
+    С all=1 возвращается прежний список всех заказов (с необязательным limit).
+    """
     try:
         status = request.args.get('status')
+        try:
+            page_size = clamp_page_size(request.args.get('page_size'))
+            cursor_key = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        except ValueError:
+            return jsonify({'error': 'Неверные параметры пагинации'}), 400
+        unpaginated = request.args.get('all') == '1'
         limit = request.args.get('limit')
-        conn = get_db()
-        cursor = conn.cursor()
+        if unpaginated and limit and parse_positive_int(limit) is None:
+            return jsonify({'error': 'Неверные параметры пагинации'}), 400
         
         query = """
             SELECT o.*, u.full_name as user, u.telegram_id,
@@ -355,24 +459,58 @@ def get_orders():
             LEFT JOIN locations l ON o.location_id = l.id
         """
         
+        conditions = []
         params = []
         if status:
-            query += " WHERE o.status = ?"
+            conditions.append("o.status = ?")
             params.append(status)
-        
-        query += " ORDER BY o.created_at DESC"
-        
-        if limit:
-            query += " LIMIT ?"
-            params.append(int(limit))
-        
-        cursor.execute(query, params)
-        orders = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return jsonify(orders)
+        if cursor_key and not unpaginated:
+            conditions.append(KEYSET_CONDITION)
+            params.extend(cursor_key)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        
+        query += " " + KEYSET_ORDER
+        
+        if unpaginated:
+            if limit:
+                query += " LIMIT ?"
+                params.append(parse_positive_int(limit))
+            rows = get_db().execute(query, params).fetchall()
+            return jsonify([dict(row) for row in rows])
+        
+        query += " LIMIT ?"
+        params.append(page_size + 1)
+        rows, next_cursor = split_page(get_db().execute(query, params).fetchall(), page_size)
+        return jsonify({'orders': [dict(row) for row in rows], 'next_cursor': next_cursor})
     except Exception as e:
         print(f"Error getting orders: {e}")
-        return jsonify([]), 500
+        return jsonify({'error': 'Ошибка получения заказов'}), 500
+
+@app.route("/api/orders/export")
+def export_orders():
+    """
+    Потоковая выгрузка заказов: format=csv|ndjson, from, to (YYYY-MM-DD), status.
+    Строки отдаются по мере чтения из курсора, без сборки списка в памяти.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in export.EXPORT_FORMATS:
+        return jsonify({'error': 'Формат должен быть csv или ndjson'}), 400
+    date_from = request.args.get('from')
+    date_to = request.args.get('to')
+    if any(date and not validate_date_format(date) for date in (date_from, date_to)):
+        return jsonify({'error': 'Неверный формат даты'}), 400
+    
+    query, params = export.build_export_query(request.args.get('status'), date_from, date_to)
+    
+    def generate():
+        yield from export.iter_export(get_db().execute(query, params), fmt)
+    
+    return Response(
+        stream_with_context(generate()),
+        content_type=export.EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename={export.export_filename(fmt)}'}
+    )
 
 @app.route("/api/orders/<int:order_id>")
 def get_order(order_id):
@@ -391,7 +529,6 @@ def get_order(order_id):
             WHERE o.id = ?
         """, (order_id,))
         order = cursor.fetchone()
-        conn.close()
         
         if order:
             return jsonify(dict(order))
@@ -413,89 +550,34 @@ def create_order():
         if not telegram_id:
             return jsonify({'error': 'Не указан ID пользователя'}), 400
         
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        # Создаем или обновляем пользователя с правильным Telegram ID
-        cursor.execute("""
-            INSERT OR IGNORE INTO users (telegram_id, full_name) 
-            VALUES (?, ?)
-        """, (telegram_id, f"Пользователь {telegram_id}"))
-        
-        # Получаем внутренний ID пользователя
-        cursor.execute("SELECT id FROM users WHERE telegram_id = ?", (telegram_id,))
-        user_row = cursor.fetchone()
-        if not user_row:
-            conn.close()
-            return jsonify({'error': 'Ошибка создания пользователя'}), 500
-        
-        user_id = user_row[0]  # Внутренний ID в нашей базе данных
-        print(f"Telegram ID: {telegram_id}, Internal User ID: {user_id}")
-        
-        # Проверяем, есть ли у пользователя незавершенные заказы
-        cursor.execute("""
-            SELECT COUNT(*) as count FROM orders 
-            WHERE user_id = ? AND status IN ('pending', 'met')
-        """, (user_id,))
-        row = cursor.fetchone()
-        if row and row[0] >= 2:
-            conn.close()
-            return jsonify({'error': 'У вас уже есть 2 незавершенных заказа'}), 400
-        
-        # Бронируем временное окно
-        window_id = data.get('window_id')
-        cursor.execute("""
-            UPDATE meeting_windows 
-            SET current_bookings = current_bookings + 1, 
-                assigned_user_id = ?,
-                is_available = CASE 
-                    WHEN current_bookings + 1 >= (
-                        SELECT max_meetings_per_window 
-                        FROM meeting_time_ranges 
-                        WHERE id = (
-                            SELECT range_id 
-                            FROM meeting_windows 
-                            WHERE id = ?
-                        )
-                    ) THEN 0 ELSE 1 END
-            WHERE id = ?
-        """, (user_id, window_id, window_id))
-        
         # Получаем данные о количестве открыток
         card_data = data.get('card_data', {})
-        card_counts = card_data.get('counts', {})
-        
-        card_type_1_count = card_counts.get('1', 0) or card_counts.get(1, 0) or 0
-        card_type_2_count = card_counts.get('2', 0) or card_counts.get(2, 0) or 0
-        card_type_3_count = card_counts.get('3', 0) or card_counts.get(3, 0) or 0
-        
-        print(f"Количество открыток: 1={card_type_1_count}, 2={card_type_2_count}, 3={card_type_3_count}")
-        
-        # Создаем заказ с правильным user_id (внутренним ID)
-        cursor.execute("""
-            INSERT INTO orders 
-            (user_id, meeting_window_id, location_id, custom_location, is_anonymous, 
-             delivery_delay_days, card_type_1_count, card_type_2_count, card_type_3_count,
-             recipient_name, delivery_address, client_name)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            user_id,  # Используем внутренний ID пользователя
-            window_id,
-            data.get('location_data', {}).get('location_id'),
-            data.get('location_data', {}).get('custom_location'),
-            data.get('anonymous', False),
-            data.get('delay_days', 0),
-            card_type_1_count,
-            card_type_2_count,
-            card_type_3_count,
-            data.get('recipient_name', ''),
-            data.get('delivery_address', ''),
-            data.get('client_name', '')
-        ))
+        location_data = data.get('location_data', {})
+        order = {
+            'location_id': location_data.get('location_id'),
+            'custom_location': location_data.get('custom_location'),
+            'is_anonymous': data.get('anonymous', False),
+            'delivery_delay_days': data.get('delay_days', 0),
+            'card_counts': card_data.get('counts', {}),
+            'recipient_name': data.get('recipient_name', ''),
+            'delivery_address': data.get('delivery_address', ''),
+            'client_name': data.get('client_name', '')
+        }
         
-        order_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        # Лимит, бронирование окна и заказ — одной транзакцией
+        cached = users_cache.get(telegram_id)
+        with db_pool.write() as conn:
+            order_id, user, error, versions = booking.reserve_and_create_order_sync(
+                conn, telegram_id, data.get('window_id'), order, user=cached)
+        if cached is None and user:
+            users_cache.set(telegram_id, user)
+        metrics.BOOKINGS.inc('web', metrics.booking_result(error))
+        
+        if error == booking.WINDOW_ERROR:
+            return jsonify({'error': error}), 409
+        if error:
+            return jsonify({'error': error}), 400
+        availability.apply_booking(data.get('window_id'), user['id'], versions)
         
         return jsonify({'id': order_id, 'message': 'Заказ оформлен успешно'}), 201
     except Exception as e:
@@ -523,7 +605,6 @@ def get_user_orders(telegram_id):
             ORDER BY o.created_at DESC
         """, (telegram_id,))
         orders = [dict(row) for row in cursor.fetchall()]
-        conn.close()
         print(f"Найдено {len(orders)} заказов для Telegram ID {telegram_id}")
         return jsonify(orders)
     except Exception as e:
@@ -538,134 +619,106 @@ def update_order_status(order_id):
         status = data.get('status')
         reason = data.get('reason', '')
         
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        # Получаем текущий заказ для получения telegram_id
-        cursor.execute("""
-            SELECT o.*, u.telegram_id FROM orders o
-            LEFT JOIN users u ON o.user_id = u.id
-            WHERE o.id = ?
-        """, (order_id,))
-        order = cursor.fetchone()
-        
-        if status == 'cancelled' and reason:
-            cursor.execute("""
-                UPDATE orders 
-                SET status = ?, cancelled_reason = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            """, (status, reason, order_id))
+        released = False
+        notify = False
+        with db_pool.write() as conn:
+            before = begin_availability_write(conn)
+            cursor = conn.cursor()
             
-            # Освобождаем временное окно
+            # Получаем текущий заказ для получения telegram_id
             cursor.execute("""
-                UPDATE meeting_windows 
-                SET current_bookings = current_bookings - 1,
-                    assigned_user_id = NULL,
-                    is_available = 1
-                WHERE id = (SELECT meeting_window_id FROM orders WHERE id = ?)
+                SELECT o.*, u.telegram_id FROM orders o
+                LEFT JOIN users u ON o.user_id = u.id
+                WHERE o.id = ?
             """, (order_id,))
-        else:
-            cursor.execute("""
-                UPDATE orders 
-                SET status = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            """, (status, order_id))
-        
-        conn.commit()
-        conn.close()
-        
-        # Отправляем уведомление пользователю (если есть telegram_id)
-        if order and order['telegram_id']:
-            try:
-                # Здесь должна быть логика отправки уведомления через Telegram Bot API
-                send_telegram_notification(order['telegram_id'], order_id, status, reason)
-                print(f"Отправка уведомления пользователю {order['telegram_id']}: Заказ #{order_id} {status}")
-                if status == 'cancelled' and reason:
-                    print(f"Причина отмены: {reason}")
-            except Exception as e:
-                print(f"Ошибка отправки уведомления: {e}")
+            order = cursor.fetchone()
+            
+            if status == 'cancelled' and reason:
+                cursor.execute(booking.CANCEL_ORDER_SQL, (reason, order_id))
+                
+                # Освобождаем временное окно (только при первой отмене)
+                if cursor.rowcount:
+                    cursor.execute(booking.RELEASE_WINDOW_SQL, (order_id,))
+                    released = True
+                    notify = True
+            else:
+                cursor.execute("""
+                    UPDATE orders 
+                    SET status = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, (status, order_id))
+                notify = cursor.rowcount > 0
+            
+            # Уведомление ставится в очередь в той же транзакции, отправляет его бот
+            if notify and order['telegram_id']:
+                outbox.enqueue_sync(conn, order['telegram_id'],
+                                    outbox.order_status_text(order_id, status, reason), order['user_id'])
+                print(f"Уведомление пользователю {order['telegram_id']} в очереди: Заказ #{order_id} {status}")
+            versions = before, booking.read_availability_version_sync(conn)
+        if released and order['meeting_window_id']:
+            availability.apply_release(order['meeting_window_id'], versions)
         
         return jsonify({'message': 'Статус заказа обновлен'}), 200
     except Exception as e:
         print(f"Error updating order status: {e}")
         return jsonify({'error': 'Ошибка обновления статуса заказа'}), 500
 
-def send_telegram_notification(telegram_id, order_id, status, reason=""):
-    """Отправка уведомления пользователю через Telegram Bot API"""
-    try:
-        import requests
-        from config import BOT_TOKEN
-        
-        # Формируем сообщение
-        if status == 'cancelled' and reason:
-            message = f"❌ Ваш заказ #{order_id} был отменен.\n\nПричина отмены: {reason}\n\nМы приносим свои извинения за неудобства."
-        elif status == 'met':
-            message = f"🤝 Ваша встреча по заказу #{order_id} состоялась."
-        elif status == 'delivered':
-            message = f"✅ Ваш заказ #{order_id} был успешно доставлен."
-        elif status == 'pending':
-            message = f"⏳ Ваш заказ #{order_id} находится в ожидании."
-        else:
-            message = f"ℹ️ Статус вашего заказа #{order_id} изменен на: {status}"
-        
-        # Отправляем сообщение через Telegram Bot API
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-        payload = {
-            'chat_id': telegram_id,
-            'text': message,
-            'parse_mode': 'HTML'
-        }
-        
-        response = requests.post(url, json=payload)
-        if response.status_code == 200:
-            print(f"✅ Уведомление успешно отправлено пользователю {telegram_id}")
-        else:
-            print(f"❌ Ошибка отправки уведомления: {response.text}")
-            
-    except Exception as e:
-        print(f"❌ Ошибка отправки уведомления через Telegram: {e}")
-
 @app.route("/api/stats")
 def get_stats():
     """Получение статистики"""
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        stats = {}
-        
-        # Всего заказов
-        cursor.execute("SELECT COUNT(*) as count FROM orders")
-        row = cursor.fetchone()
-        stats['total_orders'] = row[0] if row else 0
+        row = get_db().execute(counters.STATS_COUNTERS_SQL).fetchone()
+        stats = counters.stats_from_row(row)
         
-        # Активных встреч
-        cursor.execute("SELECT COUNT(*) as count FROM orders WHERE status = 'pending'")
-        row = cursor.fetchone()
-        stats['active_meetings'] = row[0] if row else 0
-        
-        # Всего пользователей
-        cursor.execute("SELECT COUNT(*) as count FROM users")
-        row = cursor.fetchone()
-        stats['total_users'] = row[0] if row else 0
-        
-        # Средний рейтинг
-        cursor.execute("SELECT AVG(rating) as avg_rating FROM feedback")
-        row = cursor.fetchone()
-        stats['avg_rating'] = round(row[0], 1) if row and row[0] else 0
-        
-        conn.close()
         return jsonify(stats)
     except Exception as e:
         print(f"Error getting stats: {e}")
         return jsonify({'error': 'Ошибка получения статистики'}), 500
 
+@app.route("/api/pool-stats")
+def get_pool_stats():
+    """Статистика пула соединений текущего воркера"""
+    return jsonify(db_pool.stats())
+
+@app.route("/metrics")
+def get_metrics():
+    """Метрики всех воркеров (или текущего без METRICS_DIR) в формате Prometheus"""
+    return Response(metrics.render(METRICS_DIR or None), content_type=metrics.CONTENT_TYPE)
+
+@app.route("/api/cache-stats")
+def get_cache_stats():
+    """Попадания и промахи кэшей текущего воркера"""
+    return jsonify({'users': users_cache.stats(), 'pid': os.getpid()})
+
+@app.route("/api/bot/lease")
+def get_bot_lease():
+    """Какой процесс сейчас держит аренду бота"""
+    try:
+        row = get_db().execute(leases.SELECT_LEASE_SQL, (leases.BOT_LEASE,)).fetchone()
+        status = leases.lease_status(row)
+        status['worker_pid'] = os.getpid()
+        return jsonify(status)
+    except Exception as e:
+        print(f"Error getting bot lease: {e}")
+        return jsonify({'error': 'Ошибка получения аренды бота'}), 500
+
 @app.route("/api/stats/chart")
 def get_stats_chart():
-    """Получение графика статистики"""
+    """
+    Получение графика статистики (общий с ботом кэш по версии данных).
+    Без изображения для текущей версии отрисовка запускается в процессе пула,
+    а ответ не ждет ее: отдается последнее изображение из кэша или 202.
+    """
     try:
-        # Возвращаем placeholder для графика
-        return send_from_directory('static', 'chart_placeholder.png')
+        version = get_db().execute(counters.STATS_VERSION_SQL).fetchone()[0]
+        png = stats.read_cached_image(version)
+        if png is None:
+            stats.submit_render(version, DB_PATH)
+            cached = stats.latest_cached_image()
+            if cached is None:
+                return jsonify({'status': 'rendering'}), 202, {'Retry-After': '1'}
+            _, png = cached
+        return Response(png, content_type='image/png', headers={'Cache-Control': 'no-cache'})
     except Exception as e:
         print(f"Error getting stats chart: {e}")
         # Возвращаем SVG placeholder
@@ -692,7 +745,8 @@ if __name__ == "__main__":
     os.makedirs('static', exist_ok=True)
     os.makedirs('database', exist_ok=True)
     
-    # Инициализируем демо данные
+    # Применяем миграции и инициализируем демо данные
+    migrate(DB_PATH)
     init_demo_data()
     
     print("=" * 50)